@@ -0,0 +1,230 @@
+from decimal import Decimal
+from django.db.models import F, IntegerField
+from django.db.models.functions import Cast, Round
+from grading.models import GRADE_BANDS, FAIL_GRADE, Grade
+from .models import StudentPerformance
+from .rankings import PerformanceRankings
+from .rollups import GradeRollups
+from .services import AnalyticsCalculator
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Letters in ascending band order, F first, matching searchsorted() codes
+BAND_LETTERS = [FAIL_GRADE] + [letter for letter, minimum in reversed(GRADE_BANDS)]
+# Band minimums in hundredths of a percent, ascending
+BAND_MINIMUMS = [minimum * 100 for letter, minimum in reversed(GRADE_BANDS)]
+TERMS = list(Grade.Term.values)
+ASSESSMENT_TYPES = list(Grade.AssessmentType.values)
+
+
+class GradeColumns:
+    """One academic year's grades held as typed NumPy column arrays.
+
+    Percentages are kept as integer hundredths (``points``) so sums and
+    band boundaries are exact; ``percentage`` gives the float32 view.
+    """
+
+    def __init__(self, student, subject, klass, term, assessment_type, points):
+        self.student = student
+        self.subject = subject
+        self.klass = klass
+        self.term = term
+        self.assessment_type = assessment_type
+        self.points = points
+        self.band = np.searchsorted(np.array(BAND_MINIMUMS, dtype=np.int32), points, side='right').astype(np.int8)
+
+    def __len__(self):
+        return len(self.points)
+
+    @property
+    def percentage(self):
+        return (self.points / 100).astype(np.float32)
+
+    @classmethod
+    def load(cls, start_date, end_date, term=None):
+        """Read the grades dated within a range in a single query"""
+        grades = Grade.objects.filter(date__range=(start_date, end_date))
+        if term:
+            grades = grades.filter(term=term)
+        rows = grades.annotate(
+            points=Cast(Round(F('percentage') * 100), IntegerField())
+        ).values_list(
+            'student_id', 'subject_id', 'student__current_class_id', 'term', 'assessment_type', 'points'
+        ).order_by()
+        columns = list(zip(*rows)) or [()] * 6
+        term_codes = {value: code for code, value in enumerate(TERMS)}
+        type_codes = {value: code for code, value in enumerate(ASSESSMENT_TYPES)}
+        return cls(
+            student=np.array(columns[0], dtype=np.int64),
+            subject=np.array(columns[1], dtype=np.int64),
+            klass=np.array([-1 if value is None else value for value in columns[2]], dtype=np.int64),
+            term=np.array([term_codes[value] for value in columns[3]], dtype=np.int8),
+            assessment_type=np.array([type_codes.get(value, -1) for value in columns[4]], dtype=np.int8),
+            points=np.array(columns[5], dtype=np.int64),
+        )
+
+
+class ColumnarAnalytics:
+    """Vectorized alternative to the per-subject and per-student ORM loops.
+
+    Grades are loaded once with ``GradeColumns.load`` and every statistic is
+    a group-by over the column arrays (``bincount``, ``argsort`` and
+    ``reduceat``), so a whole school year costs one read plus the bulk
+    upserts in ``save()``. Results match ``GradeRollups.rebuild()`` exactly.
+    """
+
+    def __init__(self, academic_year, columns, term=None):
+        self.academic_year = academic_year
+        self.columns = columns
+        self.term = term
+
+    @staticmethod
+    def is_available():
+        return np is not None
+
+    @classmethod
+    def for_year(cls, academic_year, term=None):
+        columns = GradeColumns.load(academic_year.start_date, academic_year.end_date, term)
+        return cls(academic_year.name, columns, term)
+
+    @staticmethod
+    def _group(owner, term):
+        """Dense group codes for (owner, term) pairs, plus the pairs themselves"""
+        keys, inverse = np.unique(owner * len(TERMS) + term, return_inverse=True)
+        return keys // len(TERMS), keys % len(TERMS), inverse.ravel()
+
+    def subject_statistics(self):
+        """Per (subject, term): counts per band, grade count and summed points"""
+        columns = self.columns
+        subjects, terms, group = self._group(columns.subject, columns.term)
+        groups = len(subjects)
+        bands = np.bincount(
+            group * len(BAND_LETTERS) + columns.band, minlength=groups * len(BAND_LETTERS)
+        ).reshape(groups, len(BAND_LETTERS))
+        return {
+            'subject': subjects,
+            'term': terms,
+            'count': np.bincount(group, minlength=groups),
+            'points': np.bincount(group, weights=columns.points, minlength=groups),
+            'bands': bands,
+        }
+
+    def student_statistics(self):
+        """Per (student, term): grade count, summed points and distinct subjects"""
+        columns = self.columns
+        students, terms, group = self._group(columns.student, columns.term)
+        groups = len(students)
+        # Each distinct (group, subject) pair counts once towards total_subjects
+        width = int(columns.subject.max(initial=0)) + 1
+        pairs = np.unique(group * width + columns.subject)
+        return {
+            'student': students,
+            'term': terms,
+            'count': np.bincount(group, minlength=groups),
+            'points': np.bincount(group, weights=columns.points, minlength=groups),
+            'subjects': np.bincount(pairs // width, minlength=groups),
+        }
+
+    def distributions(self):
+        stats = self.subject_statistics()
+        distributions = []
+        for index, subject_id in enumerate(stats['subject'].tolist()):
+            bands = dict(zip(BAND_LETTERS, stats['bands'][index].tolist()))
+            distributions.append(GradeRollups.distribution_from_stats(
+                subject_id, self.academic_year, TERMS[stats['term'][index]], {
+                    'total_grades': int(stats['count'][index]),
+                    'score_sum': Decimal(int(stats['points'][index])) / 100,
+                    'grade_distribution': bands,
+                }
+            ))
+        return distributions
+
+    def performances(self):
+        stats = self.student_statistics()
+        performances = []
+        for index, student_id in enumerate(stats['student'].tolist()):
+            count = int(stats['count'][index])
+            score_sum = Decimal(int(stats['points'][index])) / 100
+            performances.append(StudentPerformance(
+                student_id=student_id,
+                academic_year=self.academic_year,
+                term=TERMS[stats['term'][index]],
+                total_subjects=int(stats['subjects'][index]),
+                grade_count=count,
+                score_sum=score_sum,
+                average_grade=GradeRollups.average(score_sum, count),
+            ))
+        return performances
+
+    def save(self):
+        """Write every distribution, student performance and class rank back in bulk"""
+        distributions = self.distributions()
+        performances = self.performances()
+        GradeRollups.replace(self.academic_year, distributions, performances, term=self.term)
+        for term in [self.term] if self.term else sorted({performance.term for performance in performances}):
+            PerformanceRankings.update(self.academic_year, term, ranks=self.class_ranks(term))
+        return len(distributions), len(performances)
+
+    def class_rankings(self, term):
+        """Students of each class ranked by average percentage for ``term``.
+
+        Returns ``{class_id: [(student_id, average, rank), ...]}`` best first;
+        equal averages share a rank (1, 1, 3). Students are ranked on the
+        two-place average StudentPerformance stores, as PerformanceRankings
+        does, so both engines give the same ranks.
+        """
+        columns = self.columns
+        selected = (columns.term == TERMS.index(term)) & (columns.klass >= 0)
+        students, inverse = np.unique(columns.student[selected], return_inverse=True)
+        if not len(students):
+            return {}
+        counts = np.bincount(inverse.ravel())
+        # Mean points (hundredths of a percent), rounded half to even like Decimal.quantize()
+        averages = np.round(np.bincount(inverse.ravel(), weights=columns.points[selected]) / counts) / 100
+        classes = np.zeros(len(students), dtype=np.int64)
+        classes[inverse.ravel()] = columns.klass[selected]
+
+        order = np.lexsort((students, -averages, classes))
+        classes, students, averages = classes[order], students[order], averages[order]
+        starts = np.flatnonzero(np.r_[True, classes[1:] != classes[:-1]])
+        group_start = np.repeat(starts, np.diff(np.r_[starts, len(classes)]))
+        positions = np.arange(len(classes))
+        tie_start = np.r_[True, (classes[1:] != classes[:-1]) | (averages[1:] != averages[:-1])]
+        ranks = np.maximum.accumulate(np.where(tie_start, positions, 0)) - group_start + 1
+
+        rankings = {}
+        for start, end in zip(starts.tolist(), np.r_[starts[1:], len(classes)].tolist()):
+            rankings[int(classes[start])] = list(zip(
+                students[start:end].tolist(), averages[start:end].tolist(), ranks[start:end].tolist()
+            ))
+        return rankings
+
+    def class_ranks(self, term):
+        """{student id: (rank, class size)}, the shape PerformanceRankings.update() stores"""
+        return {
+            student_id: (rank, len(ranking))
+            for ranking in self.class_rankings(term).values()
+            for student_id, average, rank in ranking
+        }
+
+    def class_averages(self, term):
+        """Mean of every grade per class for ``term``, via argsort and reduceat"""
+        columns = self.columns
+        selected = (columns.term == TERMS.index(term)) & (columns.klass >= 0)
+        classes = columns.klass[selected]
+        if not len(classes):
+            return {}
+        order = np.argsort(classes, kind='stable')
+        classes, points = classes[order], columns.points[selected][order]
+        starts = np.flatnonzero(np.r_[True, classes[1:] != classes[:-1]])
+        sums = np.add.reduceat(points, starts)
+        counts = np.diff(np.r_[starts, len(classes)])
+        return dict(zip(classes[starts].tolist(), (sums / counts / 100).tolist()))
+
+    def subject_comparison(self, term):
+        """Same rows as ``AnalyticsCalculator.get_subject_comparison``, best average first"""
+        distributions = [row for row in self.distributions() if row.term == term]
+        return AnalyticsCalculator.subject_comparison_rows(distributions)
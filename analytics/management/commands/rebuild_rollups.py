@@ -0,0 +1,42 @@
+import time
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from grading.models import AcademicYear
+from analytics.columnar import ColumnarAnalytics
+from analytics.rankings import PerformanceRankings
+from analytics.rollups import GradeRollups
+from analytics.services import ENGINES, AnalyticsCalculator
+
+class Command(BaseCommand):
+    help = 'Recompute GradeDistribution and StudentPerformance rollups and rankings from raw grades'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--academic-year', help='Only rebuild this academic year (e.g. 2024-2025)')
+        parser.add_argument('--engine', choices=ENGINES,
+                            help='Compute with grouped SQL aggregates or NumPy column arrays '
+                                 '(default: the ANALYTICS_ENGINE setting)')
+
+    def handle(self, *args, **options):
+        academic_year = options['academic_year']
+        if academic_year and not AcademicYear.objects.filter(name=academic_year).exists():
+            raise CommandError(f"Unknown academic year: {academic_year}")
+
+        try:
+            engine = AnalyticsCalculator.engine(options['engine'])
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+
+        started = time.monotonic()
+        if engine == 'numpy':
+            # ColumnarAnalytics.save() stores the class ranks it computes
+            years = AcademicYear.objects.all()
+            if academic_year:
+                years = years.filter(name=academic_year)
+            written = {year.name: ColumnarAnalytics.for_year(year).save() for year in years}
+        else:
+            written = GradeRollups.rebuild(academic_year)
+            for name in written:
+                PerformanceRankings.update_year(name)
+        for name, (distributions, performances) in written.items():
+            self.stdout.write(f"{name}: {distributions} distributions, {performances} student performances")
+        self.stdout.write(self.style.SUCCESS(f"Rollups rebuilt in {time.monotonic() - started:.1f}s"))
@@ -0,0 +1,130 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from grading.models import AcademicYear, Class, Grade, Subject
+from analytics.rankings import PerformanceRankings
+from analytics.services import AnalyticsCalculator
+
+
+def init_worker(database_names):
+    """Give each worker process its own connections to the parent's databases"""
+    django.setup()
+    connections.close_all()
+    # Spawned workers re-read settings; keep them on the databases the parent
+    # uses (e.g. a test database)
+    for alias, name in database_names.items():
+        connections[alias].settings_dict['NAME'] = name
+
+
+def run_shard(shard):
+    """Recompute one shard; returns (shard, rows written, seconds)"""
+    started = time.monotonic()
+    year_name, term, kind, object_id = shard
+    if kind == 'ranks':
+        rows = PerformanceRankings.update(year_name, term)
+    else:
+        academic_year = AcademicYear.objects.get(name=year_name)
+        if kind == 'subject':
+            rows = AnalyticsCalculator.recompute_subject(academic_year, term, object_id)
+        else:
+            rows = AnalyticsCalculator.recompute_class(academic_year, term, object_id)
+    return shard, rows, time.monotonic() - started
+
+
+class Command(BaseCommand):
+    help = 'Rebuild every GradeDistribution, StudentPerformance and ranking in parallel, resumable shards'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--academic-year', help='Only recompute this academic year (e.g. 2024-2025)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Worker processes; 1 runs every shard in this process (default: CPU count)')
+        parser.add_argument('--checkpoint', default='recompute_analytics.checkpoint',
+                            help='Checkpoint file (default: ./recompute_analytics.checkpoint)')
+        parser.add_argument('--resume', action='store_true',
+                            help='Skip the shards already finished according to the checkpoint')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers must be positive')
+        years = AcademicYear.objects.order_by('start_date')
+        if options['academic_year']:
+            years = years.filter(name=options['academic_year'])
+            if not years.exists():
+                raise CommandError(f"Unknown academic year: {options['academic_year']}")
+        year_names = list(years.values_list('name', flat=True))
+
+        checkpoint_path = options['checkpoint']
+        done = self.read_checkpoint(checkpoint_path) if options['resume'] else {}
+        if done:
+            self.stdout.write(f"Resuming: {len(done)} shards already finished")
+
+        started = time.monotonic()
+        # Ranks read the performances of a whole term, so they run once
+        # every subject and class shard has finished.
+        for phase in (self.data_shards(year_names), self.rank_shards(year_names)):
+            pending = [shard for shard in phase if self.shard_key(shard) not in done]
+            for shard, rows, seconds in self.run(pending, options['workers']):
+                done[self.shard_key(shard)] = round(seconds, 3)
+                self.write_checkpoint(checkpoint_path, done)
+                self.stdout.write(f"{self.shard_key(shard)}: {rows} rows in {seconds:.2f}s")
+
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        self.stdout.write(self.style.SUCCESS(
+            f"Recomputed {len(year_names)} academic years in {time.monotonic() - started:.1f}s"
+        ))
+
+    @staticmethod
+    def data_shards(year_names):
+        subject_ids = list(Subject.objects.order_by('pk').values_list('pk', flat=True))
+        class_ids = list(Class.objects.order_by('pk').values_list('pk', flat=True)) + [None]
+        return [
+            (year_name, term, kind, object_id)
+            for year_name in year_names
+            for term in Grade.Term.values
+            for kind, object_ids in (('subject', subject_ids), ('class', class_ids))
+            for object_id in object_ids
+        ]
+
+    @staticmethod
+    def rank_shards(year_names):
+        return [(year_name, term, 'ranks', None) for year_name in year_names for term in Grade.Term.values]
+
+    @staticmethod
+    def shard_key(shard):
+        year_name, term, kind, object_id = shard
+        return '/'.join([year_name, term, kind] + ([] if object_id is None else [str(object_id)]))
+
+    @staticmethod
+    def run(shards, workers):
+        """Yield shard results as they finish, in a process pool when workers > 1"""
+        if workers == 1 or len(shards) <= 1:
+            for shard in shards:
+                yield run_shard(shard)
+            return
+        # Forked workers must not share this process's connections
+        database_names = {connection.alias: connection.settings_dict['NAME'] for connection in connections.all()}
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(database_names,)) as pool:
+            futures = [pool.submit(run_shard, shard) for shard in shards]
+            for future in as_completed(futures):
+                yield future.result()
+
+    @staticmethod
+    def read_checkpoint(checkpoint_path):
+        if not os.path.exists(checkpoint_path):
+            return {}
+        with open(checkpoint_path) as f:
+            return json.load(f)['shards']
+
+    @staticmethod
+    def write_checkpoint(checkpoint_path, done):
+        # Write then rename so a crash never leaves a half-written checkpoint
+        temp_path = f"{checkpoint_path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({'shards': done}, f)
+        os.replace(temp_path, checkpoint_path)
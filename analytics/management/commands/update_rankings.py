@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from grading.models import AcademicYear, Grade
+from analytics.rankings import PerformanceRankings
+
+class Command(BaseCommand):
+    help = 'Store class ranks and subject percentile ranks on StudentPerformance'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--academic-year', help='Academic year to rank (default: the current one)')
+        parser.add_argument('--term', choices=Grade.Term.values, help='Only rank this term')
+
+    def handle(self, *args, **options):
+        academic_year = options['academic_year']
+        if academic_year is None:
+            current = AcademicYear.objects.filter(is_current=True).first()
+            if current is None:
+                raise CommandError('No current academic year; pass --academic-year')
+            academic_year = current.name
+
+        if options['term']:
+            updated = {options['term']: PerformanceRankings.update(academic_year, options['term'])}
+        else:
+            updated = PerformanceRankings.update_year(academic_year)
+        for term, count in updated.items():
+            self.stdout.write(f"{academic_year} {term}: {count} student performances ranked")
+        self.stdout.write(self.style.SUCCESS('Rankings updated'))
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-17 15:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gradedistribution',
+            name='score_sum',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='studentperformance',
+            name='grade_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='studentperformance',
+            name='score_sum',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=14),
+        ),
+    ]
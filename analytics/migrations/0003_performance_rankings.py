@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-17 15:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_rollup_running_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentperformance',
+            name='class_size',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='studentperformance',
+            name='subject_percentiles',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -25,6 +25,8 @@ class GradeDistribution(models.Model):
     f_count = models.IntegerField(default=0)
     
     total_students = models.IntegerField(default=0)
+    # Running sum of percentages; average_score = score_sum / total_students
+    score_sum = models.DecimalField(max_digits=14, decimal_places=4, default=0)
     average_score = models.DecimalField(max_digits=5, decimal_places=2, default=0)
     pass_rate = models.DecimalField(max_digits=5, decimal_places=2, default=0)
     
@@ -42,8 +44,14 @@ class StudentPerformance(models.Model):
     term = models.CharField(max_length=10, choices=Grade.Term.choices)
     
     total_subjects = models.IntegerField(default=0)
+    # Running count and sum of percentages; average_grade = score_sum / grade_count
+    grade_count = models.IntegerField(default=0)
+    score_sum = models.DecimalField(max_digits=14, decimal_places=4, default=0)
     average_grade = models.DecimalField(max_digits=5, decimal_places=2, default=0)
     rank_in_class = models.IntegerField(null=True, blank=True)
+    class_size = models.IntegerField(null=True, blank=True)
+    # Percentile rank (0-100) of the student's average per subject, keyed by subject id
+    subject_percentiles = models.JSONField(default=dict, blank=True)
     total_attendance = models.DecimalField(max_digits=5, decimal_places=2, default=0)
     
     performance_trend = models.CharField(
@@ -0,0 +1,93 @@
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Avg, Count, F, Window
+from django.db.models.functions import PercentRank, Rank
+from django.utils import timezone
+from grading.models import Grade, Subject
+from .models import StudentPerformance
+from .rollups import AcademicYears
+
+
+class PerformanceRankings:
+    """Class ranks and per-subject percentile ranks for a whole year and term.
+
+    Each figure comes from a single windowed query (``RANK()`` and
+    ``PERCENT_RANK() OVER (PARTITION BY ...)``) over the rollup rows, and is
+    stored on StudentPerformance with one ``bulk_update``.
+    """
+    # bulk_update() skips auto_now, so calculated_at is set explicitly
+    UPDATE_FIELDS = ['rank_in_class', 'class_size', 'subject_percentiles', 'calculated_at']
+
+    @staticmethod
+    def class_ranks(academic_year, term):
+        """{student id: (rank, class size)}, ranked on average_grade within each class"""
+        rows = StudentPerformance.objects.filter(
+            academic_year=academic_year, term=term, student__current_class__isnull=False
+        ).annotate(
+            rank=Window(Rank(), partition_by=F('student__current_class_id'), order_by=F('average_grade').desc()),
+            size=Window(Count('id'), partition_by=F('student__current_class_id')),
+        ).values_list('student_id', 'rank', 'size')
+        return {student_id: (rank, size) for student_id, rank, size in rows}
+
+    @staticmethod
+    def subject_percentiles(academic_year, term):
+        """{student id: {subject id: percentile}} from each student's subject average.
+
+        The percentile is the share of the year's students with a lower
+        average in that subject, 0 for the lowest and 100 for the highest.
+        """
+        date_range = AcademicYears().range_for(academic_year)
+        if date_range is None:
+            return {}
+        rows = Grade.objects.filter(term=term, date__range=date_range).values(
+            'student_id', 'subject_id'
+        ).annotate(
+            average=Avg('percentage')
+        ).annotate(
+            percentile=Window(PercentRank(), partition_by=F('subject_id'), order_by=F('average').asc())
+        ).values_list('student_id', 'subject_id', 'percentile').order_by()
+        percentiles = defaultdict(dict)
+        for student_id, subject_id, percentile in rows:
+            percentiles[student_id][str(subject_id)] = round(percentile * 100, 1)
+        return percentiles
+
+    @classmethod
+    def update(cls, academic_year, term, batch_size=500, ranks=None):
+        """Store ranks and percentiles for every StudentPerformance row of the term.
+
+        ``ranks`` ({student id: (rank, class size)}) replaces the windowed
+        query, e.g. with ranks ColumnarAnalytics has already computed.
+        """
+        if ranks is None:
+            ranks = cls.class_ranks(academic_year, term)
+        percentiles = cls.subject_percentiles(academic_year, term)
+        performances = list(StudentPerformance.objects.filter(
+            academic_year=academic_year, term=term
+        ).only('id', 'student_id'))
+        now = timezone.now()
+        for performance in performances:
+            performance.calculated_at = now
+            performance.rank_in_class, performance.class_size = ranks.get(performance.student_id, (None, None))
+            performance.subject_percentiles = percentiles.get(performance.student_id, {})
+        with transaction.atomic():
+            StudentPerformance.objects.bulk_update(performances, cls.UPDATE_FIELDS, batch_size=batch_size)
+        return len(performances)
+
+    @classmethod
+    def update_year(cls, academic_year):
+        """Refresh every term of ``academic_year`` that has rollup rows"""
+        terms = StudentPerformance.objects.filter(
+            academic_year=academic_year
+        ).values_list('term', flat=True).distinct().order_by()
+        return {term: cls.update(academic_year, term) for term in terms}
+
+    @staticmethod
+    def named_percentiles(performances):
+        """Map each performance's subject_percentiles onto subject names, in one query"""
+        subject_ids = {int(pk) for performance in performances for pk in performance.subject_percentiles}
+        names = dict(Subject.objects.filter(pk__in=subject_ids).values_list('pk', 'name'))
+        return [
+            {names[int(pk)]: percentile for pk, percentile in performance.subject_percentiles.items()
+             if int(pk) in names}
+            for performance in performances
+        ]
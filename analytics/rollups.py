@@ -0,0 +1,303 @@
+from collections import defaultdict
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Case, CharField, Count, Sum, Value, When
+from grading.models import AcademicYear, Grade, FAIL_GRADE, GRADE_LETTERS
+from grading.services import GradeStatistics
+from .models import GradeDistribution, StudentPerformance
+
+# Grade fields that decide which rollup rows a grade counts towards
+TRACKED_FIELDS = ('student_id', 'subject_id', 'term', 'date', 'percentage')
+
+TWO_PLACES = Decimal('0.01')
+
+# Owners (subjects or students) per rollup read, keeping IN lists well inside
+# SQLite's bound-parameter limit
+KEY_BATCH_SIZE = 500
+
+class AcademicYears:
+    """In-memory lookup from dates to AcademicYear names"""
+
+    def __init__(self, years=None):
+        if years is None:
+            years = AcademicYear.objects.values_list('name', 'start_date', 'end_date')
+        self.years = list(years)
+
+    def name_for(self, day):
+        for name, start_date, end_date in self.years:
+            if start_date <= day <= end_date:
+                return name
+        return None
+
+    def range_for(self, name):
+        for year_name, start_date, end_date in self.years:
+            if year_name == name:
+                return start_date, end_date
+        return None
+
+class GradeRollups:
+    """Keeps GradeDistribution and StudentPerformance in step with Grade writes.
+
+    Every change is turned into per-row deltas (counts, percentage sums
+    and band counts). The affected (subject, year, term) and (student,
+    year, term) rows are read and locked in one query per table, the
+    deltas added in Python and the results written back with one upsert
+    per table, so a write costs the same handful of queries however many
+    students and subjects it touches, and averages stay exact.
+    """
+
+    @staticmethod
+    def current_values(grade):
+        return tuple(getattr(grade, name) for name in TRACKED_FIELDS)
+
+    @staticmethod
+    def loaded_values(grade):
+        """Values the grade had when read from the database, or None"""
+        loaded = getattr(grade, '_loaded_values', None)
+        if not loaded or any(name not in loaded for name in TRACKED_FIELDS):
+            return None
+        return tuple(loaded[name] for name in TRACKED_FIELDS)
+
+    @staticmethod
+    def average(score_sum, count):
+        return (Decimal(str(score_sum)) / count).quantize(TWO_PLACES)
+
+    @staticmethod
+    def pass_rate(total, failed):
+        return (Decimal(total - failed) * 100 / total).quantize(TWO_PLACES)
+
+    @staticmethod
+    def _new_delta():
+        delta = {'count': 0, 'sum': Decimal('0')}
+        delta.update({letter: 0 for letter in GRADE_LETTERS})
+        return delta
+
+    @classmethod
+    def deltas(cls, removed=(), added=(), years=None):
+        """Net per-row changes for grades leaving (removed) and entering (added) the rollups"""
+        years = years or AcademicYears()
+        distributions = defaultdict(cls._new_delta)
+        performances = defaultdict(cls._new_delta)
+        for sign, rows in ((-1, removed), (1, added)):
+            for student_id, subject_id, term, day, percentage in rows:
+                year = years.name_for(day)
+                if year is None:
+                    continue
+                percentage = Decimal(str(percentage))
+                letter = Grade.letter_for(percentage)
+                for delta in (distributions[(subject_id, year, term)], performances[(student_id, year, term)]):
+                    delta['count'] += sign
+                    delta['sum'] += sign * percentage
+                    delta[letter] += sign
+        # Edits that leave every tracked value unchanged cancel out here
+        return (
+            {key: delta for key, delta in distributions.items() if any(delta.values())},
+            {key: delta for key, delta in performances.items() if any(delta.values())},
+        )
+
+    @classmethod
+    def apply_changes(cls, removed=(), added=()):
+        years = AcademicYears()
+        distributions, performances = cls.deltas(removed, added, years)
+        if not distributions and not performances:
+            return
+        with transaction.atomic():
+            cls._apply_distributions(distributions)
+            cls._apply_performances(performances, years)
+
+    @staticmethod
+    def _current_rows(model, owner, keys, fields):
+        """Lock and read the rollup rows for ``keys``, as {(owner_id, year, term): values}.
+
+        Reads a superset (every owner x year x term combination) in batches
+        of owners and keeps the requested keys, so the query count does not
+        grow with the number of keys.
+        """
+        owners = sorted({key[0] for key in keys})
+        years = {key[1] for key in keys}
+        terms = {key[2] for key in keys}
+        current = {}
+        for start in range(0, len(owners), KEY_BATCH_SIZE):
+            rows = model.objects.select_for_update().filter(
+                **{f'{owner}__in': owners[start:start + KEY_BATCH_SIZE]},
+                academic_year__in=years,
+                term__in=terms,
+            ).values_list(owner, 'academic_year', 'term', 'pk', *fields)
+            for owner_id, year, term, pk, *values in rows:
+                if (owner_id, year, term) in keys:
+                    current[(owner_id, year, term)] = (pk, *values)
+        return current
+
+    @classmethod
+    def _apply_distributions(cls, deltas):
+        band_fields = [f'{letter.lower()}_count' for letter in GRADE_LETTERS]
+        current = cls._current_rows(GradeDistribution, 'subject_id', deltas, ['total_students', 'score_sum', *band_fields])
+        rows = []
+        empty = []
+        for (subject_id, year, term), delta in deltas.items():
+            pk, total, score_sum, *bands = current.get((subject_id, year, term)) or (None, 0, 0, *[0] * len(band_fields))
+            total += delta['count']
+            if total <= 0:
+                # Missing rows with a net removal (e.g. cascaded away) stay missing
+                if pk:
+                    empty.append(pk)
+                continue
+            score_sum = Decimal(str(score_sum)) + delta['sum']
+            bands = {field: count + delta[letter] for field, count, letter in zip(band_fields, bands, GRADE_LETTERS)}
+            rows.append(GradeDistribution(
+                subject_id=subject_id,
+                academic_year=year,
+                term=term,
+                total_students=total,
+                score_sum=score_sum,
+                average_score=cls.average(score_sum, total),
+                pass_rate=cls.pass_rate(total, bands['f_count']),
+                **bands
+            ))
+        cls.upsert_distributions(rows)
+        if empty:
+            GradeDistribution.objects.filter(pk__in=empty).delete()
+
+    @staticmethod
+    def _subject_counts(keys, years):
+        """Distinct subjects graded per (student, year, term) key, from one grouped query per batch"""
+        students = sorted({student_id for student_id, year, term in keys})
+        year_names = {year for student_id, year, term in keys}
+        year_of = Case(
+            *[When(date__range=years.range_for(name), then=Value(name)) for name in year_names],
+            output_field=CharField(),
+        )
+        counts = {}
+        for start in range(0, len(students), KEY_BATCH_SIZE):
+            rows = Grade.objects.filter(
+                student_id__in=students[start:start + KEY_BATCH_SIZE],
+                term__in={term for student_id, year, term in keys},
+            ).annotate(rollup_year=year_of).filter(rollup_year__isnull=False).values_list(
+                'student_id', 'rollup_year', 'term'
+            ).annotate(subjects=Count('subject_id', distinct=True)).order_by()
+            counts.update({(student_id, year, term): subjects for student_id, year, term, subjects in rows})
+        return counts
+
+    @classmethod
+    def _apply_performances(cls, deltas, years):
+        current = cls._current_rows(StudentPerformance, 'student_id', deltas, ['grade_count', 'score_sum'])
+        totals = {}
+        empty = []
+        for key, delta in deltas.items():
+            pk, count, score_sum = current.get(key) or (None, 0, 0)
+            count += delta['count']
+            if count <= 0:
+                if pk:
+                    empty.append(pk)
+                continue
+            totals[key] = (count, Decimal(str(score_sum)) + delta['sum'])
+        subject_counts = cls._subject_counts(totals, years) if totals else {}
+        cls.upsert_performances([
+            StudentPerformance(
+                student_id=student_id,
+                academic_year=year,
+                term=term,
+                total_subjects=subject_counts.get((student_id, year, term), 0),
+                grade_count=count,
+                score_sum=score_sum,
+                average_grade=cls.average(score_sum, count),
+            )
+            for (student_id, year, term), (count, score_sum) in totals.items()
+        ])
+        if empty:
+            StudentPerformance.objects.filter(pk__in=empty).delete()
+
+    @classmethod
+    def distribution_from_stats(cls, subject_id, academic_year, term, stats):
+        # Average and pass rate come from the exact totals, as in apply_changes()
+        bands = stats['grade_distribution']
+        total = stats['total_grades']
+        return GradeDistribution(
+            subject_id=subject_id,
+            academic_year=academic_year,
+            term=term,
+            total_students=total,
+            score_sum=stats['score_sum'],
+            average_score=cls.average(stats['score_sum'], total) if total else 0,
+            pass_rate=cls.pass_rate(total, bands[FAIL_GRADE]) if total else 0,
+            **{f'{letter.lower()}_count': bands[letter] for letter in GRADE_LETTERS}
+        )
+
+    @staticmethod
+    def upsert_distributions(distributions, batch_size=500):
+        """Insert or overwrite GradeDistribution rows in bulk"""
+        GradeDistribution.objects.bulk_create(
+            distributions,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['subject', 'academic_year', 'term'],
+            update_fields=[
+                'a_count', 'b_count', 'c_count', 'd_count', 'f_count', 'total_students',
+                'score_sum', 'average_score', 'pass_rate', 'calculated_at'
+            ],
+        )
+
+    @staticmethod
+    def upsert_performances(performances, batch_size=500):
+        """Insert or overwrite the grade-derived StudentPerformance fields in bulk"""
+        StudentPerformance.objects.bulk_create(
+            performances,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['student', 'academic_year', 'term'],
+            update_fields=['total_subjects', 'grade_count', 'score_sum', 'average_grade', 'calculated_at'],
+        )
+
+    @classmethod
+    def rebuild(cls, academic_year=None):
+        """Recompute every rollup row from raw grades; returns rows written per year"""
+        years = AcademicYear.objects.all()
+        if academic_year:
+            years = years.filter(name=academic_year)
+        written = {}
+        for year in years:
+            grades = Grade.objects.filter(date__range=(year.start_date, year.end_date))
+            distributions = [
+                cls.distribution_from_stats(row['subject_id'], year.name, row['term'], GradeStatistics.from_row(row))
+                for row in grades.values('subject_id', 'term').annotate(**GradeStatistics.aggregates()).order_by()
+            ]
+            performances = [
+                StudentPerformance(
+                    student_id=row['student_id'],
+                    academic_year=year.name,
+                    term=row['term'],
+                    total_subjects=row['total_subjects'],
+                    grade_count=row['grade_count'],
+                    score_sum=row['score_sum'],
+                    average_grade=cls.average(row['score_sum'], row['grade_count']),
+                )
+                for row in grades.values('student_id', 'term').annotate(
+                    grade_count=Count('id'),
+                    score_sum=Sum('percentage'),
+                    total_subjects=Count('subject', distinct=True),
+                ).order_by()
+            ]
+            cls.replace(year.name, distributions, performances)
+            written[year.name] = (len(distributions), len(performances))
+        return written
+
+    @classmethod
+    def replace(cls, academic_year, distributions, performances, term=None):
+        """Make the rollup rows of a year (optionally one term) exactly the given ones"""
+        with transaction.atomic():
+            cls.upsert_distributions(distributions)
+            cls.upsert_performances(performances)
+            # Drop rows whose grades have all gone
+            for model, owner, rows in (
+                (GradeDistribution, 'subject_id', distributions),
+                (StudentPerformance, 'student_id', performances),
+            ):
+                current = model.objects.filter(academic_year=academic_year)
+                if term:
+                    current = current.filter(term=term)
+                live = {(getattr(row, owner), row.term) for row in rows}
+                stale = [
+                    pk for pk, owner_id, row_term in current.values_list('pk', owner, 'term')
+                    if (owner_id, row_term) not in live
+                ]
+                model.objects.filter(pk__in=stale).delete()
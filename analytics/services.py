@@ -1,120 +1,187 @@
-from django.db.models import Avg, Count, Q, F
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Count, Q, F, Sum
 from django.utils import timezone
-from grading.models import Grade, Student, Subject
+from grading.models import AcademicYear, Grade, Subject
+from grading.services import GradeStatistics
 from .models import GradeDistribution, StudentPerformance
+from .rankings import PerformanceRankings
+from .rollups import GradeRollups
+
+ENGINES = ('orm', 'numpy')
 
 class AnalyticsCalculator:
+    """Grade rollups for one academic year and term, computed set-based.
+
+    Each public method runs one GROUP BY aggregation for however many
+    subjects or students it covers and persists the result with a single
+    bulk upsert, so the query count does not grow with the data. Whole-term
+    work (``recompute_term``, ``get_subject_comparison``) can instead run on
+    the NumPy engine in analytics.columnar, chosen by ``ANALYTICS_ENGINE``.
+    """
+
     @staticmethod
-    def calculate_grade_distribution(subject, academic_year, term):
-        """Calculate grade distribution for a subject in given term/year"""
+    def engine(engine=None):
+        """The engine to use: ``engine`` if given, else settings.ANALYTICS_ENGINE"""
+        from .columnar import ColumnarAnalytics
+        engine = engine or getattr(settings, 'ANALYTICS_ENGINE', 'orm')
+        if engine not in ENGINES:
+            raise ImproperlyConfigured(f"Unknown analytics engine '{engine}'")
+        if engine == 'numpy' and not ColumnarAnalytics.is_available():
+            raise ImproperlyConfigured('The numpy analytics engine requires numpy to be installed')
+        return engine
+
+    @staticmethod
+    def recompute_term(academic_year, term, engine=None):
+        """Rebuild every distribution, performance and class rank of an AcademicYear's term.
+
+        Returns (distributions, performances) written.
+        """
+        from .columnar import ColumnarAnalytics
+        if AnalyticsCalculator.engine(engine) == 'numpy':
+            return ColumnarAnalytics.for_year(academic_year, term).save()
+        grades = Grade.objects.filter(term=term, date__range=(academic_year.start_date, academic_year.end_date))
+        distributions = AnalyticsCalculator.distribution_rows(grades, academic_year.name, term)
+        performances = AnalyticsCalculator.performance_rows(grades, academic_year.name, term)
+        GradeRollups.replace(academic_year.name, distributions, performances, term=term)
+        PerformanceRankings.update(academic_year.name, term)
+        return len(distributions), len(performances)
+
+    @staticmethod
+    def term_grades(academic_year, term):
+        """Grades of ``term`` dated within the named AcademicYear"""
+        date_range = AcademicYear.date_range(academic_year)
+        if date_range is None:
+            return Grade.objects.none()
+        return Grade.objects.filter(term=term, date__range=date_range)
+
+    @staticmethod
+    def distribution_rows(grades, academic_year, term):
+        """One unsaved GradeDistribution per subject found in ``grades``"""
+        rows = grades.values('subject_id').annotate(**GradeStatistics.aggregates()).order_by()
+        return [
+            GradeRollups.distribution_from_stats(row['subject_id'], academic_year, term, GradeStatistics.from_row(row))
+            for row in rows
+        ]
+
+    @staticmethod
+    def save_distributions(grades, academic_year, term):
+        """Upsert one GradeDistribution per subject found in ``grades``"""
+        distributions = AnalyticsCalculator.distribution_rows(grades, academic_year, term)
+        GradeRollups.upsert_distributions(distributions)
+        return distributions
+
+    @staticmethod
+    def performance_rows(grades, academic_year, term):
+        """One unsaved StudentPerformance per student found in ``grades``"""
+        rows = grades.values('student_id').annotate(
+            grade_count=Count('id'),
+            score_sum=Sum('percentage'),
+            total_subjects=Count('subject', distinct=True),
+        ).order_by()
+        return [
+            StudentPerformance(
+                student_id=row['student_id'],
+                academic_year=academic_year,
+                term=term,
+                total_subjects=row['total_subjects'],
+                grade_count=row['grade_count'],
+                score_sum=row['score_sum'],
+                average_grade=GradeRollups.average(row['score_sum'], row['grade_count']),
+            )
+            for row in rows
+        ]
+
+    @staticmethod
+    def save_performances(grades, academic_year, term):
+        """Upsert one StudentPerformance per student found in ``grades``"""
+        performances = AnalyticsCalculator.performance_rows(grades, academic_year, term)
+        GradeRollups.upsert_performances(performances)
+        return performances
+
+    @staticmethod
+    def recompute_subject(academic_year, term, subject_id):
+        """Rebuild one subject's GradeDistribution for an AcademicYear, dropping it if empty"""
         grades = Grade.objects.filter(
-            subject=subject,
-            term=term,
-            date__year=academic_year.split('-')[0]  # Simple year extraction
+            subject_id=subject_id, term=term, date__range=(academic_year.start_date, academic_year.end_date)
         )
-        
-        total_grades = grades.count()
-        if total_grades == 0:
-            return None
-        
-        # Count grades by letter
-        a_count = grades.filter(percentage__gte=90).count()
-        b_count = grades.filter(percentage__gte=80, percentage__lt=90).count()
-        c_count = grades.filter(percentage__gte=70, percentage__lt=80).count()
-        d_count = grades.filter(percentage__gte=60, percentage__lt=70).count()
-        f_count = grades.filter(percentage__lt=60).count()
-        
-        avg_score = grades.aggregate(avg=Avg('percentage'))['avg'] or 0
-        pass_rate = ((a_count + b_count + c_count + d_count) / total_grades) * 100
-        
-        distribution, created = GradeDistribution.objects.get_or_create(
-            subject=subject,
-            academic_year=academic_year,
-            term=term
+        distributions = AnalyticsCalculator.save_distributions(grades, academic_year.name, term)
+        if not distributions:
+            GradeDistribution.objects.filter(subject_id=subject_id, academic_year=academic_year.name, term=term).delete()
+        return len(distributions)
+
+    @staticmethod
+    def recompute_class(academic_year, term, class_id):
+        """Rebuild StudentPerformance for the students of one class (None: no class)"""
+        grades = Grade.objects.filter(
+            student__current_class_id=class_id, term=term,
+            date__range=(academic_year.start_date, academic_year.end_date)
         )
-        
-        distribution.a_count = a_count
-        distribution.b_count = b_count
-        distribution.c_count = c_count
-        distribution.d_count = d_count
-        distribution.f_count = f_count
-        distribution.total_students = total_grades
-        distribution.average_score = avg_score
-        distribution.pass_rate = pass_rate
-        distribution.save()
-        
-        return distribution
+        performances = AnalyticsCalculator.save_performances(grades, academic_year.name, term)
+        StudentPerformance.objects.filter(
+            student__current_class_id=class_id, academic_year=academic_year.name, term=term
+        ).exclude(student_id__in=[performance.student_id for performance in performances]).delete()
+        return len(performances)
+
+    @staticmethod
+    def calculate_grade_distribution(subject, academic_year, term):
+        """Calculate grade distribution for a subject in given term/year"""
+        grades = AnalyticsCalculator.term_grades(academic_year, term).filter(subject=subject)
+        if not AnalyticsCalculator.save_distributions(grades, academic_year, term):
+            return None
+        return GradeDistribution.objects.get(subject=subject, academic_year=academic_year, term=term)
 
     @staticmethod
     def calculate_student_performance(student, academic_year, term):
         """Calculate individual student performance"""
-        grades = Grade.objects.filter(
-            student=student,
-            term=term,
-            date__year=academic_year.split('-')[0]
-        )
-        
-        if not grades.exists():
+        grades = AnalyticsCalculator.term_grades(academic_year, term).filter(student=student)
+        if not AnalyticsCalculator.save_performances(grades, academic_year, term):
             return None
-        
-        avg_grade = grades.aggregate(avg=Avg('percentage'))['avg'] or 0
-        total_subjects = grades.values('subject').distinct().count()
-        
-        # Simple trend analysis (compare with previous term if available)
-        performance_trend = 'STABLE'
-        
-        performance, created = StudentPerformance.objects.get_or_create(
-            student=student,
-            academic_year=academic_year,
-            term=term
-        )
-        
-        performance.total_subjects = total_subjects
-        performance.average_grade = avg_grade
-        performance.performance_trend = performance_trend
-        performance.save()
-        
-        return performance
+        return StudentPerformance.objects.get(student=student, academic_year=academic_year, term=term)
 
     @staticmethod
     def get_class_performance(class_obj, academic_year, term):
         """Get performance analytics for entire class"""
-        students = Student.objects.filter(current_class=class_obj)
-        performance_data = []
-        
-        for student in students:
-            performance = AnalyticsCalculator.calculate_student_performance(
-                student, academic_year, term
-            )
-            if performance:
-                performance_data.append(performance)
-        
-        return sorted(performance_data, key=lambda x: x.average_grade, reverse=True)
+        grades = AnalyticsCalculator.term_grades(academic_year, term).filter(student__current_class=class_obj)
+        performances = AnalyticsCalculator.save_performances(grades, academic_year, term)
+        return list(StudentPerformance.objects.filter(
+            student_id__in=[performance.student_id for performance in performances],
+            academic_year=academic_year,
+            term=term
+        ).select_related('student').order_by('-average_grade', 'student__last_name', 'student__first_name'))
 
     @staticmethod
-    def get_subject_comparison(academic_year, term):
+    def get_subject_comparison(academic_year, term, engine=None):
         """Compare performance across all subjects"""
-        subjects = Subject.objects.all()
-        comparison_data = []
-        
-        for subject in subjects:
-            distribution = AnalyticsCalculator.calculate_grade_distribution(
-                subject, academic_year, term
-            )
-            if distribution:
-                comparison_data.append({
-                    'subject': subject.name,
-                    'average_score': distribution.average_score,
-                    'pass_rate': distribution.pass_rate,
-                    'total_students': distribution.total_students,
-                    'grade_distribution': {
-                        'A': distribution.a_count,
-                        'B': distribution.b_count,
-                        'C': distribution.c_count,
-                        'D': distribution.d_count,
-                        'F': distribution.f_count
-                    }
-                })
+        from .columnar import ColumnarAnalytics
+        if AnalyticsCalculator.engine(engine) == 'numpy':
+            year = AcademicYear.objects.filter(name=academic_year).first()
+            distributions = ColumnarAnalytics.for_year(year, term).distributions() if year else []
+            GradeRollups.upsert_distributions(distributions)
+        else:
+            grades = AnalyticsCalculator.term_grades(academic_year, term)
+            distributions = AnalyticsCalculator.save_distributions(grades, academic_year, term)
+        return AnalyticsCalculator.subject_comparison_rows(distributions)
+
+    @staticmethod
+    def subject_comparison_rows(distributions):
+        """Comparison rows for GradeDistribution objects, best average first"""
+        names = dict(Subject.objects.filter(
+            pk__in=[distribution.subject_id for distribution in distributions]
+        ).values_list('pk', 'name'))
+        comparison_data = [{
+            'subject': names[distribution.subject_id],
+            'average_score': distribution.average_score,
+            'pass_rate': distribution.pass_rate,
+            'total_students': distribution.total_students,
+            'grade_distribution': {
+                'A': distribution.a_count,
+                'B': distribution.b_count,
+                'C': distribution.c_count,
+                'D': distribution.d_count,
+                'F': distribution.f_count
+            }
+        } for distribution in distributions]
         
         return sorted(comparison_data, key=lambda x: x['average_score'], reverse=True)
 
@@ -144,13 +211,17 @@ class ChartDataGenerator:
 
     @staticmethod
     def subject_comparison_bar_chart(academic_year, term):
-        subjects_data = AnalyticsCalculator.get_subject_comparison(academic_year, term)
+        # Distributions are maintained incrementally, so read them directly
+        distributions = GradeDistribution.objects.filter(
+            academic_year=academic_year,
+            term=term
+        ).select_related('subject').order_by('-average_score')
         
         return {
-            'labels': [item['subject'] for item in subjects_data],
+            'labels': [distribution.subject.name for distribution in distributions],
             'datasets': [{
                 'label': 'Average Score',
-                'data': [float(item['average_score']) for item in subjects_data],
+                'data': [float(distribution.average_score) for distribution in distributions],
                 'backgroundColor': '#007bff'
             }]
         }
@@ -0,0 +1,57 @@
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from grading.models import Grade
+from grading.signals import grades_bulk_saved
+from .rollups import GradeRollups, TRACKED_FIELDS
+
+@receiver(pre_save, sender=Grade)
+def load_previous_grade(sender, instance, raw=False, **kwargs):
+    # Grades built by hand with an existing pk were never read from the
+    # database; fetch their stored values so the old rollup rows get the delta.
+    if raw or instance._state.adding or GradeRollups.loaded_values(instance) is not None:
+        return
+    instance._loaded_values = (
+        Grade.objects.filter(pk=instance.pk).values(*TRACKED_FIELDS).first() or {}
+    )
+
+@receiver(post_save, sender=Grade)
+def roll_up_saved_grade(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = None if created else GradeRollups.loaded_values(instance)
+    GradeRollups.apply_changes(
+        removed=[previous] if previous else [],
+        added=[GradeRollups.current_values(instance)]
+    )
+
+# A delete sends pre_delete for every grade it removes (cascades from a
+# student, subject or year included) before the first post_delete, so the
+# grades' values are gathered on the deletion's origin and rolled up once.
+@receiver(pre_delete, sender=Grade)
+def collect_deleted_grade(sender, instance, origin=None, **kwargs):
+    if origin is None:
+        return
+    values = GradeRollups.loaded_values(instance) or GradeRollups.current_values(instance)
+    pending = getattr(origin, '_pending_grade_rollups', None)
+    if pending is None:
+        pending = origin._pending_grade_rollups = []
+    pending.append(values)
+
+@receiver(post_delete, sender=Grade)
+def roll_up_deleted_grade(sender, instance, origin=None, **kwargs):
+    if origin is None:
+        values = GradeRollups.loaded_values(instance) or GradeRollups.current_values(instance)
+        GradeRollups.apply_changes(removed=[values])
+        return
+    pending = getattr(origin, '_pending_grade_rollups', None)
+    if pending:
+        origin._pending_grade_rollups = []
+        GradeRollups.apply_changes(removed=pending)
+
+@receiver(grades_bulk_saved, sender=Grade)
+def roll_up_bulk_grades(sender, created, updated, **kwargs):
+    removed = [GradeRollups.loaded_values(grade) for grade in updated]
+    GradeRollups.apply_changes(
+        removed=[values for values in removed if values],
+        added=[GradeRollups.current_values(grade) for grade in created + updated]
+    )
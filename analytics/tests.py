@@ -1,3 +1,358 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import patch
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from authentication.models import User
+from grading.models import Grade, Subject
+from grading.tests import GradingTestData
+from .columnar import ColumnarAnalytics
+from .models import GradeDistribution, StudentPerformance
+from .rankings import PerformanceRankings
+from .rollups import GradeRollups
+from .services import AnalyticsCalculator
 
-# Create your tests here.
+
+class RollupAssertions:
+    def rollup_state(self):
+        distributions = list(GradeDistribution.objects.order_by('subject_id', 'academic_year', 'term').values(
+            'subject_id', 'academic_year', 'term', 'a_count', 'b_count', 'c_count', 'd_count', 'f_count',
+            'total_students', 'average_score', 'pass_rate'
+        ))
+        performances = list(StudentPerformance.objects.order_by('student_id', 'academic_year', 'term').values(
+            'student_id', 'academic_year', 'term', 'total_subjects', 'grade_count', 'average_grade'
+        ))
+        return distributions, performances
+
+    def assertRollupsMatchRebuild(self):
+        incremental = self.rollup_state()
+        GradeRollups.rebuild()
+        self.assertEqual(incremental, self.rollup_state())
+
+
+class IncrementalRollupTests(RollupAssertions, GradingTestData, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_school()
+        cls.second = cls.create_student('Alan', 'Turing', 'MGS002')
+        cls.user = User.objects.create_user('teacher', password='secret')
+
+    def test_saves_maintain_exact_rollups(self):
+        self.create_grade('95')
+        self.create_grade('55', name='Quiz')
+        self.create_grade('72', student=self.second, subject=self.english)
+        distribution = GradeDistribution.objects.get(subject=self.math, academic_year='2024-2025', term='TERM1')
+        self.assertEqual((distribution.a_count, distribution.f_count, distribution.total_students), (1, 1, 2))
+        self.assertEqual(distribution.average_score, Decimal('75.00'))
+        self.assertEqual(distribution.pass_rate, Decimal('50.00'))
+        performance = StudentPerformance.objects.get(student=self.student, term='TERM1')
+        self.assertEqual((performance.grade_count, performance.total_subjects), (2, 1))
+        self.assertRollupsMatchRebuild()
+
+    def test_updates_move_deltas_between_rows(self):
+        grade = self.create_grade('95')
+        self.create_grade('60', name='Quiz')
+        grade = Grade.objects.get(pk=grade.pk)
+        grade.subject = self.english
+        grade.term = 'TERM2'
+        grade.score = Decimal('40')
+        grade.save()
+        english = GradeDistribution.objects.get(subject=self.english, term='TERM2')
+        self.assertEqual((english.f_count, english.average_score), (1, Decimal('40.00')))
+        math = GradeDistribution.objects.get(subject=self.math, term='TERM1')
+        self.assertEqual((math.a_count, math.d_count, math.total_students), (0, 1, 1))
+        self.assertRollupsMatchRebuild()
+
+    def test_deletes_remove_empty_rows(self):
+        grade = self.create_grade('95')
+        grade.delete()
+        self.assertFalse(GradeDistribution.objects.exists())
+        self.assertFalse(StudentPerformance.objects.exists())
+
+    def test_grade_outside_any_academic_year_is_ignored(self):
+        self.create_grade('80', day=self.academic_year.end_date.replace(year=2030))
+        self.assertFalse(GradeDistribution.objects.exists())
+
+    def test_bulk_upload_updates_rollups(self):
+        self.create_grade('50', name='Midterm')
+        self.client.force_login(self.user)
+        self.client.post(
+            reverse('grading:api_grade_bulk_upload'),
+            data=json.dumps({'grades': [
+                {'student_id': self.student.pk, 'subject_id': self.math.pk, 'assessment_name': 'Midterm',
+                 'term': 'TERM1', 'score': 90, 'date': '2024-10-02'},
+                {'student_id': self.second.pk, 'subject_id': self.math.pk, 'assessment_name': 'Midterm',
+                 'term': 'TERM1', 'score': 70, 'date': '2024-10-02'},
+            ]}),
+            content_type='application/json'
+        )
+        math = GradeDistribution.objects.get(subject=self.math, term='TERM1')
+        self.assertEqual((math.total_students, math.a_count, math.c_count, math.f_count), (2, 1, 1, 0))
+        self.assertEqual(math.average_score, Decimal('80.00'))
+        self.assertRollupsMatchRebuild()
+
+    def upload(self, rows):
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse('grading:api_grade_bulk_upload'), data=json.dumps({'grades': rows}), content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_rollup_queries_do_not_grow_with_students_or_subjects(self):
+        students = [self.create_student('Student', str(i), f'MGS1{i:02}') for i in range(10)]
+        subjects = [self.math, self.english, Subject.objects.create(name='Science', code='SCI')]
+
+        def batch(name, count):
+            return [
+                {'student_id': student.pk, 'subject_id': subject.pk, 'assessment_name': name,
+                 'term': 'TERM1', 'score': 50 + i, 'date': '2024-10-02'}
+                for i, (student, subject) in enumerate((s, sub) for s in students[:count] for sub in subjects)
+            ]
+
+        self.upload(batch('Warm up', 1))
+        with CaptureQueriesContext(connection) as one_student:
+            self.upload(batch('Quiz', 1))
+        with CaptureQueriesContext(connection) as ten_students:
+            self.upload(batch('Test', 10))
+        self.assertEqual(len(ten_students), len(one_student))
+        self.assertRollupsMatchRebuild()
+
+    def test_cascade_deletes_roll_up_once(self):
+        for i in range(5):
+            self.create_grade(str(60 + i), name=f'Quiz {i}')
+            self.create_grade(str(70 + i), student=self.second, subject=self.english, name=f'Quiz {i}')
+        with patch.object(GradeRollups, 'apply_changes', wraps=GradeRollups.apply_changes) as apply_changes:
+            self.math.delete()
+        apply_changes.assert_called_once()
+        self.assertRollupsMatchRebuild()
+        self.student.delete()
+        self.second.delete()
+        self.assertFalse(GradeDistribution.objects.exists())
+        self.assertFalse(StudentPerformance.objects.exists())
+
+    def test_rebuild_command_repairs_drift(self):
+        self.create_grade('95')
+        GradeDistribution.objects.update(a_count=7, total_students=9)
+        StudentPerformance.objects.all().delete()
+        call_command('rebuild_rollups', stdout=StringIO())
+        distribution = GradeDistribution.objects.get()
+        self.assertEqual((distribution.a_count, distribution.total_students), (1, 1))
+        self.assertEqual(StudentPerformance.objects.get().average_grade, Decimal('95.00'))
+
+
+@skipUnless(ColumnarAnalytics.is_available(), 'numpy is not installed')
+class ColumnarAnalyticsTests(RollupAssertions, GradingTestData, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_school()
+        cls.second = cls.create_student('Alan', 'Turing', 'MGS002')
+        cls.third = cls.create_student('Grace', 'Hopper', 'MGS003')
+        scores = [
+            (cls.student, cls.math, 'TERM1', '89.99'), (cls.student, cls.english, 'TERM1', '90'),
+            (cls.second, cls.math, 'TERM1', '59.99'), (cls.second, cls.english, 'TERM1', '60'),
+            (cls.third, cls.math, 'TERM1', '95'), (cls.third, cls.math, 'TERM2', '71.5'),
+            (cls.student, cls.math, 'TERM2', '33.33'),
+        ]
+        for index, (student, subject, term, score) in enumerate(scores):
+            cls.create_grade(score, student=student, subject=subject, term=term, name=f'Test {index}')
+
+    def test_save_matches_orm_rebuild(self):
+        GradeRollups.rebuild()
+        expected = self.rollup_state()
+        GradeDistribution.objects.all().delete()
+        StudentPerformance.objects.update(total_subjects=0, average_grade=0)
+        ColumnarAnalytics.for_year(self.academic_year).save()
+        self.assertEqual(expected, self.rollup_state())
+
+    def test_single_term_save_leaves_other_terms(self):
+        ColumnarAnalytics.for_year(self.academic_year, term='TERM2').save()
+        self.assertEqual(set(GradeDistribution.objects.values_list('term', flat=True)), {'TERM1', 'TERM2'})
+
+    def test_subject_comparison_matches_calculator(self):
+        columnar = ColumnarAnalytics.for_year(self.academic_year).subject_comparison('TERM1')
+        orm = AnalyticsCalculator.get_subject_comparison('2024-2025', 'TERM1')
+        self.assertEqual(
+            [(row['subject'], row['total_students'], row['grade_distribution']) for row in columnar],
+            [(row['subject'], row['total_students'], row['grade_distribution']) for row in orm]
+        )
+        self.assertEqual(columnar[0]['average_score'], Decimal('81.66'))
+
+    def test_class_rankings_share_ranks_on_ties(self):
+        fourth = self.create_student('Edsger', 'Dijkstra', 'MGS004')
+        self.create_grade('90', student=fourth, subject=self.math)
+        self.create_grade('89.99', student=fourth, subject=self.english)
+        analytics = ColumnarAnalytics.for_year(self.academic_year)
+        rankings = analytics.class_rankings('TERM1')[self.class_obj.pk]
+        self.assertEqual([(student, rank) for student, average, rank in rankings], [
+            (self.third.pk, 1), (self.student.pk, 2), (fourth.pk, 2), (self.second.pk, 4)
+        ])
+        self.assertAlmostEqual(rankings[0][1], 95)
+        # 89.995 rounds half to even, as the stored average_grade does
+        self.assertAlmostEqual(rankings[1][1], 90)
+        self.assertAlmostEqual(analytics.class_averages('TERM1')[self.class_obj.pk], 574.97 / 7)
+
+    def ranking_state(self):
+        return list(StudentPerformance.objects.order_by('student_id', 'term').values_list(
+            'student_id', 'term', 'rank_in_class', 'class_size', 'subject_percentiles'
+        ))
+
+    def test_save_stores_the_same_ranks_as_the_orm(self):
+        fourth = self.create_student('Edsger', 'Dijkstra', 'MGS004')
+        self.create_grade('90', student=fourth, subject=self.math)
+        self.create_grade('89.99', student=fourth, subject=self.english)
+        PerformanceRankings.update_year('2024-2025')
+        expected = self.ranking_state()
+        StudentPerformance.objects.update(rank_in_class=None, class_size=None, subject_percentiles={})
+        ColumnarAnalytics.for_year(self.academic_year).save()
+        self.assertEqual(self.ranking_state(), expected)
+        self.assertEqual(StudentPerformance.objects.get(student=fourth, term='TERM1').rank_in_class, 2)
+
+    def term_state(self, term):
+        distributions, performances = self.rollup_state()
+        return (
+            [row for row in distributions if row['term'] == term],
+            [row for row in performances if row['term'] == term],
+            [row for row in self.ranking_state() if row[1] == term],
+        )
+
+    def test_calculator_engines_agree(self):
+        AnalyticsCalculator.recompute_term(self.academic_year, 'TERM1', engine='orm')
+        expected = self.term_state('TERM1')
+        GradeDistribution.objects.all().delete()
+        StudentPerformance.objects.all().delete()
+        with self.settings(ANALYTICS_ENGINE='numpy'):
+            self.assertEqual(AnalyticsCalculator.recompute_term(self.academic_year, 'TERM1'), (2, 3))
+            self.assertEqual(self.term_state('TERM1'), expected)
+            comparison = AnalyticsCalculator.get_subject_comparison('2024-2025', 'TERM1')
+        self.assertEqual(comparison[0]['average_score'], Decimal('81.66'))
+
+
+class PerformanceRankingTests(GradingTestData, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_school()
+        cls.second = cls.create_student('Alan', 'Turing', 'MGS002')
+        cls.third = cls.create_student('Grace', 'Hopper', 'MGS003')
+        cls.unassigned = cls.create_student('Edsger', 'Dijkstra', 'MGS004')
+        cls.unassigned.current_class = None
+        cls.unassigned.save()
+        for student, math, english in (
+            (cls.student, '90', '70'), (cls.second, '80', '80'), (cls.third, '60', '50'), (cls.unassigned, '100', '40'),
+        ):
+            cls.create_grade(math, student=student)
+            cls.create_grade(english, student=student, subject=cls.english)
+        cls.user = User.objects.create_user('teacher', password='secret')
+
+    def test_update_stores_class_ranks_and_percentiles(self):
+        self.assertEqual(PerformanceRankings.update('2024-2025', 'TERM1'), 4)
+        ranks = dict(StudentPerformance.objects.values_list('student_id', 'rank_in_class'))
+        # Ada and Alan tie on 80.00
+        self.assertEqual(ranks, {self.student.pk: 1, self.second.pk: 1, self.third.pk: 3, self.unassigned.pk: None})
+        self.assertEqual(StudentPerformance.objects.get(student=self.third).class_size, 3)
+        percentiles = StudentPerformance.objects.get(student=self.student).subject_percentiles
+        self.assertEqual(percentiles, {str(self.math.pk): 66.7, str(self.english.pk): 66.7})
+
+    def test_student_detail_api_exposes_rankings(self):
+        PerformanceRankings.update('2024-2025', 'TERM1')
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('grading:api_student_detail', args=[self.third.pk]))
+        performance = response.json()['performance'][0]
+        self.assertEqual((performance['rank_in_class'], performance['class_size']), (3, 3))
+        self.assertEqual(performance['subject_percentiles'], {'Mathematics': 0.0, 'English': 33.3})
+
+
+class AnalyticsCalculatorTests(GradingTestData, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_school()
+        cls.students = [cls.student] + [
+            cls.create_student('Student', str(index), f'MGS1{index:02}') for index in range(10)
+        ]
+        for index, student in enumerate(cls.students):
+            cls.create_grade(str(50 + index * 4), student=student)
+            cls.create_grade(str(90 - index), student=student, subject=cls.english)
+
+    def test_class_performance_uses_constant_queries(self):
+        with self.assertNumQueries(4):
+            performances = AnalyticsCalculator.get_class_performance(self.class_obj, '2024-2025', 'TERM1')
+        self.assertEqual(len(performances), 11)
+        averages = [performance.average_grade for performance in performances]
+        self.assertEqual(averages, sorted(averages, reverse=True))
+        self.assertEqual((performances[0].total_subjects, performances[0].grade_count), (2, 2))
+        self.assertEqual(performances[0].average_grade, Decimal('85.00'))
+
+    def test_subject_comparison_uses_constant_queries(self):
+        with self.assertNumQueries(4):
+            comparison = AnalyticsCalculator.get_subject_comparison('2024-2025', 'TERM1')
+        self.assertEqual([row['subject'] for row in comparison], ['English', 'Mathematics'])
+        self.assertEqual(comparison[1]['total_students'], 11)
+        self.assertEqual(comparison[1]['grade_distribution'], {'A': 1, 'B': 2, 'C': 3, 'D': 2, 'F': 3})
+        self.assertEqual(GradeDistribution.objects.get(subject=self.math).average_score, Decimal('70.00'))
+
+
+class RecomputeAnalyticsCommandTests(RollupAssertions, GradingTestData, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_school()
+        cls.second = cls.create_student('Alan', 'Turing', 'MGS002')
+        cls.create_grade('95')
+        cls.create_grade('55', student=cls.second, subject=cls.english, term='TERM2')
+
+    def setUp(self):
+        self.checkpoint = os.path.join(tempfile.mkdtemp(), 'recompute.checkpoint')
+
+    def recompute(self, *args):
+        out = StringIO()
+        call_command('recompute_analytics', '--workers', '1', '--checkpoint', self.checkpoint, *args, stdout=out)
+        return out.getvalue()
+
+    def test_matches_rollup_rebuild_and_ranks(self):
+        GradeDistribution.objects.update(a_count=5)
+        StudentPerformance.objects.filter(student=self.second).delete()
+        output = self.recompute()
+        self.assertIn(f'2024-2025/TERM1/subject/{self.math.pk}: 1 rows in', output)
+        self.assertFalse(os.path.exists(self.checkpoint))
+        self.assertEqual(StudentPerformance.objects.get(student=self.student).rank_in_class, 1)
+        self.assertRollupsMatchRebuild()
+
+    def test_resume_skips_finished_shards(self):
+        GradeDistribution.objects.update(a_count=5)
+        shard = f'2024-2025/TERM1/subject/{self.math.pk}'
+        with open(self.checkpoint, 'w') as f:
+            json.dump({'shards': {shard: 0.1}}, f)
+        output = self.recompute('--resume')
+        self.assertIn('Resuming: 1 shards already finished', output)
+        self.assertNotIn(f'{shard}:', output)
+        self.assertEqual(GradeDistribution.objects.get(subject=self.math).a_count, 5)
+        self.assertEqual(GradeDistribution.objects.get(subject=self.english).a_count, 0)
+
+
+class ParallelRecomputeAnalyticsTests(RollupAssertions, GradingTestData, TransactionTestCase):
+    """Worker processes need committed data, so this runs outside a test transaction"""
+
+    def setUp(self):
+        self.create_school()
+        self.second = self.create_student('Alan', 'Turing', 'MGS002')
+        for index, (student, subject, term, score) in enumerate([
+            (self.student, self.math, 'TERM1', '95'), (self.second, self.math, 'TERM1', '70'),
+            (self.student, self.english, 'TERM1', '65'), (self.second, self.english, 'TERM2', '55'),
+        ]):
+            self.create_grade(score, student=student, subject=subject, term=term, name=f'Test {index}')
+        self.checkpoint = os.path.join(tempfile.mkdtemp(), 'recompute.checkpoint')
+
+    def test_two_workers_write_concurrently(self):
+        GradeDistribution.objects.update(a_count=5)
+        StudentPerformance.objects.all().delete()
+        out = StringIO()
+        call_command('recompute_analytics', '--workers', '2', '--checkpoint', self.checkpoint, stdout=out)
+        self.assertIn('Recomputed 1 academic years', out.getvalue())
+        self.assertEqual(StudentPerformance.objects.get(student=self.student, term='TERM1').rank_in_class, 1)
+        self.assertEqual(StudentPerformance.objects.get(student=self.second, term='TERM1').rank_in_class, 2)
+        self.assertRollupsMatchRebuild()
@@ -44,37 +44,9 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         context = super().get_context_data(**kwargs)
         
         try:
-            from grading.models import Student, Subject, Grade, Class
-            from django.db.models import Avg, Count, Q
-            
-            # Basic statistics
-            context.update({
-                'total_students': Student.objects.filter(is_active=True).count(),
-                'active_students': Student.objects.filter(is_active=True).count(),
-                'total_subjects': Subject.objects.count(),
-                'total_grades': Grade.objects.count(),
-            })
-            
-            # Top performing students with their average grades
-            top_students = Student.objects.filter(is_active=True).annotate(
-                avg_grade=Avg('grade__percentage'),
-                grade_count=Count('grade')
-            ).filter(avg_grade__isnull=False, grade_count__gte=1).order_by('-avg_grade')[:6]
-            
-            context['top_students'] = top_students
-            
-            # Recent activity - last 5 grades entered
-            recent_grades = Grade.objects.select_related('student', 'subject').order_by('-created_at')[:5]
-            context['recent_grades'] = recent_grades
-            
-            # Class statistics
-            class_stats = Class.objects.annotate(
-                student_count=Count('student', filter=Q(student__is_active=True)),
-                avg_grade=Avg('student__grade__percentage')
-            ).filter(student_count__gt=0)
-            
-            context['class_stats'] = class_stats
-            
+            from grading.cache import DataCache
+            # Served from cache until the next grading write
+            context.update(DataCache.get_or_set('dashboard', self.get_statistics))
         except Exception as e:
             # Fallback data
             context.update({
@@ -87,4 +59,35 @@ class DashboardView(LoginRequiredMixin, TemplateView):
                 'class_stats': [],
             })
         
-        return context
\ No newline at end of file
+        return context
+    
+    @staticmethod
+    def get_statistics():
+        from grading.models import Student, Subject, Grade, Class
+        
+        # Basic statistics
+        statistics = {
+            'total_students': Student.objects.filter(is_active=True).count(),
+            'active_students': Student.objects.filter(is_active=True).count(),
+            'total_subjects': Subject.objects.count(),
+            'total_grades': Grade.objects.count(),
+        }
+        
+        # Top performing students with their average grades
+        statistics['top_students'] = list(Student.objects.filter(is_active=True).annotate(
+            avg_grade=Avg('grade__percentage'),
+            grade_count=Count('grade')
+        ).filter(avg_grade__isnull=False, grade_count__gte=1).order_by('-avg_grade')[:6])
+        
+        # Recent activity - last 5 grades entered
+        statistics['recent_grades'] = list(
+            Grade.objects.select_related('student', 'subject').order_by('-created_at')[:5]
+        )
+        
+        # Class statistics
+        statistics['class_stats'] = list(Class.objects.annotate(
+            student_count=Count('student', filter=Q(student__is_active=True)),
+            avg_grade=Avg('student__grade__percentage')
+        ).filter(student_count__gt=0))
+        
+        return statistics
\ No newline at end of file
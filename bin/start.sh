@@ -0,0 +1,38 @@
+#!/bin/sh
+# Starts the web service: gunicorn and the report worker (run_report_worker).
+# They share the SQLite database, so they run side by side in one service.
+# The worker is restarted whenever it exits, and SIGTERM/SIGINT stop both;
+# the service exits with gunicorn's status.
+set -u
+
+WORKER_RESTART_DELAY=${WORKER_RESTART_DELAY:-5}
+
+(
+    child=
+    trap 'if [ -n "$child" ]; then kill -TERM "$child" 2>/dev/null; wait "$child"; fi; exit 0' TERM INT
+    while :; do
+        python manage.py run_report_worker &
+        child=$!
+        wait "$child"
+        echo "run_report_worker exited with status $?; restarting in ${WORKER_RESTART_DELAY}s" >&2
+        child=
+        sleep "$WORKER_RESTART_DELAY"
+    done
+) &
+supervisor=$!
+
+gunicorn mgpas_core.wsgi:application &
+web=$!
+
+trap 'kill -TERM "$web" 2>/dev/null' TERM INT
+wait "$web"
+status=$?
+# wait returns early when a trapped signal arrives; wait again for gunicorn to finish
+if kill -0 "$web" 2>/dev/null; then
+    wait "$web"
+    status=$?
+fi
+
+kill -TERM "$supervisor" 2>/dev/null
+wait "$supervisor"
+exit "$status"
@@ -1,61 +1,327 @@
 # grading/api.py
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_GET, require_POST
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
-from datetime import timedelta
+from django.utils.dateparse import parse_date
+from datetime import date, timedelta
+from operator import itemgetter
 from django.db.models import Q, Avg, Count
 import json
-from .models import Student, Class, Grade, Subject
+from .models import AcademicYear, Student, Class, Grade, Subject
+from .cache import DataCache
+from .columnar import FORMATS, ColumnarTable
+from .conditional import Probe, conditional_api
+from .services import GradeStatistics, GradeBulkWriter, StudentGradeProfile
+from .pagination import KeysetPaginator
+from .search import SearchIndex
+from analytics.models import StudentPerformance
+from analytics.rankings import PerformanceRankings
+
+# Streaming responses: rows fetched per database round trip, and the
+# content types for the supported ?stream= formats.
+STREAM_CHUNK_SIZE = 2000
+STREAM_CONTENT_TYPES = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+}
+
+ASSESSMENT_TYPE_LABELS = dict(Grade.AssessmentType.choices)
+TERM_LABELS = dict(Grade.Term.choices)
+
+STUDENT_LIST_FIELDS = (
+    'id', 'first_name', 'last_name', 'student_id', 'email',
+    'is_active', 'enrollment_date', 'current_class'
+)
+GRADE_LIST_FIELDS = (
+    'id', 'assessment_name', 'assessment_type', 'score', 'max_score',
+    'percentage', 'term', 'date', 'student_id', 'student__first_name',
+    'student__last_name', 'subject__name', 'subject__id'
+)
+CLASS_LIST_FIELDS = ('id', 'name', 'academic_year__name')
+
+# ?format=columnar layouts. Grades send students, subjects, assessment types
+# and terms once each, with their display labels, instead of on every row.
+STUDENT_COLUMNS = ColumnarTable(
+    {field: field for field in STUDENT_LIST_FIELDS},
+    convert={'enrollment_date': date.isoformat},
+)
+GRADE_COLUMNS = ColumnarTable(
+    {
+        'id': 'id',
+        'student': 'student_id',
+        'subject': 'subject__id',
+        'assessment_name': 'assessment_name',
+        'assessment_type': 'assessment_type',
+        'score': 'score',
+        'max_score': 'max_score',
+        'percentage': 'percentage',
+        'term': 'term',
+        'date': 'date',
+    },
+    dictionaries={
+        'student': lambda grade: f"{grade['student__first_name']} {grade['student__last_name']}",
+        'subject': itemgetter('subject__name'),
+        'assessment_type': lambda grade: ASSESSMENT_TYPE_LABELS[grade['assessment_type']],
+        'term': lambda grade: TERM_LABELS[grade['term']],
+    },
+    convert={'score': float, 'max_score': float, 'percentage': float, 'date': date.isoformat},
+)
+CLASS_COLUMNS = ColumnarTable(
+    {'id': 'id', 'name': 'name', 'academic_year': 'academic_year__name'},
+    dictionaries={'academic_year': None},
+)
+SUBJECT_COLUMNS = ColumnarTable({'id': 'id', 'name': 'name', 'code': 'code'})
+SUBJECT_AVERAGE_COLUMNS = ColumnarTable(
+    {'subject': 'subject__name', 'average': 'average', 'count': 'count'}, convert={'average': float}
+)
+TERM_AVERAGE_COLUMNS = ColumnarTable(
+    {'term': 'term', 'average': 'average', 'count': 'count'}, convert={'average': float}
+)
+
+# Keyset orderings follow each model's Meta.ordering with 'id' as the
+# tie-breaker. Grades order on the raw student_id column so the cursor does
+# not pull in Student's own ordering.
+GRADE_PAGINATOR = KeysetPaginator(['-date', 'student_id', 'id'])
+STUDENT_PAGINATOR = KeysetPaginator(['last_name', 'first_name', 'id'])
+CLASS_PAGINATOR = KeysetPaginator(['id'])
+
+# Conditional-GET probes: what each endpoint's response is built from
+STUDENTS = Probe(Student)
+GRADES = Probe(Grade)
+SUBJECTS = Probe(Subject)
+CLASSES = Probe(Class)
+ACADEMIC_YEARS = Probe(AcademicYear)
+STUDENT = Probe(Student, scope=lambda request, student_id: {'pk': student_id})
+STUDENT_GRADES = Probe(Grade, scope=lambda request, student_id: {'student_id': student_id})
+STUDENT_PERFORMANCE = Probe(
+    StudentPerformance, 'calculated_at', scope=lambda request, student_id: {'student_id': student_id}
+)
+
+def _today(request):
+    return timezone.localdate().isoformat()
+
+def _serialize_grade(grade):
+    return {
+        'id': grade['id'],
+        'student_name': f"{grade['student__first_name']} {grade['student__last_name']}",
+        'subject_name': grade['subject__name'],
+        'subject': grade['subject__id'],
+        'assessment_name': grade['assessment_name'],
+        'assessment_type': grade['assessment_type'],
+        'assessment_type_display': ASSESSMENT_TYPE_LABELS[grade['assessment_type']],
+        'score': grade['score'],
+        'max_score': grade['max_score'],
+        'percentage': float(grade['percentage']),
+        'term': grade['term'],
+        'term_display': TERM_LABELS[grade['term']],
+        'date': grade['date'].isoformat() if grade['date'] else None
+    }
+
+def _encode_stream(rows, stream_format):
+    """Encode rows as a JSON array or NDJSON, one buffered chunk at a time"""
+    encoder = DjangoJSONEncoder()
+    ndjson = stream_format == 'ndjson'
+    buffer = [] if ndjson else ['[']
+    first = True
+    for row in rows:
+        if ndjson:
+            buffer.append(encoder.encode(row) + '\n')
+        else:
+            buffer.append(encoder.encode(row) if first else ',' + encoder.encode(row))
+        first = False
+        if len(buffer) >= STREAM_CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+    if not ndjson:
+        buffer.append(']')
+    if buffer:
+        yield ''.join(buffer)
+
+def _stream_format(request):
+    """Return the requested ?stream= format, None if not streaming, or raise ValueError"""
+    stream_format = request.GET.get('stream')
+    if not stream_format:
+        return None
+    if stream_format not in STREAM_CONTENT_TYPES:
+        raise ValueError(f"Unsupported stream format '{stream_format}'")
+    return stream_format
+
+def _streaming_response(rows, stream_format):
+    return StreamingHttpResponse(
+        _encode_stream(rows, stream_format),
+        content_type=STREAM_CONTENT_TYPES[stream_format]
+    )
+
+def _columnar(request):
+    """True for ?format=columnar, False for the default row format, or raise ValueError"""
+    response_format = request.GET.get('format') or 'json'
+    if response_format not in FORMATS:
+        raise ValueError(f"Unsupported format '{response_format}'")
+    return response_format == 'columnar'
+
+def _columnar_table(request, table):
+    """Return ``table`` if the request asked for ?format=columnar, else None"""
+    if not _columnar(request):
+        return None
+    if request.GET.get('stream'):
+        raise ValueError('format=columnar cannot be streamed')
+    return table
+
+def _is_paginated(request):
+    return 'cursor' in request.GET or 'page_size' in request.GET
+
+def _paginated_response(request, paginator, queryset, serialize=None, table=None):
+    """Return one keyset page as {'results': [...], 'next': cursor}, or ``table``'s columns plus 'next'"""
+    rows, next_cursor = paginator.paginate(
+        queryset,
+        cursor=request.GET.get('cursor'),
+        page_size=request.GET.get('page_size')
+    )
+    if table:
+        return JsonResponse({**table.encode(rows), 'next': next_cursor})
+    if serialize:
+        rows = [serialize(row) for row in rows]
+    return JsonResponse({'results': rows, 'next': next_cursor})
+
+def _date_param(request, name):
+    value = request.GET.get(name)
+    if not value:
+        return None
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValueError(f"{name} must be a date in YYYY-MM-DD format")
+    return parsed
+
+def _grade_filters(request):
+    """Build grade filters from term, subject_id, class_id, date_from and date_to"""
+    filters = Q()
+    term = request.GET.get('term')
+    subject_id = request.GET.get('subject_id')
+    class_id = request.GET.get('class_id')
+    date_from = _date_param(request, 'date_from')
+    date_to = _date_param(request, 'date_to')
+    if term:
+        filters &= Q(term=term)
+    if subject_id:
+        filters &= Q(subject_id=subject_id)
+    if class_id:
+        filters &= Q(student__current_class_id=class_id)
+    if date_from:
+        filters &= Q(date__gte=date_from)
+    if date_to:
+        filters &= Q(date__lte=date_to)
+    return filters
 
 @require_GET
 @login_required
+@conditional_api(STUDENTS, no_cache=True)
 def student_list_api(request):
-    students = Student.objects.all().values(
-        'id', 'first_name', 'last_name', 'student_id', 'email', 
-        'is_active', 'enrollment_date', 'current_class'
-    )
+    try:
+        stream_format = _stream_format(request)
+        table = _columnar_table(request, STUDENT_COLUMNS)
+        students = Student.objects.all()
+        if request.GET.get('class_id'):
+            students = students.filter(current_class_id=request.GET['class_id'])
+        students = students.values(*STUDENT_LIST_FIELDS)
+        
+        if _is_paginated(request):
+            return _paginated_response(request, STUDENT_PAGINATOR, students, table=table)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    if table:
+        return JsonResponse(table.encode(students))
+    if stream_format:
+        return _streaming_response(students.iterator(chunk_size=STREAM_CHUNK_SIZE), stream_format)
     return JsonResponse(list(students), safe=False)
 
+STUDENT_LOOKUP_PAGE_SIZE = 20
+
+@require_GET
+@login_required
+@conditional_api(STUDENTS, no_cache=True)
+def student_lookup_api(request):
+    """Paginated active-student matches for the typeahead student picker"""
+    query = request.GET.get('q', '').strip()
+    students = Student.objects.filter(is_active=True)
+    if query:
+        matches = SearchIndex.matching_ids('student', query)
+        if matches is not None:
+            students = students.filter(pk__in=matches)
+        else:
+            students = students.filter(
+                Q(first_name__istartswith=query) |
+                Q(last_name__istartswith=query) |
+                Q(student_id__istartswith=query)
+            )
+    students = students.values('id', 'first_name', 'last_name', 'student_id')
+    
+    try:
+        rows, next_cursor = STUDENT_PAGINATOR.paginate(
+            students,
+            cursor=request.GET.get('cursor'),
+            page_size=request.GET.get('page_size') or STUDENT_LOOKUP_PAGE_SIZE
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    results = [
+        {'id': row['id'], 'text': f"{row['first_name']} {row['last_name']} ({row['student_id']})"}
+        for row in rows
+    ]
+    return JsonResponse({'results': results, 'next': next_cursor})
+
 @require_GET
 @login_required
+@conditional_api(GRADES, STUDENTS, SUBJECTS, no_cache=True)
 def grade_list_api(request):
-    grades = Grade.objects.all().select_related('student', 'subject').values(
-        'id', 'assessment_name', 'assessment_type', 'score', 'max_score', 
-        'percentage', 'term', 'date', 'student__first_name', 'student__last_name',
-        'subject__name', 'subject__id'
-    )
+    try:
+        stream_format = _stream_format(request)
+        table = _columnar_table(request, GRADE_COLUMNS)
+        grades = Grade.objects.filter(_grade_filters(request)).values(*GRADE_LIST_FIELDS)
+        
+        if _is_paginated(request):
+            return _paginated_response(request, GRADE_PAGINATOR, grades, _serialize_grade, table)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
     
-    grades_list = []
-    for grade in grades:
-        grades_list.append({
-            'id': grade['id'],
-            'student_name': f"{grade['student__first_name']} {grade['student__last_name']}",
-            'subject_name': grade['subject__name'],
-            'subject': grade['subject__id'],
-            'assessment_name': grade['assessment_name'],
-            'assessment_type': grade['assessment_type'],
-            'assessment_type_display': dict(Grade.AssessmentType.choices)[grade['assessment_type']],
-            'score': grade['score'],
-            'max_score': grade['max_score'],
-            'percentage': float(grade['percentage']),
-            'term': grade['term'],
-            'term_display': dict(Grade.Term.choices)[grade['term']],
-            'date': grade['date'].isoformat() if grade['date'] else None
-        })
+    if table:
+        return JsonResponse(table.encode(grades))
+    if stream_format:
+        rows = map(_serialize_grade, grades.iterator(chunk_size=STREAM_CHUNK_SIZE))
+        return _streaming_response(rows, stream_format)
     
+    grades_list = [_serialize_grade(grade) for grade in grades]
     return JsonResponse(grades_list, safe=False)
 
 @require_GET
 @login_required
+@conditional_api(SUBJECTS, max_age=300)
 def subject_list_api(request):
+    try:
+        table = _columnar_table(request, SUBJECT_COLUMNS)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
     subjects = Subject.objects.all().values('id', 'name', 'code')
+    if table:
+        return JsonResponse(table.encode(subjects))
     return JsonResponse(list(subjects), safe=False)
 
 @require_GET
 @login_required
+@conditional_api(STUDENTS, GRADES, CLASSES, SUBJECTS, vary=_today, max_age=30)
 def statistics_api(request):
+    # Cached until the next grading write; the date keeps "last 30 days" current
+    payload = DataCache.get_or_set('statistics', _statistics_payload, vary=timezone.localdate())
+    return JsonResponse(payload)
+
+def _statistics_payload():
     # Student statistics
     total_students = Student.objects.count()
     active_students = Student.objects.filter(is_active=True).count()
@@ -65,22 +331,13 @@ def statistics_api(request):
     last_month = timezone.now() - timedelta(days=30)
     new_students = Student.objects.filter(created_at__gte=last_month).count()
     
-    # Grade statistics
-    total_grades = Grade.objects.count()
+    # Grade statistics: total, average and distribution in one pass
+    grade_stats = GradeStatistics.summarize(Grade.objects.all())
+    total_grades = grade_stats['total_grades']
     students_graded = Grade.objects.values('student').distinct().count()
     total_subjects = Subject.objects.count()
-    
-    # Average grade
-    average_grade = Grade.objects.aggregate(avg=Avg('percentage'))['avg']
-    
-    # Grade distribution
-    grade_distribution = {
-        'A': Grade.objects.filter(percentage__gte=90).count(),
-        'B': Grade.objects.filter(percentage__gte=80, percentage__lt=90).count(),
-        'C': Grade.objects.filter(percentage__gte=70, percentage__lt=80).count(),
-        'D': Grade.objects.filter(percentage__gte=60, percentage__lt=70).count(),
-        'F': Grade.objects.filter(percentage__lt=60).count()
-    }
+    average_grade = grade_stats['average_grade']
+    grade_distribution = grade_stats['grade_distribution']
     
     # Recent activity
     recent_grades = Grade.objects.order_by('-created_at')[:5].values(
@@ -88,7 +345,7 @@ def statistics_api(request):
         'assessment_name', 'percentage', 'created_at'
     )
     
-    return JsonResponse({
+    return {
         # Student stats
         'total_students': total_students,
         'active_students': active_students,
@@ -102,13 +359,17 @@ def statistics_api(request):
         'average_grade': average_grade,
         'grade_distribution': grade_distribution,
         'recent_grades': list(recent_grades)
-    })
+    }
 
 @require_GET
 @login_required
+@conditional_api(
+    STUDENT, STUDENT_GRADES, STUDENT_PERFORMANCE, SUBJECTS, CLASSES, ACADEMIC_YEARS, no_cache=True
+)
 def student_detail_api(request, student_id):
     try:
-        student = Student.objects.get(id=student_id)
+        profile = StudentGradeProfile.load(student_id)
+        student = profile.student
         student_data = {
             'id': student.id,
             'first_name': student.first_name,
@@ -123,42 +384,48 @@ def student_detail_api(request, student_id):
             'academic_year': student.academic_year.name if student.academic_year else None,
             'enrollment_date': student.enrollment_date.isoformat() if student.enrollment_date else None,
             'is_active': student.is_active,
-            'emergency_contact_name': student.emergency_contact_name,
-            'emergency_contact_phone': student.emergency_contact_phone
         }
         
-        # Get student grades
-        grades = Grade.objects.filter(student=student).select_related('subject').values(
-            'subject__name', 'assessment_name', 'assessment_type', 'score', 
-            'max_score', 'percentage', 'term', 'date'
-        )
-        
-        # Calculate subject averages
-        subject_stats = {}
-        for grade in grades:
-            subject_name = grade['subject__name']
-            if subject_name not in subject_stats:
-                subject_stats[subject_name] = {
-                    'total_score': 0,
-                    'count': 0,
-                    'grades': []
-                }
-            subject_stats[subject_name]['total_score'] += float(grade['percentage'])
-            subject_stats[subject_name]['count'] += 1
-            subject_stats[subject_name]['grades'].append(grade)
-        
-        # Calculate averages
-        for subject, stats in subject_stats.items():
-            stats['average_score'] = stats['total_score'] / stats['count'] if stats['count'] > 0 else 0
+        subject_stats = {
+            name: {
+                'total_score': float(tally.total),
+                'count': tally.count,
+                'average_score': float(tally.average),
+                'grades': [],
+            }
+            for name, tally in profile.subjects.items()
+        }
+        grades = []
+        for grade in profile.grades:
+            row = {
+                field: grade[field] for field in (
+                    'subject__name', 'assessment_name', 'assessment_type', 'score', 'max_score', 'percentage',
+                    'term', 'date',
+                )
+            }
+            grades.append(row)
+            subject_stats[grade['subject__name']]['grades'].append(row)
         
-        # Calculate overall average
+        # Mean of the subject averages, so every subject weighs the same
         overall_avg = sum(stats['average_score'] for stats in subject_stats.values()) / len(subject_stats) if subject_stats else 0
         
+        # Class rank and subject percentiles per term, as stored by the ranking job
+        performances = list(StudentPerformance.objects.filter(student=student).order_by('academic_year', 'term'))
+        performance_data = [{
+            'academic_year': performance.academic_year,
+            'term': performance.term,
+            'average_grade': performance.average_grade,
+            'rank_in_class': performance.rank_in_class,
+            'class_size': performance.class_size,
+            'subject_percentiles': percentiles,
+        } for performance, percentiles in zip(performances, PerformanceRankings.named_percentiles(performances))]
+        
         return JsonResponse({
             'student': student_data,
-            'grades': list(grades),
+            'grades': grades,
             'subject_stats': subject_stats,
-            'overall_average': overall_avg
+            'overall_average': overall_avg,
+            'performance': performance_data
         })
         
     except Student.DoesNotExist:
@@ -166,13 +433,33 @@ def student_detail_api(request, student_id):
 
 @require_GET
 @login_required
+@conditional_api(CLASSES, ACADEMIC_YEARS, max_age=300)
 def class_list_api(request):
-    classes = Class.objects.all().values('id', 'name', 'academic_year__name')
+    try:
+        table = _columnar_table(request, CLASS_COLUMNS)
+        classes = Class.objects.all()
+        if request.GET.get('academic_year_id'):
+            classes = classes.filter(academic_year_id=request.GET['academic_year_id'])
+        classes = classes.values(*CLASS_LIST_FIELDS)
+        
+        if _is_paginated(request):
+            return _paginated_response(request, CLASS_PAGINATOR, classes, table=table)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    if table:
+        return JsonResponse(table.encode(classes))
     return JsonResponse(list(classes), safe=False)
 
 @require_GET
 @login_required
+@conditional_api(GRADES, SUBJECTS, no_cache=True)
 def grade_statistics_api(request):
+    try:
+        columnar = _columnar(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
     # Get filter parameters
     term = request.GET.get('term')
     subject_id = request.GET.get('subject_id')
@@ -191,19 +478,7 @@ def grade_statistics_api(request):
     grades = Grade.objects.filter(filters)
     
     # Calculate statistics
-    total_grades = grades.count()
-    average_grade = grades.aggregate(avg=Avg('percentage'))['avg']
-    max_grade = grades.aggregate(max=Avg('percentage'))['max']
-    min_grade = grades.aggregate(min=Avg('percentage'))['min']
-    
-    # Grade distribution
-    grade_distribution = {
-        'A': grades.filter(percentage__gte=90).count(),
-        'B': grades.filter(percentage__gte=80, percentage__lt=90).count(),
-        'C': grades.filter(percentage__gte=70, percentage__lt=80).count(),
-        'D': grades.filter(percentage__gte=60, percentage__lt=70).count(),
-        'F': grades.filter(percentage__lt=60).count()
-    }
+    grade_stats = GradeStatistics.summarize(grades)
     
     # Subject-wise averages
     subject_averages = grades.values('subject__name').annotate(
@@ -218,13 +493,14 @@ def grade_statistics_api(request):
     ).order_by('term')
     
     return JsonResponse({
-        'total_grades': total_grades,
-        'average_grade': average_grade,
-        'max_grade': max_grade,
-        'min_grade': min_grade,
-        'grade_distribution': grade_distribution,
-        'subject_averages': list(subject_averages),
-        'term_averages': list(term_averages)
+        'total_grades': grade_stats['total_grades'],
+        'average_grade': grade_stats['average_grade'],
+        'max_grade': grade_stats['max_grade'],
+        'min_grade': grade_stats['min_grade'],
+        'pass_rate': grade_stats['pass_rate'],
+        'grade_distribution': grade_stats['grade_distribution'],
+        'subject_averages': SUBJECT_AVERAGE_COLUMNS.encode(subject_averages) if columnar else list(subject_averages),
+        'term_averages': TERM_AVERAGE_COLUMNS.encode(term_averages) if columnar else list(term_averages)
     })
 
 @csrf_exempt
@@ -234,48 +510,11 @@ def bulk_grade_upload_api(request):
     try:
         data = json.loads(request.body)
         grades_data = data.get('grades', [])
-        results = []
+        if not isinstance(grades_data, list):
+            return JsonResponse({'error': 'grades must be a list'}, status=400)
         
-        for grade_data in grades_data:
-            try:
-                # Check if grade already exists
-                grade, created = Grade.objects.get_or_create(
-                    student_id=grade_data['student_id'],
-                    subject_id=grade_data['subject_id'],
-                    assessment_name=grade_data['assessment_name'],
-                    term=grade_data['term'],
-                    defaults={
-                        'assessment_type': grade_data.get('assessment_type', 'TEST'),
-                        'score': grade_data['score'],
-                        'max_score': grade_data.get('max_score', 100),
-                        'date': grade_data.get('date', timezone.now().date()),
-                        'comments': grade_data.get('comments', ''),
-                        'created_by': request.user
-                    }
-                )
-                
-                if not created:
-                    # Update existing grade
-                    grade.assessment_type = grade_data.get('assessment_type', grade.assessment_type)
-                    grade.score = grade_data['score']
-                    grade.max_score = grade_data.get('max_score', grade.max_score)
-                    grade.date = grade_data.get('date', grade.date)
-                    grade.comments = grade_data.get('comments', grade.comments)
-                    grade.save()
-                
-                results.append({
-                    'success': True,
-                    'grade_id': grade.id,
-                    'created': created,
-                    'message': 'Grade processed successfully'
-                })
-                
-            except Exception as e:
-                results.append({
-                    'success': False,
-                    'error': str(e),
-                    'data': grade_data
-                })
+        # Validate in memory, then insert/update the whole batch in one transaction
+        results = GradeBulkWriter(user=request.user).write(grades_data)
         
         return JsonResponse({'results': results})
         
@@ -284,57 +523,88 @@ def bulk_grade_upload_api(request):
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+def _ranked(queryset, ids, *fields):
+    """Fetch ``ids`` as values() rows, keeping the order the index ranked them in"""
+    rows = {row['id']: row for row in queryset.filter(pk__in=ids).values(*fields)}
+    return [rows[pk] for pk in ids if pk in rows]
+
 @require_GET
 @login_required
+@conditional_api(STUDENTS, GRADES, SUBJECTS, no_cache=True)
 def search_api(request):
     query = request.GET.get('q', '')
     search_type = request.GET.get('type', 'all')
     
     results = {}
     
+    # Ranked prefix matches come from the FTS5 index; SearchIndex.search()
+    # returns None when the index is unavailable and we fall back to icontains.
     if search_type in ['all', 'students']:
-        students = Student.objects.filter(
-            Q(first_name__icontains=query) |
-            Q(last_name__icontains=query) |
-            Q(student_id__icontains=query) |
-            Q(email__icontains=query)
-        )[:10].values('id', 'first_name', 'last_name', 'student_id')
-        results['students'] = list(students)
+        student_fields = ('id', 'first_name', 'last_name', 'student_id')
+        ids = SearchIndex.search('student', query)
+        if ids is not None:
+            results['students'] = _ranked(Student.objects.all(), ids, *student_fields)
+        else:
+            students = Student.objects.filter(
+                Q(first_name__icontains=query) |
+                Q(last_name__icontains=query) |
+                Q(student_id__icontains=query) |
+                Q(email__icontains=query)
+            )[:10].values(*student_fields)
+            results['students'] = list(students)
     
     if search_type in ['all', 'grades']:
-        grades = Grade.objects.filter(
-            Q(student__first_name__icontains=query) |
-            Q(student__last_name__icontains=query) |
-            Q(subject__name__icontains=query) |
-            Q(assessment_name__icontains=query)
-        )[:10].values(
+        grade_fields = (
             'id', 'student__first_name', 'student__last_name',
             'subject__name', 'assessment_name', 'percentage'
         )
-        results['grades'] = list(grades)
+        ids = SearchIndex.search('grade', query)
+        if ids is not None:
+            results['grades'] = _ranked(Grade.objects.all(), ids, *grade_fields)
+        else:
+            grades = Grade.objects.filter(
+                Q(student__first_name__icontains=query) |
+                Q(student__last_name__icontains=query) |
+                Q(subject__name__icontains=query) |
+                Q(assessment_name__icontains=query)
+            )[:10].values(*grade_fields)
+            results['grades'] = list(grades)
     
     if search_type in ['all', 'subjects']:
-        subjects = Subject.objects.filter(
-            Q(name__icontains=query) |
-            Q(code__icontains=query)
-        )[:10].values('id', 'name', 'code')
-        results['subjects'] = list(subjects)
+        subject_fields = ('id', 'name', 'code')
+        ids = SearchIndex.search('subject', query)
+        if ids is not None:
+            results['subjects'] = _ranked(Subject.objects.all(), ids, *subject_fields)
+        else:
+            subjects = Subject.objects.filter(
+                Q(name__icontains=query) |
+                Q(code__icontains=query)
+            )[:10].values(*subject_fields)
+            results['subjects'] = list(subjects)
     
     return JsonResponse(results)
 
 @require_GET
 @login_required
+@conditional_api(STUDENTS, GRADES, SUBJECTS, vary=_today, max_age=30)
 def dashboard_stats_api(request):
+    # Polled by the dashboard; served from cache until the next grading write
+    payload = DataCache.get_or_set('dashboard_stats', _dashboard_stats_payload, vary=timezone.localdate())
+    return JsonResponse(payload)
+
+def _dashboard_stats_payload():
     # Real-time dashboard statistics
     total_students = Student.objects.count()
     active_students = Student.objects.filter(is_active=True).count()
-    total_grades = Grade.objects.count()
+    grade_stats = GradeStatistics.summarize(Grade.objects.all())
+    total_grades = grade_stats['total_grades']
     total_subjects = Subject.objects.count()
     
     # Today's activity
-    today = timezone.now().date()
-    today_grades = Grade.objects.filter(created_at__date=today).count()
-    today_students = Student.objects.filter(created_at__date=today).count()
+    # A range on the raw column (rather than created_at__date) can use the index
+    start_of_day = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    today_grades = Grade.objects.filter(created_at__gte=start_of_day).count()
+    today_students = Student.objects.filter(created_at__gte=start_of_day).count()
     
     # Recent grades
     recent_grades = Grade.objects.select_related('student', 'subject').order_by('-created_at')[:5].values(
@@ -342,16 +612,7 @@ def dashboard_stats_api(request):
         'assessment_name', 'percentage', 'created_at'
     )
     
-    # Grade distribution
-    grade_distribution = {
-        'A': Grade.objects.filter(percentage__gte=90).count(),
-        'B': Grade.objects.filter(percentage__gte=80, percentage__lt=90).count(),
-        'C': Grade.objects.filter(percentage__gte=70, percentage__lt=80).count(),
-        'D': Grade.objects.filter(percentage__gte=60, percentage__lt=70).count(),
-        'F': Grade.objects.filter(percentage__lt=60).count()
-    }
-    
-    return JsonResponse({
+    return {
         'total_students': total_students,
         'active_students': active_students,
         'total_grades': total_grades,
@@ -359,5 +620,5 @@ def dashboard_stats_api(request):
         'today_grades': today_grades,
         'today_students': today_students,
         'recent_grades': list(recent_grades),
-        'grade_distribution': grade_distribution
-    })
\ No newline at end of file
+        'grade_distribution': grade_stats['grade_distribution']
+    }
\ No newline at end of file
@@ -0,0 +1,91 @@
+import time
+from collections import Counter
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+from .models import DataGeneration
+
+_MISSING = object()
+
+class DataCache:
+    """Cache for payloads derived from grading data, keyed by a generation counter.
+
+    Every entry key embeds the current data generation. Writes to grades,
+    students, subjects and classes bump the generation (after their
+    transaction commits), so stale entries are never read again and simply
+    expire. The generation is a DataGeneration row, read with one primary
+    key lookup per payload, so a write in any process (web worker, report
+    worker or management command) invalidates every process's entries.
+    Payloads live in the ``DATA_CACHE_ALIAS`` cache, which may be per process.
+    """
+    GENERATION_PK = 1
+
+    # Per-process hit/miss counters, by payload name
+    hits = Counter()
+    misses = Counter()
+
+    @staticmethod
+    def backend():
+        return caches[getattr(settings, 'DATA_CACHE_ALIAS', 'default')]
+
+    @classmethod
+    def start(cls):
+        # Start from the clock so a recreated counter never reuses an old
+        # generation that a per-process cache may still hold
+        DataGeneration.objects.bulk_create(
+            [DataGeneration(pk=cls.GENERATION_PK, value=time.time_ns())], ignore_conflicts=True
+        )
+
+    @classmethod
+    def generation(cls):
+        rows = DataGeneration.objects.filter(pk=cls.GENERATION_PK).values_list('value', flat=True)
+        generation = rows.first()
+        if generation is None:
+            cls.start()
+            generation = rows.first()
+        return generation
+
+    @classmethod
+    def bump(cls):
+        if not DataGeneration.objects.filter(pk=cls.GENERATION_PK).update(value=F('value') + 1):
+            cls.start()
+
+    @classmethod
+    def invalidate(cls):
+        """Bump the generation once the current transaction (if any) commits"""
+        transaction.on_commit(cls.bump)
+
+    @classmethod
+    def get_or_set(cls, name, compute, timeout=None, vary=None, version=None):
+        """Return the cached payload ``name`` for this generation, computing it on a miss.
+
+        ``vary`` adds to the key without splitting the hit/miss counters,
+        e.g. the date for payloads with "today" figures. ``version`` replaces
+        the generation for payloads that probe the rows they read themselves,
+        so unrelated writes don't invalidate them.
+        """
+        cache = cls.backend()
+        if version is None:
+            version = cls.generation()
+        key = f'grading:{name}:{vary}:{version}'
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            cls.hits[name] += 1
+            return value
+        cls.misses[name] += 1
+        value = compute()
+        if timeout is None:
+            timeout = getattr(settings, 'DATA_CACHE_TIMEOUT', 300)
+        cache.set(key, value, timeout)
+        return value
+
+    @classmethod
+    def stats(cls):
+        names = sorted(set(cls.hits) | set(cls.misses))
+        return {name: {'hits': cls.hits[name], 'misses': cls.misses[name]} for name in names}
+
+    @classmethod
+    def reset_stats(cls):
+        cls.hits.clear()
+        cls.misses.clear()
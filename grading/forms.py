@@ -1,5 +1,6 @@
 from django import forms
 from .models import Grade, Student, Subject
+from .widgets import StudentTypeaheadWidget
 
 class GradeForm(forms.ModelForm):
     class Meta:
@@ -7,6 +8,7 @@ class GradeForm(forms.ModelForm):
         fields = ['student', 'subject', 'assessment_name', 'assessment_type', 
                  'score', 'max_score', 'term', 'date', 'comments']
         widgets = {
+            'student': StudentTypeaheadWidget(),
             'date': forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
             'comments': forms.Textarea(attrs={'rows': 3, 'class': 'form-control'}),
         }
@@ -0,0 +1,180 @@
+import csv
+import json
+import os
+import time
+from itertools import islice
+from django.core.management.base import BaseCommand, CommandError
+from grading.models import Student, Subject
+from grading.services import GradeBulkWriter, GradeValidationError
+from authentication.models import User
+
+class Command(BaseCommand):
+    help = 'Import grades from a CSV or NDJSON file in batched transactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or NDJSON file with one grade per row')
+        parser.add_argument('--format', choices=['csv', 'ndjson'],
+                            help='Input format (default: guessed from the file extension)')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Rows written per transaction (default: 2000)')
+        parser.add_argument('--created-by', help='Username recorded as created_by on new grades')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Validate every row without writing anything')
+        parser.add_argument('--checkpoint',
+                            help='Checkpoint file (default: <path>.checkpoint)')
+        parser.add_argument('--resume', action='store_true',
+                            help='Skip the rows already committed according to the checkpoint')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"File not found: {path}")
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+
+        input_format = options['format'] or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+        checkpoint_path = options['checkpoint'] or f"{path}.checkpoint"
+        dry_run = options['dry_run']
+
+        user = None
+        if options['created_by']:
+            try:
+                user = User.objects.get(username=options['created_by'])
+            except User.DoesNotExist:
+                raise CommandError(f"Unknown user: {options['created_by']}")
+
+        skip = self.read_checkpoint(checkpoint_path, path) if options['resume'] else 0
+        if skip:
+            self.stdout.write(f"Resuming after row {skip}")
+
+        # Natural key -> primary key maps, loaded once
+        students = dict(Student.objects.values_list('student_id', 'pk'))
+        subjects = dict(Subject.objects.values_list('code', 'pk'))
+        writer = GradeBulkWriter(user=user, chunk_size=options['chunk_size'])
+
+        totals = {'created': 0, 'updated': 0, 'failed': 0}
+        processed = skip
+        started = time.monotonic()
+
+        with open(path, newline='', encoding='utf-8') as source:
+            rows = self.read_rows(source, input_format)
+            for _ in islice(rows, skip):
+                pass
+
+            while True:
+                chunk = list(islice(rows, options['chunk_size']))
+                if not chunk:
+                    break
+
+                batch = []
+                for offset, row in enumerate(chunk):
+                    line = processed + offset + 1
+                    try:
+                        batch.append((line, self.resolve(row, students, subjects)))
+                    except GradeValidationError as e:
+                        self.report_error(line, e)
+                        totals['failed'] += 1
+
+                if dry_run:
+                    for line, row in batch:
+                        try:
+                            writer.clean(row)
+                        except GradeValidationError as e:
+                            self.report_error(line, e)
+                            totals['failed'] += 1
+                else:
+                    results = writer.write([row for line, row in batch])
+                    for (line, row), result in zip(batch, results):
+                        if not result['success']:
+                            self.report_error(line, result['error'])
+                            totals['failed'] += 1
+                        elif result['created']:
+                            totals['created'] += 1
+                        else:
+                            totals['updated'] += 1
+
+                processed += len(chunk)
+                if not dry_run:
+                    self.write_checkpoint(checkpoint_path, path, processed)
+                if options['verbosity'] >= 2:
+                    self.stdout.write(f"{processed} rows, {self.rate(processed - skip, started):.0f} rows/s")
+
+        if not dry_run and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+        imported = processed - skip
+        elapsed = time.monotonic() - started
+        rate = self.rate(imported, started)
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS(
+                f"Dry run: validated {imported} rows in {elapsed:.1f}s ({rate:.0f} rows/s), "
+                f"{totals['failed']} invalid. Nothing was written."
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Imported {imported} rows in {elapsed:.1f}s ({rate:.0f} rows/s): "
+                f"{totals['created']} created, {totals['updated']} updated, {totals['failed']} failed"
+            ))
+
+    @staticmethod
+    def read_rows(source, input_format):
+        """Yield one dict per input row without loading the file"""
+        if input_format == 'csv':
+            yield from csv.DictReader(source)
+            return
+        for line in source:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                yield {'_error': f"Invalid JSON: {e}"}
+
+    @staticmethod
+    def resolve(row, students, subjects):
+        """Map Student.student_id and Subject.code to primary keys"""
+        if not isinstance(row, dict):
+            raise GradeValidationError('Row must be an object')
+        if '_error' in row:
+            raise GradeValidationError(row['_error'])
+        student = students.get(str(row.get('student_id', '')).strip())
+        if student is None:
+            raise GradeValidationError(f"Unknown student_id '{row.get('student_id')}'")
+        subject = subjects.get(str(row.get('subject_code', '')).strip())
+        if subject is None:
+            raise GradeValidationError(f"Unknown subject_code '{row.get('subject_code')}'")
+
+        resolved = {
+            name: row[name] for name in (
+                'assessment_name', 'assessment_type', 'score', 'max_score', 'term', 'date', 'comments'
+            ) if row.get(name) not in (None, '')
+        }
+        resolved['student_id'] = student
+        resolved['subject_id'] = subject
+        return resolved
+
+    def report_error(self, line, error):
+        self.stderr.write(f"Row {line}: {error}")
+
+    @staticmethod
+    def rate(rows, started):
+        elapsed = time.monotonic() - started
+        return rows / elapsed if elapsed > 0 else 0
+
+    @staticmethod
+    def read_checkpoint(checkpoint_path, path):
+        if not os.path.exists(checkpoint_path):
+            return 0
+        with open(checkpoint_path) as f:
+            checkpoint = json.load(f)
+        if checkpoint.get('source') != os.path.abspath(path):
+            raise CommandError(f"{checkpoint_path} belongs to {checkpoint.get('source')}")
+        return checkpoint['rows']
+
+    @staticmethod
+    def write_checkpoint(checkpoint_path, path, rows):
+        # Write then rename so a crash never leaves a half-written checkpoint
+        temp_path = f"{checkpoint_path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({'source': os.path.abspath(path), 'rows': rows}, f)
+        os.replace(temp_path, checkpoint_path)
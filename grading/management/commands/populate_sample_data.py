@@ -1,42 +1,214 @@
-from django.core.management.base import BaseCommand
-from grading.models import Student, Subject, Grade, Class, AcademicYear
-from authentication.models import User
 import random
-from datetime import date
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from grading.cache import DataCache
+from grading.models import Student, Subject, Grade, Class, AcademicYear
+from grading.search import SearchIndex
+from analytics.rankings import PerformanceRankings
+from analytics.rollups import GradeRollups
+
+FIRST_NAMES = [
+    'Chanda', 'Mwila', 'Bupe', 'Mutale', 'Natasha', 'Kondwani', 'Thandiwe', 'Lubasi', 'Mapalo', 'Musonda',
+    'Chileshe', 'Kabwe', 'Naledi', 'Tiza', 'Luyando', 'Mulenga', 'Zanele', 'Kasonde', 'Chipo', 'Bwalya',
+]
+LAST_NAMES = [
+    'Banda', 'Phiri', 'Mwanza', 'Zulu', 'Tembo', 'Lungu', 'Daka', 'Mbewe', 'Sakala', 'Chanda',
+    'Mumba', 'Ngoma', 'Kunda', 'Musonda', 'Bwalya', 'Chola', 'Nyirenda', 'Kapata', 'Simukonda', 'Mulenga',
+]
+SUBJECTS = [
+    ('Mathematics', 'MATH'), ('English', 'ENG'), ('Science', 'SCI'), ('Social Studies', 'SOC'),
+    ('Creative Arts', 'ART'), ('Religious Education', 'RE'), ('Physical Education', 'PE'),
+    ('Home Economics', 'HE'), ('Computer Studies', 'ICT'), ('French', 'FRE'), ('Agriculture', 'AGR'),
+    ('Music', 'MUS'),
+]
+# Assessments cycle through these types within each subject and term
+ASSESSMENTS = [
+    (Grade.AssessmentType.QUIZ, 'Quiz', 20),
+    (Grade.AssessmentType.TEST, 'Test', 100),
+    (Grade.AssessmentType.ASSIGNMENT, 'Assignment', 50),
+    (Grade.AssessmentType.EXAM, 'Exam', 100),
+]
 
 class Command(BaseCommand):
-    help = 'Populate sample data'
-    
+    help = 'Populate sample data: academic years, classes, subjects, students and grades'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--years', type=int, default=1, help='Academic years to create (default: 1)')
+        parser.add_argument('--first-year', type=int, default=2024,
+                            help='Calendar year the first academic year starts in (default: 2024)')
+        parser.add_argument('--classes', type=int, default=3, help='Classes per academic year (default: 3)')
+        parser.add_argument('--subjects', type=int, default=3,
+                            help=f'Subjects, at most {len(SUBJECTS)} (default: 3)')
+        parser.add_argument('--students', type=int, default=20, help='Students per academic year (default: 20)')
+        parser.add_argument('--grades-per-term', type=int, default=2,
+                            help='Assessments per student, subject and term (default: 2)')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed; the same seed gives the same data')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows per INSERT batch: bulk_create for students, executemany for grades (default: 5000)')
+        parser.add_argument('--skip-derived', action='store_true',
+                            help="Don't rebuild the search index, rollups and rankings afterwards")
+
     def handle(self, *args, **options):
-        # Create academic year
-        ay, created = AcademicYear.objects.get_or_create(
-            name="2024-2025",
-            defaults={'start_date': date(2024, 1, 15), 'end_date': date(2024, 12, 15), 'is_current': True}
-        )
-        
-        # Create classes
-        classes = []
-        for name in ['Grade 7A', 'Grade 7B', 'Grade 8A']:
-            cls, created = Class.objects.get_or_create(name=name, academic_year=ay)
-            classes.append(cls)
-        
-        # Create subjects
+        for name in ('years', 'classes', 'students', 'chunk_size'):
+            if options[name] < 1:
+                raise CommandError(f"--{name.replace('_', '-')} must be positive")
+        if not 1 <= options['subjects'] <= len(SUBJECTS):
+            raise CommandError(f'--subjects must be between 1 and {len(SUBJECTS)}')
+        if options['grades_per_term'] < 0:
+            raise CommandError('--grades-per-term cannot be negative')
+
+        rng = random.Random(options['seed'])
+        started = time.monotonic()
+
         subjects = []
-        for name, code in [('Mathematics', 'MATH'), ('English', 'ENG'), ('Science', 'SCI')]:
-            sub, created = Subject.objects.get_or_create(name=name, code=code)
-            subjects.append(sub)
-        
-        # Create students
-        for i in range(20):
-            Student.objects.create(
-                first_name=f"Student{i+1}",
-                last_name="Demo",
-                student_id=f"MGS{2024000 + i}",
-                date_of_birth=date(2010, 1, 1),
-                current_class=random.choice(classes),
-                academic_year=ay,
-                enrollment_date=date(2024, 1, 15),
-                is_active=True
+        for name, code in SUBJECTS[:options['subjects']]:
+            subject, created = Subject.objects.get_or_create(code=code, defaults={'name': name})
+            subjects.append(subject)
+        # Harder subjects pull every score down a little
+        difficulty = {subject.pk: rng.gauss(0, 5) for subject in subjects}
+
+        total_students = total_grades = 0
+        years = []
+        for offset in range(options['years']):
+            start_year = options['first_year'] + offset
+            year, created = AcademicYear.objects.get_or_create(
+                name=f'{start_year}-{start_year + 1}',
+                defaults={
+                    'start_date': date(start_year, 9, 1),
+                    'end_date': date(start_year + 1, 7, 31),
+                }
+            )
+            years.append(year)
+            classes = [
+                Class.objects.get_or_create(name=f'Grade {7 + index // 2}{"AB"[index % 2]}', academic_year=year)[0]
+                for index in range(options['classes'])
+            ]
+            students = self.create_students(rng, year, classes, options['students'], options['chunk_size'])
+            total_students += len(students)
+            total_grades += self.create_grades(
+                rng, year, students, subjects, difficulty, options['grades_per_term'], options['chunk_size']
             )
-        
-        self.stdout.write(self.style.SUCCESS('Sample data created successfully!'))
\ No newline at end of file
+        # The newest generated year becomes the only current one
+        AcademicYear.objects.exclude(pk=years[-1].pk).filter(is_current=True).update(is_current=False)
+        AcademicYear.objects.filter(pk=years[-1].pk).update(is_current=True)
+        self.stdout.write(
+            f"Created {total_students} students and {total_grades} grades in {time.monotonic() - started:.1f}s"
+        )
+
+        # bulk_create skips the signals that maintain these
+        DataCache.invalidate()
+        if not options['skip_derived'] and total_grades:
+            derived_started = time.monotonic()
+            SearchIndex.rebuild()
+            for year in years:
+                GradeRollups.rebuild(year.name)
+                PerformanceRankings.update_year(year.name)
+            self.stdout.write(
+                f"Rebuilt search index, rollups and rankings in {time.monotonic() - derived_started:.1f}s"
+            )
+
+        self.stdout.write(self.style.SUCCESS('Sample data created successfully!'))
+
+    @staticmethod
+    def create_students(rng, year, classes, count, chunk_size):
+        """Create the year's missing students; returns (pk, ability) for new students only"""
+        prefix = f'MGS{year.start_date.year}'
+        wanted = [f'{prefix}{index:05d}' for index in range(count)]
+        existing = set(Student.objects.filter(student_id__in=wanted).values_list('student_id', flat=True))
+        new_students = []
+        for index, student_id in enumerate(wanted):
+            first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            if student_id in existing:
+                continue
+            new_students.append(Student(
+                first_name=first_name,
+                last_name=last_name,
+                student_id=student_id,
+                date_of_birth=date(year.start_date.year - 12, 1, 1) + timedelta(days=rng.randrange(730)),
+                current_class=classes[index % len(classes)],
+                academic_year=year,
+                enrollment_date=year.start_date,
+                is_active=True
+            ))
+        Student.objects.bulk_create(new_students, batch_size=chunk_size)
+        created = dict(Student.objects.filter(
+            student_id__in=[student.student_id for student in new_students]
+        ).values_list('student_id', 'pk'))
+        # Each student's underlying ability, around a 68% school average
+        return [(created[student.student_id], rng.gauss(68, 12)) for student in new_students]
+
+    @staticmethod
+    def create_grades(rng, year, students, subjects, difficulty, per_term, chunk_size):
+        """Insert every grade for ``students``; returns the number created"""
+        if not per_term or not students:
+            return 0
+        # Compiling bulk_create's SQL dominates at this volume, so the INSERT is built once and
+        # each distinct value goes through its field's get_db_prep_save once, as save() would
+        columns = [
+            'student', 'subject', 'assessment_name', 'assessment_type', 'score', 'max_score',
+            'percentage', 'term', 'date', 'comments', 'created_at', 'updated_at',
+        ]
+        fields = {name: Grade._meta.get_field(name) for name in columns}
+        quote = connection.ops.quote_name
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            quote(Grade._meta.db_table),
+            ', '.join(quote(fields[name].column) for name in columns),
+            ', '.join(['%s'] * len(columns)),
+        )
+
+        def prepare(name, value):
+            return fields[name].get_db_prep_save(value, connection)
+
+        # (score, max_score, percentage) for every half mark; percentage is computed here
+        # because nothing goes through Grade.save
+        marks = {}
+        for assessment_type, label, maximum in ASSESSMENTS:
+            marks[maximum] = [
+                (
+                    prepare('score', Decimal(half) / 2),
+                    prepare('max_score', Decimal(maximum)),
+                    prepare('percentage', Grade.compute_percentage(Decimal(half) / 2, Decimal(maximum))),
+                )
+                for half in range(maximum * 2 + 1)
+            ]
+        assessments = []
+        for number in range(per_term):
+            assessment_type, label, maximum = ASSESSMENTS[number % len(ASSESSMENTS)]
+            assessments.append((
+                prepare('assessment_name', f'{label} {number // len(ASSESSMENTS) + 1}'),
+                prepare('assessment_type', assessment_type),
+                marks[maximum],
+                maximum / 50,
+            ))
+        term_days = (year.end_date - year.start_date).days // len(Grade.Term.values)
+        comments = prepare('comments', '')
+        now = prepare('created_at', timezone.now())
+
+        created = 0
+        batch = []
+        with transaction.atomic(), connection.cursor() as cursor:
+            for term_index, term in enumerate(Grade.Term.values):
+                term_start = year.start_date + timedelta(days=term_index * term_days)
+                days = [prepare('date', term_start + timedelta(days=day)) for day in range(term_days)]
+                term = prepare('term', term)
+                for student_id, ability in students:
+                    for subject in subjects:
+                        expected = ability + difficulty[subject.pk]
+                        for name, assessment_type, scores, scale in assessments:
+                            percent = expected + rng.gauss(0, 9)
+                            score, maximum, percentage = scores[round(min(max(percent, 0), 100) * scale)]
+                            batch.append((
+                                student_id, subject.pk, name, assessment_type, score, maximum,
+                                percentage, term, days[rng.randrange(term_days)], comments, now, now,
+                            ))
+                            if len(batch) >= chunk_size:
+                                cursor.executemany(sql, batch)
+                                created += len(batch)
+                                batch = []
+            if batch:
+                cursor.executemany(sql, batch)
+                created += len(batch)
+        return created
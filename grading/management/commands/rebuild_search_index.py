@@ -0,0 +1,16 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from grading.search import SearchIndex
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for students, subjects and grades'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if not SearchIndex.rebuild():
+            raise CommandError(
+                'Full-text search index is unavailable (requires SQLite with FTS5 and migrated tables)'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Search index rebuilt in {time.monotonic() - started:.1f}s'
+        ))
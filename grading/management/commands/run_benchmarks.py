@@ -0,0 +1,79 @@
+import time
+from io import StringIO
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from mgpas_core import benchmarks
+
+
+class Command(BaseCommand):
+    help = ('Time the hot endpoints, views and services against a seeded test database, '
+            'and fail on query-budget regressions against the committed baselines; latency '
+            'regressions are reported, and fail the run with --strict-latency')
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', help='Only run these scenarios (default: all)')
+        parser.add_argument('--iterations', type=int, default=20, help='Timed calls per scenario (default: 20)')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed calls per scenario (default: 2)')
+        parser.add_argument('--threshold', type=float, default=benchmarks.THRESHOLD,
+                            help=f'Allowed p50 slowdown as a fraction (default: {benchmarks.THRESHOLD})')
+        parser.add_argument('--strict-latency', action='store_true',
+                            help='Fail on latency regressions too, not only on query regressions')
+        parser.add_argument('--baseline', default=benchmarks.BASELINE_PATH,
+                            help='Baseline file (default: mgpas_core/benchmark_baselines.json)')
+        parser.add_argument('--update-baseline', action='store_true',
+                            help='Write these results as the new baseline instead of comparing')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1 or options['warmup'] < 0:
+            raise CommandError('--iterations must be positive and --warmup not negative')
+        scenarios = benchmarks.SCENARIOS
+        if options['scenarios']:
+            known = {scenario.name: scenario for scenario in scenarios}
+            unknown = sorted(set(options['scenarios']) - set(known))
+            if unknown:
+                raise CommandError(f"Unknown scenarios: {', '.join(unknown)}")
+            scenarios = [known[name] for name in options['scenarios']]
+
+        baseline = None
+        if not options['update_baseline']:
+            baseline = benchmarks.load_baseline(options['baseline'])
+            if baseline and baseline.get('dataset') != benchmarks.DATASET:
+                raise CommandError('The baseline was recorded against a different dataset; run --update-baseline')
+
+        # Never touch the configured database: seed and measure a throwaway test database
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            started = time.monotonic()
+            benchmarks.seed(stdout=StringIO())
+            self.stdout.write(f"Seeded the benchmark dataset in {time.monotonic() - started:.1f}s")
+            results = benchmarks.run(scenarios, options['iterations'], options['warmup'], self.report)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        if options['update_baseline']:
+            if options['scenarios'] and (recorded := benchmarks.load_baseline(options['baseline'])):
+                results = {**recorded.get('scenarios', {}), **results}
+            benchmarks.save_baseline(results, options['baseline'])
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['baseline']}"))
+            return
+
+        failures = benchmarks.compare(results, baseline or {}, scenarios)
+        slowdowns = benchmarks.slowdowns(results, baseline or {}, options['threshold'])
+        if baseline is None:
+            self.stdout.write(self.style.WARNING('No baseline found; only query budgets were checked'))
+        for slowdown in slowdowns:
+            self.stdout.write(self.style.WARNING(slowdown))
+        if options['strict_latency']:
+            failures += slowdowns
+        if failures:
+            for failure in failures:
+                self.stderr.write(failure)
+            raise CommandError(f'{len(failures)} benchmark regressions')
+        self.stdout.write(self.style.SUCCESS(f'{len(results)} scenarios within budget'))
+
+    def report(self, name, result):
+        self.stdout.write(
+            f"{name:<36} p50 {result['p50_ms']:>8.2f}ms  p95 {result['p95_ms']:>8.2f}ms  {result['queries']:>3} queries"
+        )
@@ -0,0 +1,55 @@
+from django.db import migrations, OperationalError
+
+CREATE_SQL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS grading_search_index "
+    "USING fts5(kind, object_id UNINDEXED, content, prefix='2 3')"
+)
+
+POPULATE_SQL = [
+    "INSERT INTO grading_search_index (rowid, kind, object_id, content) "
+    "SELECT s.id * 4 + 1, 'student', s.id, "
+    "s.first_name || ' ' || s.last_name || ' ' || s.student_id || ' ' || COALESCE(s.email, '') "
+    "FROM grading_student s",
+    "INSERT INTO grading_search_index (rowid, kind, object_id, content) "
+    "SELECT sub.id * 4 + 2, 'subject', sub.id, sub.name || ' ' || sub.code "
+    "FROM grading_subject sub",
+    "INSERT INTO grading_search_index (rowid, kind, object_id, content) "
+    "SELECT g.id * 4 + 3, 'grade', g.id, "
+    "g.assessment_name || ' ' || s.first_name || ' ' || s.last_name || ' ' || "
+    "s.student_id || ' ' || sub.name || ' ' || sub.code "
+    "FROM grading_grade g "
+    "JOIN grading_student s ON s.id = g.student_id "
+    "JOIN grading_subject sub ON sub.id = g.subject_id",
+]
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 is SQLite-only; other backends keep using icontains searches
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute(CREATE_SQL)
+        except OperationalError:
+            # SQLite built without FTS5
+            return
+        for sql in POPULATE_SQL:
+            cursor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS grading_search_index")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grading', '0003_alter_grade_unique_together_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
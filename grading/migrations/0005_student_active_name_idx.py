@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-17 15:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grading', '0004_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['is_active', 'last_name', 'first_name', 'id'], name='student_active_name_idx'),
+        ),
+    ]
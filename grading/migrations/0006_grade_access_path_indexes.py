@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-17 15:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grading', '0005_student_active_name_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='grade',
+            index=models.Index(fields=['student', 'term', 'date'], name='grade_student_term_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grade',
+            index=models.Index(fields=['subject', 'term', 'date'], name='grade_subject_term_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grade',
+            index=models.Index(fields=['term', 'date'], name='grade_term_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grade',
+            index=models.Index(fields=['created_at'], name='grade_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grade',
+            index=models.Index(fields=['percentage'], name='grade_percentage_idx'),
+        ),
+    ]
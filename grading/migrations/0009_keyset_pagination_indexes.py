@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-17 18:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grading', '0008_data_generation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='grade',
+            index=models.Index(fields=['-date', 'student', 'id'], name='grade_date_student_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['last_name', 'first_name', 'id'], name='student_name_idx'),
+        ),
+    ]
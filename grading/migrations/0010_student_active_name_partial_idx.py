@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-17 18:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grading', '0009_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='student',
+            name='student_active_name_idx',
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['last_name', 'first_name', 'id'], name='student_active_name_idx'),
+        ),
+    ]
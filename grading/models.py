@@ -1,33 +1,82 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Q
 from django.utils.translation import gettext_lazy as _
 from authentication.models import User
 
+# Letter-grade bands as (letter, minimum percentage), best first. Anything
+# below the last threshold is a fail.
+GRADE_BANDS = [
+    ('A', 90),
+    ('B', 80),
+    ('C', 70),
+    ('D', 60),
+]
+FAIL_GRADE = 'F'
+PASS_MARK = GRADE_BANDS[-1][1]
+GRADE_LETTERS = [letter for letter, minimum in GRADE_BANDS] + [FAIL_GRADE]
+
+class TracksLoadedValues(models.Model):
+    """Keeps the column values an instance was loaded or last saved with in ``_loaded_values``.
+
+    post_save receivers run before the values are refreshed, so they can
+    tell which fields a save changed.
+    """
+    
+    class Meta:
+        abstract = True
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_values = {field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields}
+    
+    def changed(self, *fields):
+        """Whether any of ``fields`` differs from its loaded value; True when nothing was loaded"""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return True
+        return any(field not in loaded or loaded[field] != getattr(self, field) for field in fields)
+
 class AcademicYear(models.Model):
     name = models.CharField(max_length=50)
     start_date = models.DateField()
     end_date = models.DateField()
     is_current = models.BooleanField(default=False)
+    # Part of the API's conditional-GET data version
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return self.name
+    
+    @classmethod
+    def date_range(cls, name):
+        """(start_date, end_date) of the named academic year, or None if unknown"""
+        return cls.objects.filter(name=name).values_list('start_date', 'end_date').first()
 
 class Class(models.Model):
     name = models.CharField(max_length=50)
     academic_year = models.ForeignKey(AcademicYear, on_delete=models.CASCADE)
     teacher = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return f"{self.name} ({self.academic_year})"
 
-class Subject(models.Model):
+class Subject(TracksLoadedValues):
     name = models.CharField(max_length=100)
     code = models.CharField(max_length=10, unique=True)
     description = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return self.name
 
-class Student(models.Model):
+class Student(TracksLoadedValues):
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
     student_id = models.CharField(max_length=20, unique=True)
@@ -47,8 +96,20 @@ class Student(models.Model):
     
     class Meta:
         ordering = ['last_name', 'first_name']
+        indexes = [
+            # Serves the active-student picker in name order. Partial, because
+            # SQLite can't seek on a leading is_active column for Django's bare
+            # boolean WHERE "is_active"
+            models.Index(
+                fields=['last_name', 'first_name', 'id'], condition=Q(is_active=True), name='student_active_name_idx'
+            ),
+            # MAX(updated_at) probes for the API's conditional GETs
+            models.Index(fields=['updated_at'], name='student_updated_at_idx'),
+            # Keyset pages of the student list, in STUDENT_PAGINATOR's order
+            models.Index(fields=['last_name', 'first_name', 'id'], name='student_name_idx'),
+        ]
 
-class Grade(models.Model):
+class Grade(TracksLoadedValues):
     class Term(models.TextChoices):
         TERM1 = 'TERM1', _('Term 1')
         TERM2 = 'TERM2', _('Term 2')
@@ -74,19 +135,53 @@ class Grade(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    @staticmethod
+    def compute_percentage(score, max_score):
+        return (score / max_score) * 100
+    
     def save(self, *args, **kwargs):
-        self.percentage = (self.score / self.max_score) * 100
-        super().save(*args, **kwargs)
+        self.percentage = self.compute_percentage(self.score, self.max_score)
+        # Keep the row and anything post_save receivers write in one transaction;
+        # post_save receivers compute deltas from _loaded_values
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
     
     def __str__(self):
         return f"{self.student} - {self.subject} - {self.score}"
     
+    @staticmethod
+    def letter_for(percentage):
+        for letter, minimum in GRADE_BANDS:
+            if percentage >= minimum:
+                return letter
+        return FAIL_GRADE
+    
     def get_grade_letter(self):
-        if self.percentage >= 90: return 'A'
-        elif self.percentage >= 80: return 'B'
-        elif self.percentage >= 70: return 'C'
-        elif self.percentage >= 60: return 'D'
-        else: return 'F'
+        return self.letter_for(self.percentage)
     
     class Meta:
-        ordering = ['-date', 'student']
\ No newline at end of file
+        ordering = ['-date', 'student']
+        indexes = [
+            # Report cards and per-student rollups: student + term within a year
+            models.Index(fields=['student', 'term', 'date'], name='grade_student_term_date_idx'),
+            # Subject distributions: subject + term within a year
+            models.Index(fields=['subject', 'term', 'date'], name='grade_subject_term_date_idx'),
+            # Whole-term analytics over an academic year's date range
+            models.Index(fields=['term', 'date'], name='grade_term_date_idx'),
+            # "Recent grades" and today's activity on the dashboards
+            models.Index(fields=['created_at'], name='grade_created_at_idx'),
+            # Grade-band range filters
+            models.Index(fields=['percentage'], name='grade_percentage_idx'),
+            # MAX(updated_at) probes for the API's conditional GETs
+            models.Index(fields=['updated_at'], name='grade_updated_at_idx'),
+            # Keyset pages of the grade list, in GRADE_PAGINATOR's order
+            models.Index(fields=['-date', 'student', 'id'], name='grade_date_student_id_idx'),
+        ]
+
+class DataGeneration(models.Model):
+    """Single-row counter of grading data writes, shared by every process.
+
+    grading.cache.DataCache embeds it in its keys, so bumping it here
+    invalidates cached payloads in all workers at once.
+    """
+    value = models.BigIntegerField()
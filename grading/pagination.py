@@ -0,0 +1,99 @@
+import base64
+import binascii
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+class InvalidCursor(ValueError):
+    pass
+
+class KeysetPaginator:
+    """Cursor pagination using keyset predicates instead of OFFSET.
+
+    ``ordering`` is a sequence of field names (prefixed with '-' for
+    descending) whose last entry must be unique, typically 'id'. Each page
+    filters on "after the last row of the previous page", so page N costs
+    the same as page 1 as long as an index matches the ordering, column
+    order and directions included (see the models' Meta.indexes).
+    """
+    default_page_size = 100
+    max_page_size = 1000
+
+    def __init__(self, ordering):
+        self.ordering = list(ordering)
+        self.fields = [name.lstrip('-') for name in self.ordering]
+
+    def encode_cursor(self, row):
+        values = [row[field] if isinstance(row, dict) else getattr(row, field) for field in self.fields]
+        payload = json.dumps(values, cls=DjangoJSONEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor, model=None):
+        """Decode ``cursor``; with ``model``, each value is converted to its ordering field's type"""
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        except (binascii.Error, UnicodeError, ValueError):
+            raise InvalidCursor('Invalid cursor')
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            raise InvalidCursor('Invalid cursor')
+        if model is not None:
+            values = [self.to_python(model, field, value) for field, value in zip(self.fields, values)]
+        return values
+
+    @staticmethod
+    def to_python(model, field, value):
+        # A well-formed cursor can still hold the wrong types (a number for a
+        # date, say); reject it here rather than when the query is built
+        if value is None or isinstance(value, (list, dict)):
+            raise InvalidCursor('Invalid cursor')
+        try:
+            return model._meta.get_field(field).to_python(value)
+        except (ValidationError, TypeError, ValueError):
+            raise InvalidCursor('Invalid cursor')
+
+    def page_size(self, value):
+        if value in (None, ''):
+            return self.default_page_size
+        try:
+            size = int(value)
+        except (TypeError, ValueError):
+            raise InvalidCursor('page_size must be an integer')
+        if size < 1:
+            raise InvalidCursor('page_size must be positive')
+        return min(size, self.max_page_size)
+
+    def after(self, values):
+        """Build the predicate selecting rows strictly after ``values``.
+
+        The OR of "greater on this field, equal on the ones before" is
+        ANDed with a bound on the first field alone, which is what lets
+        SQLite seek into the ordering's index instead of scanning it.
+        """
+        predicate = Q()
+        equal = Q()
+        for name, field, value in zip(self.ordering, self.fields, values):
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            predicate |= equal & Q(**{f'{field}__{lookup}': value})
+            equal &= Q(**{field: value})
+        first = self.ordering[0]
+        bound = Q(**{f"{self.fields[0]}__{'lte' if first.startswith('-') else 'gte'}": values[0]})
+        return bound & predicate
+
+    def paginate(self, queryset, cursor=None, page_size=None):
+        """Return ``(rows, next_cursor)`` for the page following ``cursor``.
+
+        ``queryset`` may be a ``values()`` queryset as long as it includes
+        every ordering field.
+        """
+        size = self.page_size(page_size)
+        queryset = queryset.order_by(*self.ordering)
+        if cursor:
+            queryset = queryset.filter(self.after(self.decode_cursor(cursor, queryset.model)))
+        rows = list(queryset[:size + 1])
+        next_cursor = None
+        if len(rows) > size:
+            rows = rows[:size]
+            next_cursor = self.encode_cursor(rows[-1])
+        return rows, next_cursor
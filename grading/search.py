@@ -0,0 +1,172 @@
+import re
+from django.db import connection, OperationalError, ProgrammingError
+from django.db.models.expressions import RawSQL
+
+class SearchIndex:
+    """SQLite FTS5 index over students, subjects and grades.
+
+    Each document is keyed by ``rowid = object_id * 4 + kind code`` so
+    updates and deletes hit a single row instead of scanning the index.
+    Everything here is a no-op when the table is missing (other database
+    backends, or SQLite built without FTS5); callers then fall back to
+    ``icontains`` filters.
+    """
+    TABLE = 'grading_search_index'
+    KINDS = {'student': 1, 'subject': 2, 'grade': 3}
+
+    # INSERT ... SELECT statements building each kind of document; the
+    # WHERE clause is appended by the caller.
+    DOCUMENT_SQL = {
+        'student': (
+            "SELECT s.id * 4 + 1, 'student', s.id, "
+            "s.first_name || ' ' || s.last_name || ' ' || s.student_id || ' ' || COALESCE(s.email, '') "
+            "FROM grading_student s"
+        ),
+        'subject': (
+            "SELECT sub.id * 4 + 2, 'subject', sub.id, sub.name || ' ' || sub.code "
+            "FROM grading_subject sub"
+        ),
+        'grade': (
+            "SELECT g.id * 4 + 3, 'grade', g.id, "
+            "g.assessment_name || ' ' || s.first_name || ' ' || s.last_name || ' ' || "
+            "s.student_id || ' ' || sub.name || ' ' || sub.code "
+            "FROM grading_grade g "
+            "JOIN grading_student s ON s.id = g.student_id "
+            "JOIN grading_subject sub ON sub.id = g.subject_id"
+        ),
+    }
+
+    # Model fields each kind of document is built from, and the student and
+    # subject fields that grade documents embed
+    INDEXED_FIELDS = {
+        'student': ('first_name', 'last_name', 'student_id', 'email'),
+        'subject': ('name', 'code'),
+    }
+    GRADE_DOCUMENT_FIELDS = {
+        'student': ('first_name', 'last_name', 'student_id'),
+        'subject': ('name', 'code'),
+    }
+
+    _available = None
+
+    @classmethod
+    def is_available(cls):
+        if cls._available is None:
+            cls._available = (
+                connection.vendor == 'sqlite'
+                and cls.TABLE in connection.introspection.table_names()
+            )
+        return cls._available
+
+    @classmethod
+    def reset(cls):
+        cls._available = None
+
+    @staticmethod
+    def match_expression(kind, query):
+        """Turn free text into an FTS5 query: every word must match as a prefix"""
+        terms = re.findall(r'\w+', query or '')
+        if not terms:
+            return None
+        words = ' AND '.join(f'"{term}"*' for term in terms)
+        return f'kind:{kind} AND content:({words})'
+
+    @classmethod
+    def _write(cls, kind, where, params):
+        if not cls.is_available():
+            return
+        sql = (
+            f"INSERT OR REPLACE INTO {cls.TABLE} (rowid, kind, object_id, content) "
+            f"{cls.DOCUMENT_SQL[kind]} WHERE {where}"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    @staticmethod
+    def _placeholders(ids):
+        return ', '.join(['%s'] * len(ids))
+
+    @staticmethod
+    def _batches(ids, size=500):
+        ids = list(ids)
+        for start in range(0, len(ids), size):
+            yield ids[start:start + size]
+
+    @classmethod
+    def _index(cls, kind, column, ids):
+        for batch in cls._batches(ids):
+            cls._write(kind, f"{column} IN ({cls._placeholders(batch)})", batch)
+
+    @classmethod
+    def index_students(cls, ids):
+        cls._index('student', 's.id', ids)
+
+    @classmethod
+    def index_subjects(cls, ids):
+        cls._index('subject', 'sub.id', ids)
+
+    @classmethod
+    def index_grades(cls, ids):
+        cls._index('grade', 'g.id', ids)
+
+    @classmethod
+    def index_grades_for_student(cls, student_id):
+        cls._write('grade', "g.student_id = %s", [student_id])
+
+    @classmethod
+    def index_grades_for_subject(cls, subject_id):
+        cls._write('grade', "g.subject_id = %s", [subject_id])
+
+    @classmethod
+    def remove(cls, kind, ids):
+        if not cls.is_available():
+            return
+        with connection.cursor() as cursor:
+            for batch in cls._batches(ids):
+                rowids = [object_id * 4 + cls.KINDS[kind] for object_id in batch]
+                cursor.execute(
+                    f"DELETE FROM {cls.TABLE} WHERE rowid IN ({cls._placeholders(rowids)})", rowids
+                )
+
+    @classmethod
+    def rebuild(cls):
+        """Drop every document and re-index all students, subjects and grades"""
+        cls.reset()
+        if not cls.is_available():
+            return False
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {cls.TABLE}")
+            for kind in cls.KINDS:
+                cursor.execute(
+                    f"INSERT INTO {cls.TABLE} (rowid, kind, object_id, content) {cls.DOCUMENT_SQL[kind]}"
+                )
+            cursor.execute(f"INSERT INTO {cls.TABLE} ({cls.TABLE}) VALUES ('optimize')")
+        return True
+
+    @classmethod
+    def search(cls, kind, query, limit=10):
+        """Return object ids of ``kind`` matching ``query``, best match first.
+
+        Returns None when the index cannot answer the query, so callers
+        know to fall back to ``icontains``.
+        """
+        expression = cls.match_expression(kind, query)
+        if expression is None or not cls.is_available():
+            return None
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"SELECT object_id FROM {cls.TABLE} WHERE {cls.TABLE} MATCH %s ORDER BY rank LIMIT %s",
+                    [expression, limit]
+                )
+                return [row[0] for row in cursor.fetchall()]
+        except (OperationalError, ProgrammingError):
+            return None
+
+    @classmethod
+    def matching_ids(cls, kind, query):
+        """Subquery of all matching ids, for ``filter(pk__in=...)``; None if unavailable"""
+        expression = cls.match_expression(kind, query)
+        if expression is None or not cls.is_available():
+            return None
+        return RawSQL(f"SELECT object_id FROM {cls.TABLE} WHERE {cls.TABLE} MATCH %s", [expression])
@@ -0,0 +1,371 @@
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from django.db.models import Avg, Count, Max, Min, Q, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from .cache import DataCache
+from .conditional import DataVersion, Probe
+from .models import GRADE_BANDS, FAIL_GRADE, PASS_MARK, GRADE_LETTERS, AcademicYear, Grade, Student, Subject
+from .search import SearchIndex
+from .signals import grades_bulk_saved
+
+class GradeStatistics:
+    """Grade-band statistics computed with a single conditional-aggregate query"""
+
+    @staticmethod
+    def band_aggregates(prefix=''):
+        """Return one filtered Count() per letter band, keyed '<letter>_count'.
+
+        ``prefix`` lets the expressions run across a relation, e.g.
+        ``prefix='grade__'`` when annotating students.
+        """
+        field = f'{prefix}percentage'
+        aggregates = {}
+        upper = None
+        for letter, minimum in GRADE_BANDS:
+            condition = Q(**{f'{field}__gte': minimum})
+            if upper is not None:
+                condition &= Q(**{f'{field}__lt': upper})
+            aggregates[f'{letter.lower()}_count'] = Count(f'{prefix}id', filter=condition)
+            upper = minimum
+        aggregates[f'{FAIL_GRADE.lower()}_count'] = Count(
+            f'{prefix}id', filter=Q(**{f'{field}__lt': PASS_MARK})
+        )
+        return aggregates
+
+    @staticmethod
+    def aggregates(prefix=''):
+        """Band counts plus total, sum, average, best and worst percentage"""
+        field = f'{prefix}percentage'
+        return {
+            'total_grades': Count(f'{prefix}id'),
+            'average_grade': Avg(field),
+            'max_grade': Max(field),
+            'min_grade': Min(field),
+            'score_sum': Sum(field),
+            **GradeStatistics.band_aggregates(prefix),
+        }
+
+    @staticmethod
+    def from_row(row):
+        """Turn a row produced by ``aggregates()`` into a statistics dict"""
+        total = row['total_grades'] or 0
+        distribution = {
+            letter: row[f'{letter.lower()}_count'] or 0 for letter in GRADE_LETTERS
+        }
+        passed = total - distribution[FAIL_GRADE]
+        return {
+            'total_grades': total,
+            'average_grade': row['average_grade'],
+            'max_grade': row['max_grade'],
+            'min_grade': row['min_grade'],
+            'score_sum': row['score_sum'] or 0,
+            'grade_distribution': distribution,
+            'pass_rate': (passed / total) * 100 if total else 0,
+        }
+
+    @staticmethod
+    def summarize(grades):
+        """Summarize any Grade queryset in one query"""
+        return GradeStatistics.from_row(grades.aggregate(**GradeStatistics.aggregates()))
+
+
+class GradeTally:
+    """Running count, average, best, worst and band counts of grade percentages"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = Decimal('0')
+        self.best = None
+        self.worst = None
+        self.distribution = dict.fromkeys(GRADE_LETTERS, 0)
+
+    def add(self, percentage):
+        self.count += 1
+        self.total += percentage
+        if self.best is None or percentage > self.best:
+            self.best = percentage
+        if self.worst is None or percentage < self.worst:
+            self.worst = percentage
+        self.distribution[Grade.letter_for(percentage)] += 1
+
+    @property
+    def average(self):
+        return self.total / self.count if self.count else None
+
+    @property
+    def letter(self):
+        return Grade.letter_for(self.average) if self.count else None
+
+    @property
+    def pass_rate(self):
+        return (self.count - self.distribution[FAIL_GRADE]) * 100 / self.count if self.count else 0
+
+
+# What a profile's tallies read: the student's grades and the subject names
+PROFILE_PROBES = (
+    Probe(Grade, scope=lambda request, student_id: {'student_id': student_id}),
+    Probe(Subject),
+)
+
+
+class StudentGradeProfile:
+    """A student with their grades, summarized in one pass.
+
+    ``load()`` reads the student, then their grades as values() rows
+    (GRADE_FIELDS plus the grade letter and display labels), and tallies
+    the overall, per-subject and per-term figures in Python, so the student
+    page, the student API and the report card all share one set of numbers.
+    ``cached()`` keeps only the tallies in the DataCache, keyed by a probe
+    of that student's grades and the subjects, so a write elsewhere leaves
+    the entry valid.
+    """
+
+    GRADE_FIELDS = (
+        'id', 'student_id', 'subject_id', 'subject__name', 'assessment_name', 'assessment_type',
+        'score', 'max_score', 'percentage', 'term', 'date',
+    )
+
+    def __init__(self, student, grades, tallies=None):
+        self.student = student
+        self.grades = grades
+        self.overall, self.subjects, self.terms = tallies or self.tally(grades)
+
+    @staticmethod
+    def tally(grades):
+        """(overall, per-subject, per-term) GradeTally for rows with subject__name, term and percentage"""
+        overall = GradeTally()
+        subjects = {}
+        terms = {}
+        for grade in grades:
+            overall.add(grade['percentage'])
+            subjects.setdefault(grade['subject__name'], GradeTally()).add(grade['percentage'])
+            terms.setdefault(grade['term'], GradeTally()).add(grade['percentage'])
+        return overall, dict(sorted(subjects.items())), dict(sorted(terms.items()))
+
+    @classmethod
+    def rows(cls, grades, limit=None):
+        """values() rows of the ``grades`` queryset, newest first, ready for templates"""
+        assessment_types = dict(Grade.AssessmentType.choices)
+        terms = dict(Grade.Term.choices)
+        rows = list(grades.order_by('-date', '-pk').values(*cls.GRADE_FIELDS)[:limit])
+        for row in rows:
+            row['letter'] = Grade.letter_for(row['percentage'])
+            row['assessment_type_label'] = assessment_types.get(row['assessment_type'], row['assessment_type'])
+            row['term_label'] = terms.get(row['term'], row['term'])
+        return rows
+
+    @staticmethod
+    def student(student_id):
+        return Student.objects.select_related('current_class', 'academic_year').get(pk=student_id)
+
+    @classmethod
+    def load(cls, student, academic_year=None, term=None):
+        """Profile of ``student``, a Student or its pk; raises Student.DoesNotExist.
+
+        With ``academic_year`` and ``term`` only that term's grades (dated
+        within the named AcademicYear) are loaded.
+        """
+        if not isinstance(student, Student):
+            student = cls.student(student)
+        grades = Grade.objects.filter(student_id=student.pk)
+        if academic_year is not None:
+            date_range = AcademicYear.date_range(academic_year)
+            grades = grades.filter(term=term, date__range=date_range) if date_range else grades.none()
+        return cls(student, cls.rows(grades))
+
+    @classmethod
+    def cached(cls, student_id, limit):
+        """Profile with the ``limit`` newest grade rows and cached tallies of
+        every grade; raises Student.DoesNotExist.
+
+        Callers that need every row should use ``load()``: tallying rows
+        already loaded costs less than the cache's probe query.
+        """
+        student = cls.student(student_id)
+        version = DataVersion.probe(PROFILE_PROBES, None, {'student_id': student_id}).etag
+        grades = cls.rows(Grade.objects.filter(student_id=student_id), limit)
+
+        def tally():
+            if len(grades) < limit:
+                return cls.tally(grades)
+            return cls.tally(Grade.objects.filter(student_id=student_id).values('subject__name', 'term', 'percentage'))
+
+        return cls(student, grades, DataCache.get_or_set('student_profile', tally, vary=student_id, version=version))
+
+    def subject_performance(self):
+        """(subject name, tally) pairs, best average first"""
+        return sorted(self.subjects.items(), key=lambda item: -item[1].average)
+
+
+class GradeValidationError(ValueError):
+    pass
+
+class GradeBulkWriter:
+    """Set-based upsert of grades keyed by (student, subject, assessment_name, term).
+
+    Existing grades for the whole batch are fetched in one query, rows are
+    validated in memory and the inserts and updates are applied with chunked
+    ``bulk_create``/``bulk_update`` inside a single transaction. Rows repeating
+    a key update the grade created or updated earlier in the same batch, as
+    the old per-row ``get_or_create`` loop did.
+    """
+    UPDATE_FIELDS = [
+        'assessment_type', 'score', 'max_score', 'percentage', 'date', 'comments', 'updated_at'
+    ]
+
+    def __init__(self, user=None, chunk_size=500):
+        self.user = user
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def _decimal(value, name):
+        try:
+            number = Decimal(str(value))
+        except (InvalidOperation, TypeError, ValueError):
+            raise GradeValidationError(f"{name} must be a number")
+        if not number.is_finite():
+            raise GradeValidationError(f"{name} must be a number")
+        return number
+
+    @staticmethod
+    def _date(value):
+        if isinstance(value, date):
+            return value
+        try:
+            parsed = parse_date(str(value))
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise GradeValidationError("date must be in YYYY-MM-DD format")
+        return parsed
+
+    def clean(self, data):
+        """Validate one incoming row and return its natural key and values"""
+        if not isinstance(data, dict):
+            raise GradeValidationError("Grade must be an object")
+        for name in ('student_id', 'subject_id', 'assessment_name', 'term', 'score'):
+            if data.get(name) in (None, ''):
+                raise GradeValidationError(f"{name} is required")
+        try:
+            student_id = int(data['student_id'])
+            subject_id = int(data['subject_id'])
+        except (TypeError, ValueError):
+            raise GradeValidationError("student_id and subject_id must be integers")
+        if data['term'] not in Grade.Term.values:
+            raise GradeValidationError(f"Invalid term '{data['term']}'")
+        assessment_type = data.get('assessment_type')
+        if assessment_type is not None and assessment_type not in Grade.AssessmentType.values:
+            raise GradeValidationError(f"Invalid assessment_type '{assessment_type}'")
+        
+        values = {'score': self._decimal(data['score'], 'score')}
+        if data.get('max_score') is not None:
+            values['max_score'] = self._decimal(data['max_score'], 'max_score')
+            if values['max_score'] <= 0:
+                raise GradeValidationError("max_score must be greater than zero")
+        if assessment_type is not None:
+            values['assessment_type'] = assessment_type
+        if data.get('date') is not None:
+            values['date'] = self._date(data['date'])
+        if data.get('comments') is not None:
+            values['comments'] = data['comments']
+        
+        key = (student_id, subject_id, str(data['assessment_name']), data['term'])
+        return key, values
+
+    def _existing_grades(self, keys):
+        """Fetch grades matching any of ``keys`` in one query, keyed by natural key"""
+        if not keys:
+            return {}
+        existing = {}
+        candidates = Grade.objects.filter(
+            student_id__in={key[0] for key in keys},
+            subject_id__in={key[1] for key in keys},
+            assessment_name__in={key[2] for key in keys},
+            term__in={key[3] for key in keys},
+        ).order_by('id')
+        for grade in candidates:
+            key = (grade.student_id, grade.subject_id, grade.assessment_name, grade.term)
+            # Keep the oldest grade when duplicates already exist
+            if key in keys and key not in existing:
+                existing[key] = grade
+        return existing
+
+    def write(self, rows):
+        """Upsert ``rows`` and return one result dict per row, in order"""
+        results = [None] * len(rows)
+        cleaned = []
+        for index, data in enumerate(rows):
+            try:
+                cleaned.append((index, data) + self.clean(data))
+            except GradeValidationError as e:
+                results[index] = {'success': False, 'error': str(e), 'data': data}
+        
+        now = timezone.now()
+        with transaction.atomic():
+            student_ids = set(
+                Student.objects.select_for_update()
+                .filter(pk__in={key[0] for _, _, key, _ in cleaned})
+                .values_list('pk', flat=True)
+            )
+            subject_ids = set(
+                Subject.objects.filter(pk__in={key[1] for _, _, key, _ in cleaned})
+                .values_list('pk', flat=True)
+            )
+            grades = self._existing_grades({key for _, _, key, _ in cleaned})
+            
+            to_create = {}
+            to_update = {}
+            outcomes = []
+            for index, data, key, values in cleaned:
+                if key[0] not in student_ids:
+                    results[index] = {'success': False, 'error': 'Student matching query does not exist.', 'data': data}
+                    continue
+                if key[1] not in subject_ids:
+                    results[index] = {'success': False, 'error': 'Subject matching query does not exist.', 'data': data}
+                    continue
+                
+                grade = grades.get(key)
+                if grade is None:
+                    grade = Grade(
+                        student_id=key[0],
+                        subject_id=key[1],
+                        assessment_name=key[2],
+                        term=key[3],
+                        assessment_type=values.get('assessment_type', Grade.AssessmentType.TEST),
+                        score=values['score'],
+                        max_score=values.get('max_score', Decimal('100')),
+                        date=values.get('date', now.date()),
+                        comments=values.get('comments', ''),
+                        created_by=self.user,
+                    )
+                    grades[key] = to_create[key] = grade
+                    created = True
+                else:
+                    for name, value in values.items():
+                        setattr(grade, name, value)
+                    grade.updated_at = now
+                    if key not in to_create:
+                        to_update[key] = grade
+                    created = False
+                grade.percentage = Grade.compute_percentage(grade.score, grade.max_score)
+                outcomes.append((index, grade, created))
+            
+            Grade.objects.bulk_create(to_create.values(), batch_size=self.chunk_size)
+            Grade.objects.bulk_update(to_update.values(), self.UPDATE_FIELDS, batch_size=self.chunk_size)
+            # bulk_create skips post_save, so index the new grades here. Updates
+            # never change the indexed text (it is part of the natural key).
+            SearchIndex.index_grades([grade.pk for grade in to_create.values()])
+            grades_bulk_saved.send(
+                sender=Grade, created=list(to_create.values()), updated=list(to_update.values())
+            )
+        
+        for index, grade, created in outcomes:
+            results[index] = {
+                'success': True,
+                'grade_id': grade.id,
+                'created': created,
+                'message': 'Grade processed successfully'
+            }
+        return results
@@ -0,0 +1,55 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver, Signal
+from .cache import DataCache
+from .models import Class, Student, Subject, Grade
+from .search import SearchIndex
+
+# Sent by GradeBulkWriter inside its transaction, since bulk_create and
+# bulk_update skip post_save. ``created`` is a list of new grades and
+# ``updated`` a list of changed grades whose ``_loaded_values`` still hold
+# the values read before the update.
+grades_bulk_saved = Signal()
+
+# Student and subject saves re-index only when a field their documents are
+# built from changed; grade documents embed the student's and subject's names
+@receiver(post_save, sender=Student)
+def index_student(sender, instance, created, **kwargs):
+    if instance.changed(*SearchIndex.INDEXED_FIELDS['student']):
+        SearchIndex.index_students([instance.pk])
+    if not created and instance.changed(*SearchIndex.GRADE_DOCUMENT_FIELDS['student']):
+        SearchIndex.index_grades_for_student(instance.pk)
+
+@receiver(post_save, sender=Subject)
+def index_subject(sender, instance, created, **kwargs):
+    if instance.changed(*SearchIndex.INDEXED_FIELDS['subject']):
+        SearchIndex.index_subjects([instance.pk])
+    if not created and instance.changed(*SearchIndex.GRADE_DOCUMENT_FIELDS['subject']):
+        SearchIndex.index_grades_for_subject(instance.pk)
+
+@receiver(post_save, sender=Grade)
+def index_grade(sender, instance, **kwargs):
+    SearchIndex.index_grades([instance.pk])
+
+@receiver(post_delete, sender=Student)
+def unindex_student(sender, instance, **kwargs):
+    SearchIndex.remove('student', [instance.pk])
+
+@receiver(post_delete, sender=Subject)
+def unindex_subject(sender, instance, **kwargs):
+    SearchIndex.remove('subject', [instance.pk])
+
+@receiver(post_delete, sender=Grade)
+def unindex_grade(sender, instance, **kwargs):
+    SearchIndex.remove('grade', [instance.pk])
+
+@receiver(post_save, sender=Grade)
+@receiver(post_save, sender=Student)
+@receiver(post_save, sender=Subject)
+@receiver(post_save, sender=Class)
+@receiver(post_delete, sender=Grade)
+@receiver(post_delete, sender=Student)
+@receiver(post_delete, sender=Subject)
+@receiver(post_delete, sender=Class)
+@receiver(grades_bulk_saved)
+def invalidate_data_cache(sender, **kwargs):
+    DataCache.invalidate()
@@ -1,3 +1,783 @@
+import json
+import os
+import tempfile
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from unittest import skipUnless
+from unittest.mock import patch
 from django.test import TestCase
+from django.urls import reverse
+from authentication.models import User
+from .models import AcademicYear, Class, DataGeneration, Subject, Student, Grade
+from .forms import GradeForm
+from .cache import DataCache
+from .services import GradeBulkWriter, GradeStatistics, StudentGradeProfile
+from .search import SearchIndex
+from .api import GRADE_PAGINATOR
+from analytics.rankings import PerformanceRankings
 
-# Create your tests here.
+
+class GradingTestData:
+    """Small fixture shared by the grading tests"""
+
+    @classmethod
+    def create_school(cls):
+        cls.academic_year = AcademicYear.objects.create(
+            name='2024-2025', start_date=date(2024, 9, 1), end_date=date(2025, 7, 31), is_current=True
+        )
+        cls.class_obj = Class.objects.create(name='Grade 7A', academic_year=cls.academic_year)
+        cls.math = Subject.objects.create(name='Mathematics', code='MATH')
+        cls.english = Subject.objects.create(name='English', code='ENG')
+        cls.student = cls.create_student('Ada', 'Lovelace', 'MGS001')
+
+    @classmethod
+    def create_student(cls, first_name, last_name, student_id):
+        return Student.objects.create(
+            first_name=first_name,
+            last_name=last_name,
+            student_id=student_id,
+            date_of_birth=date(2012, 1, 1),
+            current_class=cls.class_obj,
+            academic_year=cls.academic_year,
+            enrollment_date=date(2024, 9, 1),
+        )
+
+    @classmethod
+    def create_grade(cls, score, student=None, subject=None, term='TERM1', day=date(2024, 10, 1), name='Test'):
+        return Grade.objects.create(
+            student=student or cls.student,
+            subject=subject or cls.math,
+            assessment_name=name,
+            assessment_type='TEST',
+            score=Decimal(score),
+            max_score=Decimal('100'),
+            term=term,
+            date=day,
+        )
+
+
+class GradeStatisticsTests(GradingTestData, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_school()
+        for score in ['95', '90', '85', '72.5', '60', '59.99', '10']:
+            cls.create_grade(score)
+
+    def test_letter_bands(self):
+        self.assertEqual(Grade.letter_for(Decimal('90')), 'A')
+        self.assertEqual(Grade.letter_for(Decimal('89.99')), 'B')
+        self.assertEqual(Grade.letter_for(Decimal('60')), 'D')
+        self.assertEqual(Grade.letter_for(Decimal('59.99')), 'F')
+
+    def test_summarize_uses_single_query(self):
+        with self.assertNumQueries(1):
+            stats = GradeStatistics.summarize(Grade.objects.all())
+        self.assertEqual(stats['total_grades'], 7)
+        self.assertEqual(stats['grade_distribution'], {'A': 2, 'B': 1, 'C': 1, 'D': 1, 'F': 2})
+        self.assertEqual(stats['max_grade'], Decimal('95'))
+        self.assertEqual(stats['min_grade'], Decimal('10'))
+        self.assertAlmostEqual(stats['pass_rate'], 5 / 7 * 100)
+
+    def test_distribution_matches_grade_letters(self):
+        stats = GradeStatistics.summarize(Grade.objects.filter(percentage__gte=60))
+        letters = [grade.get_grade_letter() for grade in Grade.objects.filter(percentage__gte=60)]
+        for letter, count in stats['grade_distribution'].items():
+            self.assertEqual(letters.count(letter), count)
+
+    def test_summarize_empty_queryset(self):
+        stats = GradeStatistics.summarize(Grade.objects.none())
+        self.assertEqual(stats['total_grades'], 0)
+        self.assertEqual(stats['pass_rate'], 0)
+        self.assertIsNone(stats['average_grade'])
+
+
+class StreamingListApiTests(GradingTestData, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_school()
+        cls.create_student('Alan', 'Turing', 'MGS002')
+        cls.create_grade('88')
+        cls.create_grade('42', subject=cls.english, term='TERM2')
+        cls.user = User.objects.create_user('teacher', password='secret')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_streamed_json_array_matches_buffered_response(self):
+        url = reverse('grading:api_grade_list')
+        buffered = self.client.get(url).json()
+        response = self.client.get(url, {'stream': 'json'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(json.loads(b''.join(response.streaming_content)), buffered)
+
+    def test_ndjson_emits_one_object_per_line(self):
+        response = self.client.get(reverse('grading:api_student_list'), {'stream': 'ndjson'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['student_id'] for line in lines], ['MGS001', 'MGS002'])
+
+    def test_unknown_stream_format_is_rejected(self):
+        response = self.client.get(reverse('grading:api_grade_list'), {'stream': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+
+class CursorPaginationApiTests(GradingTestData, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_school()
+        for day in [1, 1, 2, 3, 3, 3, 4]:
+            cls.create_grade('75', day=date(2024, 10, day), name=f'Quiz {day}')
+        cls.create_grade('80', term='TERM2', day=date(2025, 2, 1))
+        for i in range(4):
+            cls.create_student(f'Student{i}', 'Demo', f'MGS10{i}')
+        cls.user = User.objects.create_user('teacher', password='secret')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def collect_pages(self, url, params):
+        ids, cursor, pages = [], None, 0
+        while True:
+            query = dict(params, page_size=3)
+            if cursor:
+                query['cursor'] = cursor
+            payload = self.client.get(url, query).json()
+            ids.extend(row['id'] for row in payload['results'])
+            pages += 1
+            cursor = payload['next']
+            if not cursor:
+                return ids, pages
+
+    def test_grade_pages_cover_ordering_without_gaps(self):
+        url = reverse('grading:api_grade_list')
+        ids, pages = self.collect_pages(url, {})
+        expected = list(Grade.objects.order_by('-date', 'student_id', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 3)
+
+    def test_grade_filters_apply_to_pages(self):
+        url = reverse('grading:api_grade_list')
+        ids, pages = self.collect_pages(url, {'term': 'TERM1', 'date_from': '2024-10-02'})
+        self.assertEqual(len(ids), 5)
+        ids, pages = self.collect_pages(url, {'class_id': self.class_obj.pk, 'subject_id': self.english.pk})
+        self.assertEqual(ids, [])
+
+    def test_student_pages_follow_name_ordering(self):
+        ids, pages = self.collect_pages(reverse('grading:api_student_list'), {})
+        self.assertEqual(ids, list(Student.objects.values_list('id', flat=True)))
+
+    def test_invalid_cursor_and_date_are_rejected(self):
+        url = reverse('grading:api_grade_list')
+        self.assertEqual(self.client.get(url, {'cursor': 'not-a-cursor'}).status_code, 400)
+        for values in (['oops', 1, 1], [20241001, 1, 1], ['2024-10-01', 'x', 1], [None, 1, 1], [{}, 1, 1]):
+            cursor = GRADE_PAGINATOR.encode_cursor(dict(zip(GRADE_PAGINATOR.fields, values)))
+            self.assertEqual(self.client.get(url, {'cursor': cursor}).status_code, 400, values)
+        self.assertEqual(self.client.get(url, {'date_from': '01/10/2024'}).status_code, 400)
+
+
+class BulkGradeUploadApiTests(GradingTestData, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_school()
+        cls.existing = cls.create_grade('50', name='Midterm')
+        cls.user = User.objects.create_user('teacher', password='secret')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def upload(self, grades):
+        response = self.client.post(
+            reverse('grading:api_grade_bulk_upload'),
+            data=json.dumps({'grades': grades}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def row(self, **overrides):
+        row = {
+            'student_id': self.student.pk, 'subject_id': self.math.pk,
+            'assessment_name': 'Final', 'term': 'TERM1', 'score': '45', 'max_score': '50',
+        }
+        row.update(overrides)
+        return row
+
+    def test_inserts_and_updates_with_per_row_results(self):
+        results = self.upload([
+            self.row(),
+            self.row(assessment_name='Midterm', score='70', max_score='100'),
+            self.row(student_id=999999),
+            self.row(term='TERM9'),
+        ])
+        self.assertEqual([r['success'] for r in results], [True, True, False, False])
+        self.assertTrue(results[0]['created'])
+        self.assertEqual(results[1], {
+            'success': True, 'grade_id': self.existing.pk, 'created': False,
+            'message': 'Grade processed successfully'
+        })
+        self.assertEqual(results[2]['data']['student_id'], 999999)
+
+        created = Grade.objects.get(pk=results[0]['grade_id'])
+        self.assertEqual(created.percentage, Decimal('90'))
+        self.assertEqual(created.created_by, self.user)
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.percentage, Decimal('70'))
+
+    def test_repeated_key_in_batch_updates_the_new_grade(self):
+        results = self.upload([self.row(), self.row(score='40')])
+        self.assertEqual(results[0]['grade_id'], results[1]['grade_id'])
+        self.assertFalse(results[1]['created'])
+        self.assertEqual(Grade.objects.get(pk=results[0]['grade_id']).percentage, Decimal('80'))
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        rows = [self.row(assessment_name=f'Quiz {i}') for i in range(50)]
+        with self.assertNumQueries(10):
+            self.upload(rows)
+        self.assertEqual(Grade.objects.count(), 51)
+
+
+class ImportGradesCommandTests(GradingTestData, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_school()
+
+    def write_file(self, suffix, content):
+        handle = tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False)
+        handle.write(content)
+        handle.close()
+        self.addCleanup(os.remove, handle.name)
+        return handle.name
+
+    def test_csv_import_resolves_natural_keys(self):
+        path = self.write_file('.csv', (
+            'student_id,subject_code,assessment_name,term,score,date\n'
+            'MGS001,MATH,Exam 1,TERM1,81,2024-10-01\n'
+            'MGS001,ENG,Exam 1,TERM1,64,2024-10-01\n'
+            'MGS404,ENG,Exam 1,TERM1,64,2024-10-01\n'
+        ))
+        out, err = StringIO(), StringIO()
+        call_command('import_grades', path, chunk_size=2, stdout=out, stderr=err)
+        self.assertEqual(Grade.objects.count(), 2)
+        self.assertEqual(Grade.objects.get(subject=self.english).percentage, Decimal('64'))
+        self.assertIn("Row 3: Unknown student_id 'MGS404'", err.getvalue())
+        self.assertIn('2 created, 0 updated, 1 failed', out.getvalue())
+        self.assertFalse(os.path.exists(f'{path}.checkpoint'))
+
+    def test_dry_run_writes_nothing(self):
+        path = self.write_file('.ndjson', (
+            '{"student_id": "MGS001", "subject_code": "MATH", "assessment_name": "Quiz", "term": "TERM1", "score": 9}\n'
+            '{"student_id": "MGS001", "subject_code": "MATH", "assessment_name": "Quiz", "term": "TERM7", "score": 9}\n'
+        ))
+        err = StringIO()
+        call_command('import_grades', path, dry_run=True, stdout=StringIO(), stderr=err)
+        self.assertEqual(Grade.objects.count(), 0)
+        self.assertIn("Row 2: Invalid term 'TERM7'", err.getvalue())
+
+    def test_resume_skips_committed_rows(self):
+        path = self.write_file('.ndjson', ''.join(
+            f'{{"student_id": "MGS001", "subject_code": "MATH", "assessment_name": "Quiz {i}", "term": "TERM1", "score": 50}}\n'
+            for i in range(5)
+        ))
+        with open(f'{path}.checkpoint', 'w') as f:
+            json.dump({'source': os.path.abspath(path), 'rows': 3}, f)
+        call_command('import_grades', path, resume=True, stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(
+            sorted(Grade.objects.values_list('assessment_name', flat=True)), ['Quiz 3', 'Quiz 4']
+        )
+
+
+class PopulateSampleDataTests(TestCase):
+    def populate(self, **options):
+        call_command('populate_sample_data', students=6, subjects=2, classes=2, stdout=StringIO(), **options)
+
+    def test_generates_grades_with_percentages(self):
+        self.populate(grades_per_term=3, skip_derived=True)
+        self.assertEqual(Student.objects.count(), 6)
+        self.assertEqual(Grade.objects.count(), 6 * 2 * 3 * len(Grade.Term.values))
+        year = AcademicYear.objects.get()
+        for grade in Grade.objects.all()[:20]:
+            self.assertEqual(grade.percentage, round(Grade.compute_percentage(grade.score, grade.max_score), 2))
+            self.assertTrue(year.start_date <= grade.date <= year.end_date)
+
+    def test_same_seed_gives_same_scores(self):
+        self.populate(skip_derived=True)
+        first = list(Grade.objects.order_by('id').values_list('score', 'date'))
+        Grade.objects.all().delete()
+        Student.objects.all().delete()
+        self.populate(skip_derived=True)
+        self.assertEqual(list(Grade.objects.order_by('id').values_list('score', 'date')), first)
+
+    def test_rerun_only_adds_missing_students(self):
+        self.populate(grades_per_term=0)
+        self.populate(grades_per_term=1)
+        self.assertEqual(Student.objects.count(), 6)
+        self.assertEqual(Grade.objects.count(), 0)
+
+    def test_newest_year_is_the_only_current_one(self):
+        AcademicYear.objects.create(
+            name='2023-2024', start_date=date(2023, 9, 1), end_date=date(2024, 7, 31), is_current=True
+        )
+        self.populate(years=2, grades_per_term=0)
+        self.assertEqual(list(AcademicYear.objects.filter(is_current=True).values_list('name', flat=True)), ['2025-2026'])
+
+
+class SearchIndexTests(GradingTestData, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_school()
+        cls.turing = cls.create_student('Alan', 'Turing', 'MGS002')
+        cls.grade = cls.create_grade('70', name='Algebra Quiz')
+        cls.user = User.objects.create_user('teacher', password='secret')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def search(self, query, search_type='all'):
+        return self.client.get(reverse('grading:api_search'), {'q': query, 'type': search_type}).json()
+
+    def test_index_is_available_on_sqlite(self):
+        self.assertTrue(SearchIndex.is_available())
+
+    def test_prefix_matching_across_kinds(self):
+        results = self.search('lov')
+        self.assertEqual([s['student_id'] for s in results['students']], ['MGS001'])
+        self.assertEqual([g['id'] for g in results['grades']], [self.grade.pk])
+        self.assertEqual(self.search('mat')['subjects'][0]['code'], 'MATH')
+        self.assertEqual(self.search('alg mat', 'grades')['grades'][0]['assessment_name'], 'Algebra Quiz')
+
+    def test_index_follows_saves_and_deletes(self):
+        self.turing.last_name = 'Hopper'
+        self.turing.save()
+        self.assertEqual(self.search('turing', 'students')['students'], [])
+        self.assertEqual(len(self.search('hopper', 'students')['students']), 1)
+
+        self.student.delete()
+        results = self.search('lovelace')
+        self.assertEqual(results['students'], [])
+        self.assertEqual(results['grades'], [])
+
+    def test_saves_reindex_only_when_indexed_fields_change(self):
+        student = Student.objects.get(pk=self.student.pk)
+        subject = Subject.objects.get(pk=self.math.pk)
+        with patch.object(SearchIndex, 'index_grades_for_student') as student_grades, \
+                patch.object(SearchIndex, 'index_grades_for_subject') as subject_grades:
+            student.phone = '555-0100'
+            student.save()
+            subject.description = 'Numbers'
+            subject.save()
+            self.assertFalse(student_grades.called or subject_grades.called)
+            student.email = 'ada@example.com'
+            student.save()
+            self.assertFalse(student_grades.called)
+            subject.name = 'Maths'
+            subject.save()
+            subject_grades.assert_called_once_with(subject.pk)
+        self.assertEqual(len(self.search('ada@example', 'students')['students']), 1)
+
+    def test_bulk_upload_indexes_new_grades(self):
+        self.client.post(
+            reverse('grading:api_grade_bulk_upload'),
+            data=json.dumps({'grades': [{
+                'student_id': self.turing.pk, 'subject_id': self.english.pk,
+                'assessment_name': 'Poetry Essay', 'term': 'TERM1', 'score': 88,
+            }]}),
+            content_type='application/json'
+        )
+        self.assertEqual(self.search('poetry', 'grades')['grades'][0]['student__last_name'], 'Turing')
+
+    def test_list_view_search_uses_index(self):
+        response = self.client.get(reverse('grading:student_list'), {'search': 'tur'})
+        self.assertEqual(list(response.context['students']), [self.turing])
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SearchIndex.TABLE}')
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(len(self.search('lovelace')['grades']), 1)
+
+
+class StudentTypeaheadTests(GradingTestData, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_school()
+        for i in range(25):
+            cls.create_student(f'Pupil{i:02d}', 'Mwale', f'MGS2{i:02d}')
+        cls.user = User.objects.create_user('teacher', password='secret')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_grade_form_does_not_render_the_roster(self):
+        response = self.client.get(reverse('grading:grade_add'))
+        self.assertNotContains(response, 'Pupil07')
+        self.assertContains(response, 'student-typeahead')
+        self.assertContains(response, 'js/typeahead.js')
+
+    def test_lookup_pages_through_matches(self):
+        url = reverse('grading:api_student_lookup')
+        first = self.client.get(url, {'q': 'mwa'}).json()
+        self.assertEqual(len(first['results']), 20)
+        second = self.client.get(url, {'q': 'mwa', 'cursor': first['next']}).json()
+        self.assertEqual(len(second['results']), 5)
+        self.assertIsNone(second['next'])
+        self.assertEqual(first['results'][0]['text'], 'Pupil00 Mwale (MGS200)')
+
+    def test_form_resolves_submitted_primary_key(self):
+        form = GradeForm(data={
+            'student': self.student.pk, 'subject': self.math.pk, 'assessment_name': 'Quiz',
+            'assessment_type': 'QUIZ', 'score': '8', 'max_score': '10', 'term': 'TERM1',
+            'date': '2024-10-01',
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['student'], self.student)
+        self.assertIn(str(self.student), form['student'].as_widget())
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite-specific')
+class GradeIndexTests(GradingTestData, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_school()
+        cls.create_grade('70')
+
+    def query_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = self.query_plan(queryset)
+        grade_steps = [step for step in plan if 'grading_grade' in step]
+        self.assertTrue(grade_steps, plan)
+        for step in grade_steps:
+            self.assertIn(f'INDEX {index_name}', step, plan)
+
+    def test_hot_queries_use_indexes(self):
+        year = AcademicYear.date_range('2024-2025')
+        self.assertEqual(year, (date(2024, 9, 1), date(2025, 7, 31)))
+        self.assertUsesIndex(
+            Grade.objects.filter(student=self.student, term='TERM1', date__range=year),
+            'grade_student_term_date_idx'
+        )
+        self.assertUsesIndex(
+            Grade.objects.filter(subject=self.math, term='TERM1', date__range=year),
+            'grade_subject_term_date_idx'
+        )
+        self.assertUsesIndex(Grade.objects.filter(term='TERM1', date__range=year), 'grade_term_date_idx')
+        self.assertUsesIndex(Grade.objects.order_by('-created_at')[:5], 'grade_created_at_idx')
+        # Band filters run inside aggregates, which drop Meta.ordering
+        self.assertUsesIndex(Grade.objects.filter(percentage__gte=90).order_by(), 'grade_percentage_idx')
+
+    def assertSeeksIndex(self, queryset, table, index_name):
+        plan = self.query_plan(queryset)
+        self.assertFalse([step for step in plan if 'TEMP B-TREE' in step], plan)
+        steps = [step for step in plan if f' {table} ' in f'{step} ']
+        self.assertTrue(steps, plan)
+        for step in steps:
+            self.assertTrue(step.startswith('SEARCH'), plan)
+            self.assertIn(f'INDEX {index_name}', step, plan)
+
+    def test_cursor_pages_seek_their_index(self):
+        from .api import GRADE_LIST_FIELDS, GRADE_PAGINATOR, STUDENT_LIST_FIELDS, STUDENT_PAGINATOR
+        grade = Grade.objects.values(*GRADE_LIST_FIELDS).get()
+        grades = Grade.objects.values(*GRADE_LIST_FIELDS).order_by(*GRADE_PAGINATOR.ordering).filter(
+            GRADE_PAGINATOR.after([grade['date'], grade['student_id'], grade['id']])
+        )[:101]
+        self.assertSeeksIndex(grades, 'grading_grade', 'grade_date_student_id_idx')
+        students = Student.objects.values(*STUDENT_LIST_FIELDS).order_by(*STUDENT_PAGINATOR.ordering).filter(
+            STUDENT_PAGINATOR.after(['Lovelace', 'Ada', self.student.pk])
+        )[:101]
+        self.assertSeeksIndex(students, 'grading_student', 'student_name_idx')
+
+    def test_student_lookup_uses_the_partial_index(self):
+        from .api import STUDENT_PAGINATOR
+        students = Student.objects.filter(is_active=True).values('id', 'first_name', 'last_name', 'student_id')
+        first_page = students.order_by(*STUDENT_PAGINATOR.ordering)[:21]
+        plan = self.query_plan(first_page)
+        self.assertEqual(plan, ['SCAN grading_student USING INDEX student_active_name_idx'])
+        next_page = students.order_by(*STUDENT_PAGINATOR.ordering).filter(
+            STUDENT_PAGINATOR.after(['Lovelace', 'Ada', self.student.pk])
+        )[:21]
+        self.assertSeeksIndex(next_page, 'grading_student', 'student_active_name_idx')
+
+    def test_unknown_academic_year_has_no_range(self):
+        self.assertIsNone(AcademicYear.date_range('1999-2000'))
+
+
+class DataCacheTests(GradingTestData, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_school()
+        cls.create_grade('70')
+        cls.user = User.objects.create_user('teacher', password='secret')
+
+    def setUp(self):
+        DataCache.backend().clear()
+        DataCache.reset_stats()
+        self.client.force_login(self.user)
+
+    def statistics(self):
+        return self.client.get(reverse('grading:api_statistics')).json()
+
+    def test_payload_is_served_from_cache_until_a_write(self):
+        self.assertEqual(self.statistics()['total_grades'], 1)
+        # Only the session and user lookups, the conditional-GET probe and the
+        # data generation remain on a hit
+        with self.assertNumQueries(4):
+            self.assertEqual(self.statistics()['total_grades'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_grade('80', name='Quiz')
+        self.assertEqual(self.statistics()['total_grades'], 2)
+        self.assertEqual(DataCache.stats()['statistics'], {'hits': 1, 'misses': 2})
+
+    def test_writes_from_other_processes_invalidate(self):
+        self.assertEqual(self.statistics()['total_grades'], 1)
+        # Another worker's write: its grade and generation bump are in the
+        # database, but this process's cache never saw the signal
+        Grade.objects.bulk_create([Grade(
+            student=self.student, subject=self.english, assessment_name='Essay', assessment_type='TEST',
+            score=Decimal('80'), max_score=Decimal('100'), percentage=Decimal('80'), term='TERM1',
+            date=date(2024, 10, 2),
+        )])
+        DataGeneration.objects.update(value=F('value') + 1)
+        self.assertEqual(self.statistics()['total_grades'], 2)
+
+    def test_generation_bumps_only_after_commit(self):
+        generation = DataCache.generation()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.student.save()
+            self.assertEqual(DataCache.generation(), generation)
+        for callback in callbacks:
+            callback()
+        self.assertGreater(DataCache.generation(), generation)
+
+    def test_bulk_writes_bump_generation(self):
+        generation = DataCache.generation()
+        with self.captureOnCommitCallbacks(execute=True):
+            GradeBulkWriter().write([{
+                'student_id': self.student.pk, 'subject_id': self.math.pk,
+                'assessment_name': 'Bulk', 'term': 'TERM1', 'score': '60',
+            }])
+        self.assertGreater(DataCache.generation(), generation)
+
+    def test_dashboards_use_the_cache(self):
+        self.client.get(reverse('dashboard'))
+        self.client.get(reverse('dashboard'))
+        self.assertEqual(DataCache.stats()['dashboard'], {'hits': 1, 'misses': 1})
+
+
+class StudentGradeProfileTests(GradingTestData, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_school()
+        cls.create_grade('90')
+        cls.create_grade('70', name='Quiz', day=date(2024, 10, 2))
+        cls.create_grade('50', subject=cls.english)
+        cls.create_grade('80', term='TERM2', day=date(2025, 2, 1))
+        cls.user = User.objects.create_user('teacher', password='secret')
+
+    def setUp(self):
+        DataCache.backend().clear()
+        self.client.force_login(self.user)
+
+    def test_loads_student_and_grade_rows_in_two_queries(self):
+        with self.assertNumQueries(2):
+            profile = StudentGradeProfile.load(self.student.pk)
+            self.assertEqual(profile.student.current_class.name, 'Grade 7A')
+        self.assertEqual(profile.grades[0]['subject__name'], 'Mathematics')
+        self.assertEqual((profile.grades[0]['letter'], profile.grades[0]['term_label']), ('B', 'Term 2'))
+        self.assertEqual(profile.overall.count, 4)
+        self.assertEqual(profile.overall.average, Decimal('72.5'))
+        self.assertEqual((profile.overall.best, profile.overall.worst), (Decimal('90'), Decimal('50')))
+        self.assertEqual(profile.overall.distribution, {'A': 1, 'B': 1, 'C': 1, 'D': 0, 'F': 1})
+        self.assertEqual(profile.subjects['Mathematics'].average, 80)
+        self.assertEqual(profile.subjects['English'].letter, 'F')
+        self.assertEqual({term: tally.count for term, tally in profile.terms.items()}, {'TERM1': 3, 'TERM2': 1})
+        self.assertEqual([name for name, tally in profile.subject_performance()], ['Mathematics', 'English'])
+
+    def test_term_profile(self):
+        with self.assertNumQueries(3):
+            profile = StudentGradeProfile.load(self.student.pk, '2024-2025', 'TERM1')
+        self.assertEqual(profile.overall.count, 3)
+        self.assertEqual(profile.overall.pass_rate * 3, 200)
+        profile = StudentGradeProfile.load(self.student.pk, '1999-2000', 'TERM1')
+        self.assertEqual((profile.student, profile.overall.count), (self.student, 0))
+
+    def test_student_without_grades(self):
+        student = self.create_student('Alan', 'Turing', 'MGS002')
+        profile = StudentGradeProfile.load(student.pk)
+        self.assertEqual((profile.student, profile.overall.count, profile.overall.average), (student, 0, None))
+        with self.assertRaises(Student.DoesNotExist):
+            StudentGradeProfile.load(0)
+
+    def test_cached_tallies_follow_the_students_grades(self):
+        DataCache.reset_stats()
+        StudentGradeProfile.cached(self.student.pk, limit=2)
+        # Student, version probe and the newest grade rows
+        with self.assertNumQueries(3):
+            profile = StudentGradeProfile.cached(self.student.pk, limit=2)
+        self.assertEqual((len(profile.grades), profile.overall.count), (2, 4))
+        # Another student's grade leaves the entry valid
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_grade('60', student=self.create_student('Alan', 'Turing', 'MGS002'))
+        StudentGradeProfile.cached(self.student.pk, limit=2)
+        self.assertEqual(DataCache.stats()['student_profile'], {'hits': 2, 'misses': 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_grade('60', name='Homework')
+        self.assertEqual(StudentGradeProfile.cached(self.student.pk, limit=2).overall.count, 5)
+
+    def test_detail_page_and_api_share_the_profile(self):
+        # Session, user, student, version probe and the grade rows, which
+        # are all of them here, so the tallies need no query of their own
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('grading:student_detail', args=[self.student.pk]))
+        self.assertEqual(response.context['total_grades'], 4)
+        self.assertEqual(response.context['best_grade'], Decimal('90'))
+        self.assertContains(response, 'Mathematics')
+        self.assertEqual(self.client.get(reverse('grading:student_detail', args=[0])).status_code, 404)
+
+        data = self.client.get(reverse('grading:api_student_detail', args=[self.student.pk])).json()
+        self.assertEqual(len(data['grades']), 4)
+        self.assertEqual(data['subject_stats']['Mathematics']['average_score'], 80.0)
+        self.assertEqual(len(data['subject_stats']['Mathematics']['grades']), 3)
+        self.assertEqual(data['overall_average'], 65.0)
+        self.assertEqual(data['student']['current_class_name'], 'Grade 7A')
+        response = self.client.get(reverse('grading:api_student_detail', args=[0]))
+        self.assertEqual(response.status_code, 404)
+
+
+class ConditionalApiTests(GradingTestData, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_school()
+        cls.grade = cls.create_grade('70')
+        cls.user = User.objects.create_user('teacher', password='secret')
+
+    def setUp(self):
+        DataCache.backend().clear()
+        self.client.force_login(self.user)
+
+    def test_responses_carry_validators(self):
+        response = self.client.get(reverse('grading:api_grade_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', response)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertIn('max-age=300', self.client.get(reverse('grading:api_subject_list'))['Cache-Control'])
+
+    def test_matching_etag_returns_304_from_the_probe_alone(self):
+        url = reverse('grading:api_grade_list')
+        etag = self.client.get(url)['ETag']
+        # Session, user and the single probe query
+        with self.assertNumQueries(3):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+        last_modified = self.client.get(url)['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def test_writes_and_deletes_change_the_etag(self):
+        url = reverse('grading:api_grade_list')
+        etag = self.client.get(url)['ETag']
+        grade = self.create_grade('80', name='Quiz')
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+        grade.delete()
+        self.assertEqual(self.client.get(url)['ETag'], etag)
+        self.grade.delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_student_detail_is_scoped_to_the_student(self):
+        url = reverse('grading:api_student_detail', args=[self.student.pk])
+        etag = self.client.get(url)['ETag']
+        other = self.create_student('Alan', 'Turing', 'MGS002')
+        self.create_grade('90', student=other)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.create_grade('90', name='Quiz')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_ranking_refresh_changes_student_detail_etag(self):
+        url = reverse('grading:api_student_detail', args=[self.student.pk])
+        etag = self.client.get(url)['ETag']
+        PerformanceRankings.update('2024-2025', 'TERM1')
+        self.assertNotEqual(self.client.get(url)['ETag'], etag)
+
+    def test_errors_are_not_tagged(self):
+        response = self.client.get(reverse('grading:api_student_detail', args=[0]))
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('ETag', response)
+
+
+class ColumnarFormatTests(GradingTestData, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_school()
+        cls.other = cls.create_student('Alan', 'Turing', 'MGS002')
+        cls.create_grade('90')
+        cls.create_grade('70', subject=cls.english, term='TERM2', day=date(2025, 2, 1))
+        cls.create_grade('50', student=cls.other)
+        cls.user = User.objects.create_user('teacher', password='secret')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def get(self, name, **params):
+        return self.client.get(reverse(f'grading:{name}'), {'format': 'columnar', **params})
+
+    def test_grade_columns_match_rows(self):
+        rows = self.client.get(reverse('grading:api_grade_list')).json()
+        table = self.get('api_grade_list').json()
+        self.assertEqual(table['count'], 3)
+        columns = dict(zip(table['columns'], table['data']))
+        self.assertEqual(columns['id'], [row['id'] for row in rows])
+        self.assertEqual(columns['percentage'], [row['percentage'] for row in rows])
+        self.assertEqual(columns['date'], [row['date'] for row in rows])
+
+        def decoded(column):
+            dictionary = table['dictionaries'][column]
+            return [dictionary['labels'][code] for code in columns[column]]
+
+        self.assertEqual(decoded('student'), [row['student_name'] for row in rows])
+        self.assertEqual(decoded('subject'), [row['subject_name'] for row in rows])
+        self.assertEqual(decoded('term'), [row['term_display'] for row in rows])
+        self.assertEqual(decoded('assessment_type'), [row['assessment_type_display'] for row in rows])
+        self.assertEqual(sorted(table['dictionaries']['term']['values']), ['TERM1', 'TERM2'])
+        self.assertEqual(len(table['dictionaries']['student']['values']), 2)
+
+    def test_paginated_and_filtered_columns(self):
+        page = self.get('api_grade_list', page_size=2).json()
+        self.assertEqual(page['count'], 2)
+        self.assertIsNotNone(page['next'])
+        rest = self.get('api_grade_list', page_size=2, cursor=page['next']).json()
+        self.assertEqual((rest['count'], rest['next']), (1, None))
+        self.assertEqual(self.get('api_grade_list', term='TERM2').json()['count'], 1)
+
+    def test_other_list_endpoints(self):
+        students = self.get('api_student_list').json()
+        self.assertEqual(students['columns'][:3], ['id', 'first_name', 'last_name'])
+        self.assertEqual(students['count'], 2)
+        classes = self.get('api_class_list').json()
+        self.assertEqual(classes['dictionaries']['academic_year'], {'values': ['2024-2025']})
+        self.assertEqual(classes['data'][2], [0])
+        self.assertEqual(self.get('api_subject_list').json()['count'], 2)
+
+    def test_grade_statistics_tables(self):
+        rows = self.client.get(reverse('grading:api_grade_statistics')).json()
+        data = self.get('api_grade_statistics').json()
+        self.assertEqual(data['total_grades'], rows['total_grades'])
+        self.assertEqual(data['subject_averages']['columns'], ['subject', 'average', 'count'])
+        self.assertEqual(data['subject_averages']['data'][0], [row['subject__name'] for row in rows['subject_averages']])
+        self.assertEqual(data['term_averages']['data'][2], [2, 1])
+
+    def test_invalid_format(self):
+        self.assertEqual(self.get('api_grade_list', stream='ndjson').status_code, 400)
+        self.assertEqual(self.client.get(reverse('grading:api_grade_list'), {'format': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('grading:api_grade_list'), {'format': 'json'}).status_code, 200)
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import views, api
 
 app_name = 'grading'
 
@@ -16,4 +16,17 @@ urlpatterns = [
     path('grades/add/', views.GradeCreateView.as_view(), name='grade_add'),
     path('grades/<int:pk>/edit/', views.GradeUpdateView.as_view(), name='grade_edit'),
     path('grades/<int:pk>/delete/', views.GradeDeleteView.as_view(), name='grade_delete'),
+    
+    # API URLs
+    path('api/students/', api.student_list_api, name='api_student_list'),
+    path('api/students/lookup/', api.student_lookup_api, name='api_student_lookup'),
+    path('api/students/<int:student_id>/', api.student_detail_api, name='api_student_detail'),
+    path('api/grades/', api.grade_list_api, name='api_grade_list'),
+    path('api/grades/bulk/', api.bulk_grade_upload_api, name='api_grade_bulk_upload'),
+    path('api/grades/statistics/', api.grade_statistics_api, name='api_grade_statistics'),
+    path('api/subjects/', api.subject_list_api, name='api_subject_list'),
+    path('api/classes/', api.class_list_api, name='api_class_list'),
+    path('api/statistics/', api.statistics_api, name='api_statistics'),
+    path('api/dashboard/', api.dashboard_stats_api, name='api_dashboard_stats'),
+    path('api/search/', api.search_api, name='api_search'),
 ]
\ No newline at end of file
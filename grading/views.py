@@ -2,9 +2,15 @@ from django.views.generic import ListView, DetailView, CreateView, UpdateView, D
 from django.urls import reverse_lazy
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
-from django.db.models import Q, Avg, Count, Max, Min
+from django.db.models import Q, Avg
+from django.http import Http404
 from .models import Student, Grade, Subject
 from .forms import GradeForm
+from .services import StudentGradeProfile
+from .search import SearchIndex
+
+# Grades listed on the student page, newest first
+RECENT_GRADES = 10
 
 class StudentListView(LoginRequiredMixin, ListView):
     model = Student
@@ -16,11 +22,15 @@ class StudentListView(LoginRequiredMixin, ListView):
         queryset = Student.objects.filter(is_active=True)
         search = self.request.GET.get('search')
         if search:
-            queryset = queryset.filter(
-                Q(first_name__icontains=search) |
-                Q(last_name__icontains=search) |
-                Q(student_id__icontains=search)
-            )
+            matches = SearchIndex.matching_ids('student', search)
+            if matches is not None:
+                queryset = queryset.filter(pk__in=matches)
+            else:
+                queryset = queryset.filter(
+                    Q(first_name__icontains=search) |
+                    Q(last_name__icontains=search) |
+                    Q(student_id__icontains=search)
+                )
         return queryset
 
 class StudentDetailView(LoginRequiredMixin, DetailView):
@@ -28,42 +38,26 @@ class StudentDetailView(LoginRequiredMixin, DetailView):
     template_name = 'grading/student_detail.html'
     context_object_name = 'student'
     
+    def get_object(self, queryset=None):
+        try:
+            self.profile = StudentGradeProfile.cached(self.kwargs['pk'], limit=RECENT_GRADES)
+        except Student.DoesNotExist:
+            raise Http404('No student found matching the query')
+        return self.profile.student
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        student = self.get_object()
-        
-        # Get all grades for the student
-        grades = Grade.objects.filter(student=student).select_related('subject')
-        context['grades'] = grades
-        
-        # Calculate statistics
-        if grades.exists():
-            # Overall statistics
-            grade_stats = grades.aggregate(
-                avg_grade=Avg('percentage'),
-                total_grades=Count('id'),
-                best_grade=Max('percentage'),
-                worst_grade=Min('percentage')
-            )
-            context.update(grade_stats)
-            
-            # Subject-wise performance
-            subject_performance = grades.values('subject__name').annotate(
-                avg_score=Avg('percentage'),
-                count=Count('id')
-            ).order_by('-avg_score')
-            context['subject_performance'] = subject_performance
-            
-            # Grade distribution
-            grade_distribution = {
-                'A': grades.filter(percentage__gte=90).count(),
-                'B': grades.filter(percentage__gte=80, percentage__lt=90).count(),
-                'C': grades.filter(percentage__gte=70, percentage__lt=80).count(),
-                'D': grades.filter(percentage__gte=60, percentage__lt=70).count(),
-                'F': grades.filter(percentage__lt=60).count(),
-            }
-            context['grade_distribution'] = grade_distribution
-            
+        profile = self.profile
+        context['grades'] = profile.grades
+        if profile.overall.count:
+            context.update({
+                'avg_grade': profile.overall.average,
+                'total_grades': profile.overall.count,
+                'best_grade': profile.overall.best,
+                'worst_grade': profile.overall.worst,
+                'grade_distribution': profile.overall.distribution,
+                'subject_performance': profile.subject_performance(),
+            })
         return context
 
 class StudentCreateView(LoginRequiredMixin, CreateView):
@@ -104,11 +98,15 @@ class GradeListView(LoginRequiredMixin, ListView):
         queryset = Grade.objects.all().select_related("student", "subject")
         search = self.request.GET.get("search")
         if search:
-            queryset = queryset.filter(
-                Q(student__first_name__icontains=search) |
-                Q(student__last_name__icontains=search) |
-                Q(subject__name__icontains=search)
-            )
+            matches = SearchIndex.matching_ids('grade', search)
+            if matches is not None:
+                queryset = queryset.filter(pk__in=matches)
+            else:
+                queryset = queryset.filter(
+                    Q(student__first_name__icontains=search) |
+                    Q(student__last_name__icontains=search) |
+                    Q(subject__name__icontains=search)
+                )
         return queryset
 
     def get_context_data(self, **kwargs):
@@ -0,0 +1,42 @@
+from django import forms
+from django.urls import reverse_lazy
+from django.utils.html import format_html
+from .models import Student
+
+class StudentTypeaheadWidget(forms.Widget):
+    """Search-as-you-type student picker.
+
+    Renders a text box plus a hidden input holding the selected student's
+    primary key. Matches are fetched page by page from the student lookup
+    API, so the page never embeds the full roster as <option> tags.
+    """
+    lookup_url = reverse_lazy('grading:api_student_lookup')
+
+    class Media:
+        js = ('js/typeahead.js',)
+
+    def __init__(self, attrs=None, placeholder='Search students by name or ID'):
+        super().__init__(attrs)
+        self.placeholder = placeholder
+
+    def label_for(self, value):
+        if value in (None, ''):
+            return ''
+        student = Student.objects.filter(pk=value).only('first_name', 'last_name', 'student_id').first()
+        return str(student) if student else ''
+
+    def render(self, name, value, attrs=None, renderer=None):
+        attrs = self.build_attrs(self.attrs, attrs)
+        input_id = attrs.get('id', f'id_{name}')
+        css_class = attrs.get('class', 'form-control')
+        return format_html(
+            '<div class="student-typeahead position-relative" data-lookup-url="{}">'
+            '<input type="text" id="{}_search" class="{}" value="{}" placeholder="{}" '
+            'autocomplete="off" role="combobox" aria-autocomplete="list" aria-expanded="false">'
+            '<input type="hidden" name="{}" id="{}" value="{}">'
+            '<div class="list-group position-absolute w-100 shadow-sm student-typeahead-results" '
+            'style="z-index: 1000;" role="listbox"></div>'
+            '</div>',
+            self.lookup_url, input_id, css_class, self.label_for(value), self.placeholder,
+            name, input_id, '' if value is None else value
+        )
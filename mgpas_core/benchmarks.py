@@ -0,0 +1,303 @@
+import json
+import os
+import statistics
+import time
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+# populate_sample_data options for the benchmark dataset; baselines are only
+# comparable when they were recorded against the same dataset
+DATASET = {
+    'years': 1,
+    'first_year': 2024,
+    'classes': 6,
+    'subjects': 8,
+    'students': 600,
+    'grades_per_term': 4,
+    'seed': 42,
+}
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baselines.json')
+
+# Default allowed p50 slowdown over the baseline, as a fraction, after
+# scaling the baseline by how fast the calibration workload ran
+THRESHOLD = 0.5
+# Latency differences below this many milliseconds are treated as noise
+NOISE_FLOOR_MS = 2.0
+
+
+class Scenario:
+    """One timed call against the seeded dataset.
+
+    ``run(data, client)`` performs the call; a returned response must be a
+    200 and is fully consumed (including streaming bodies) inside the timing.
+    ``max_queries`` is the reviewed query budget: exceeding it fails the run
+    regardless of the recorded baseline, which is how N+1 regressions get caught.
+    """
+
+    def __init__(self, name, max_queries, run):
+        self.name = name
+        self.max_queries = max_queries
+        self.run = run
+
+
+class BenchmarkData:
+    """The seeded objects the scenarios refer to, looked up once"""
+
+    TERM = 'TERM1'
+
+    def __init__(self):
+        from authentication.models import User
+        from grading.models import AcademicYear, Class, Grade, Student, Subject
+        self.academic_year = AcademicYear.objects.order_by('-start_date').first()
+        self.student = Student.objects.filter(grade__isnull=False).order_by('pk').first()
+        self.subject = Subject.objects.order_by('pk').first()
+        self.class_obj = Class.objects.filter(academic_year=self.academic_year).order_by('pk').first()
+        self.user = User.objects.filter(username='benchmark').first() or User.objects.create_superuser(
+            'benchmark', 'benchmark@example.com', 'benchmark'
+        )
+        self.upload = self.upload_batch(Grade, Student, Subject)
+
+    def upload_batch(self, Grade, Student, Subject, students=10, subjects=5):
+        """A bulk upload spanning ``students`` x ``subjects``: one existing
+        grade per pair (the update path) and one new assessment (the insert path)"""
+        student_ids = list(
+            Student.objects.filter(academic_year=self.academic_year).order_by('pk').values_list('pk', flat=True)[:students]
+        )
+        subject_ids = list(Subject.objects.order_by('pk').values_list('pk', flat=True)[:subjects])
+        existing = {}
+        for grade in Grade.objects.filter(
+            student_id__in=student_ids, subject_id__in=subject_ids, term=self.TERM
+        ).order_by('pk').values('student_id', 'subject_id', 'assessment_name', 'score', 'max_score', 'date'):
+            existing.setdefault((grade['student_id'], grade['subject_id']), grade)
+        rows = []
+        for (student_id, subject_id), grade in sorted(existing.items()):
+            for assessment_name in (grade['assessment_name'], 'Benchmark Upload'):
+                rows.append({
+                    'student_id': student_id,
+                    'subject_id': subject_id,
+                    'assessment_name': assessment_name,
+                    'term': self.TERM,
+                    'score': str(grade['score']),
+                    'max_score': str(grade['max_score']),
+                    'date': grade['date'].isoformat(),
+                })
+        return rows
+
+
+def _get(url_name, params=None, **kwargs):
+    def run(data, client):
+        return client.get(reverse(url_name, kwargs={
+            key: value(data) for key, value in kwargs.items()
+        }), params or {})
+    return run
+
+
+def _calibrate(data, client):
+    """Fixed work that doesn't depend on the code under test: a CPU-bound
+    SQL query and some Python, so timings can be scaled by machine speed"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'WITH RECURSIVE numbers(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM numbers WHERE n < 50000) '
+            'SELECT SUM(n) FROM numbers'
+        )
+        cursor.fetchone()
+    rows = [{'id': index, 'score': (index * 7919) % 1000 / 10} for index in range(20000)]
+    return json.dumps(sorted(rows, key=lambda row: row['score']))
+
+
+# Measured before the scenarios in every run; not a scenario itself
+CALIBRATION = Scenario('calibration', 1, _calibrate)
+
+
+def _bulk_upload(data, client):
+    return client.post(
+        reverse('grading:api_grade_bulk_upload'),
+        json.dumps({'grades': data.upload}),
+        content_type='application/json',
+    )
+
+
+def _calculator(method, *args):
+    def run(data, client):
+        from analytics.services import AnalyticsCalculator
+        return getattr(AnalyticsCalculator, method)(*[arg(data) for arg in args], data.academic_year.name, data.TERM)
+    return run
+
+
+def _report_card(data, client):
+    from grading.models import Student
+    from reporting.services import ReportGenerator
+    # Load the student as the report form does, so lazy relations are counted every call
+    student = Student.objects.get(pk=data.student.pk)
+    return ReportGenerator.generate_student_report_card(student, data.academic_year.name, data.TERM, 'HTML')
+
+
+def _school_summary(data, client):
+    from reporting.summary import SchoolSummary
+    return b''.join(SchoolSummary(data.academic_year.name, data.TERM).html_chunks())
+
+
+def _student_pk(data):
+    return data.student.pk
+
+
+SCENARIOS = [
+    Scenario('api.student_list', 4, _get('grading:api_student_list')),
+    Scenario('api.student_list.cursor', 4, _get('grading:api_student_list', {'page_size': 50})),
+    Scenario('api.student_lookup', 4, _get('grading:api_student_lookup', {'q': 'Ba'})),
+    Scenario('api.student_detail', 7, _get('grading:api_student_detail', student_id=_student_pk)),
+    Scenario('api.grade_list', 4, _get('grading:api_grade_list')),
+    Scenario('api.grade_list.cursor', 4, _get('grading:api_grade_list', {'page_size': 50})),
+    Scenario('api.grade_list.ndjson', 4, _get('grading:api_grade_list', {'stream': 'ndjson'})),
+    Scenario('api.grade_list.columnar', 4, _get('grading:api_grade_list', {'format': 'columnar'})),
+    Scenario('api.grade_bulk_upload', 18, _bulk_upload),
+    Scenario('api.grade_statistics', 6, _get('grading:api_grade_statistics', {'term': 'TERM1'})),
+    Scenario('api.subject_list', 4, _get('grading:api_subject_list')),
+    Scenario('api.class_list', 4, _get('grading:api_class_list')),
+    Scenario('api.statistics', 12, _get('grading:api_statistics')),
+    Scenario('api.dashboard_stats', 11, _get('grading:api_dashboard_stats')),
+    Scenario('api.search', 8, _get('grading:api_search', {'q': 'Banda'})),
+    Scenario('view.student_detail', 6, _get('grading:student_detail', pk=_student_pk)),
+    Scenario('view.grade_list', 6, _get('grading:grade_list')),
+    Scenario('view.dashboard', 10, _get('dashboard')),
+    Scenario('view.analytics_dashboard', 10, _get('analytics:dashboard')),
+    Scenario('analytics.grade_distribution', 4, _calculator('calculate_grade_distribution', lambda data: data.subject)),
+    Scenario('analytics.student_performance', 4, _calculator('calculate_student_performance', lambda data: data.student)),
+    Scenario('analytics.class_performance', 5, _calculator('get_class_performance', lambda data: data.class_obj)),
+    Scenario('analytics.subject_comparison', 4, _calculator('get_subject_comparison')),
+    Scenario('report.student_report_card', 6, _report_card),
+    Scenario('report.school_summary', 4, _school_summary),
+]
+
+
+def seed(stdout=None):
+    """Load the benchmark dataset into the current (empty) database"""
+    call_command('populate_sample_data', stdout=stdout, **DATASET)
+
+
+def _consume(response):
+    if getattr(response, 'streaming', False):
+        return sum(len(chunk) for chunk in response.streaming_content)
+    return len(getattr(response, 'content', b''))
+
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(percent / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def measure(scenario, data, client, iterations=20, warmup=2):
+    """Time ``scenario``; returns its p50/p95 in milliseconds and its query count.
+
+    Every call runs in a transaction that is rolled back, so writes don't
+    change the dataset, and starts with an empty DataCache, so the full
+    query path is what gets timed and counted.
+    """
+    from django.http import HttpResponseBase
+    from grading.cache import DataCache
+    timings = []
+    queries = []
+    for iteration in range(warmup + iterations):
+        DataCache.backend().clear()
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                result = scenario.run(data, client)
+                if isinstance(result, HttpResponseBase):
+                    if result.status_code != 200:
+                        raise RuntimeError(f'{scenario.name} returned HTTP {result.status_code}')
+                    _consume(result)
+                elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+        if iteration >= warmup:
+            timings.append(elapsed * 1000)
+            queries.append(len(captured.captured_queries))
+    return {
+        'p50_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(_percentile(timings, 95), 3),
+        'queries': max(queries),
+    }
+
+
+def run(scenarios=None, iterations=20, warmup=2, progress=None):
+    """Measure ``scenarios`` (default: all) against the current database; returns {name: result}
+
+    Each result also records the p50 of the CALIBRATION workload measured
+    in the same process as ``calibration_ms``.
+    """
+    data = BenchmarkData()
+    client = Client()
+    client.force_login(data.user)
+    calibration = measure(CALIBRATION, data, client, iterations, warmup)['p50_ms']
+    results = {}
+    for scenario in scenarios or SCENARIOS:
+        results[scenario.name] = {**measure(scenario, data, client, iterations, warmup), 'calibration_ms': calibration}
+        if progress:
+            progress(scenario.name, results[scenario.name])
+    return results
+
+
+def compare(results, baseline, scenarios=None):
+    """Return a list of query regressions for ``results`` against ``baseline``.
+
+    Fails a scenario that goes over its query budget or that runs more
+    queries than its baseline. Query counts are deterministic, so these
+    are the only hard failures; see ``slowdowns()`` for latency.
+    """
+    budgets = {scenario.name: scenario.max_queries for scenario in scenarios or SCENARIOS}
+    recorded = baseline.get('scenarios', {})
+    failures = []
+    for name, result in results.items():
+        if name in budgets and result['queries'] > budgets[name]:
+            failures.append(f"{name}: {result['queries']} queries, over its budget of {budgets[name]}")
+        previous = recorded.get(name)
+        if previous is not None and result['queries'] > previous['queries']:
+            failures.append(f"{name}: {result['queries']} queries, baseline {previous['queries']}")
+    return failures
+
+
+def slowdowns(results, baseline, threshold=THRESHOLD):
+    """Return a list of latency regressions for ``results`` against ``baseline``.
+
+    The baseline p50 is first scaled up by how much slower the calibration
+    workload ran now than when the baseline was recorded, so a slower
+    machine doesn't read as a regression. It is never scaled down: a
+    single noisy fast calibration would otherwise flag every scenario. A scenario is flagged when
+    its p50 exceeds that by more than ``threshold`` (and by more than
+    NOISE_FLOOR_MS). The median is used because p95 over a few dozen calls
+    mostly measures machine noise.
+    """
+    recorded = baseline.get('scenarios', {})
+    messages = []
+    for name, result in results.items():
+        previous = recorded.get(name)
+        if previous is None:
+            continue
+        expected = previous['p50_ms']
+        if result.get('calibration_ms') and previous.get('calibration_ms'):
+            expected *= max(1.0, result['calibration_ms'] / previous['calibration_ms'])
+        if result['p50_ms'] > expected * (1 + threshold) and result['p50_ms'] - expected > NOISE_FLOOR_MS:
+            messages.append(
+                f"{name}: p50 {result['p50_ms']:.1f}ms, expected {expected:.1f}ms "
+                f"(baseline {previous['p50_ms']:.1f}ms, +{threshold:.0%} allowed)"
+            )
+    return messages
+
+
+def load_baseline(path=BASELINE_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    with open(path, 'w') as f:
+        json.dump({'dataset': DATASET, 'scenarios': results}, f, indent=2, sort_keys=True)
+        f.write('\n')
@@ -0,0 +1,291 @@
+import atexit
+import copy
+import glob
+import hmac
+import json
+import os
+import threading
+import time
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+
+# Histogram upper bounds; +Inf is implied
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# Seconds between per-process snapshot writes
+FLUSH_INTERVAL = 5
+
+_process = (None, None)
+
+
+def metrics_dir():
+    if not getattr(settings, 'METRICS_ENABLED', False):
+        return None
+    return getattr(settings, 'METRICS_DIR', None)
+
+
+def process_key():
+    """``<pid>-<start time>`` naming this process's snapshot file.
+
+    The start time tells a reused pid apart from the process that wrote an
+    older snapshot; it is taken again after a fork.
+    """
+    global _process
+    pid = os.getpid()
+    if _process[0] != pid:
+        _process = (pid, time.time_ns())
+    return f'{_process[0]}-{_process[1]}'
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class QueryCounter:
+    """connection.execute_wrapper() hook counting queries and their time"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+class MetricsRegistry:
+    """Per-process request metrics, shared across workers through snapshot files.
+
+    Each process keeps plain counters in memory and writes them to
+    ``METRICS_DIR/<pid>-<start time>.json`` at most every FLUSH_INTERVAL
+    seconds (and at exit). ``collect()`` sums every live process's snapshot,
+    so any worker can serve the totals for all of them, and deletes the
+    snapshots of processes that have exited.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.last_flush = 0.0
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = {}
+            self.latency = {}
+            self.queries = {}
+            self.db_seconds = {}
+            self.response_bytes = {}
+
+    @staticmethod
+    def _observe(histograms, key, buckets, value):
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = {'buckets': [0] * len(buckets), 'sum': 0, 'count': 0}
+        for index, bound in enumerate(buckets):
+            if value <= bound:
+                histogram['buckets'][index] += 1
+                break
+        histogram['sum'] += value
+        histogram['count'] += 1
+
+    def observe(self, view, method, status, seconds, queries, db_seconds, size):
+        key = f'{view}\t{method}'
+        with self.lock:
+            status_key = f'{key}\t{status}'
+            self.requests[status_key] = self.requests.get(status_key, 0) + 1
+            self._observe(self.latency, key, LATENCY_BUCKETS, seconds)
+            self._observe(self.queries, key, QUERY_BUCKETS, queries)
+            self.db_seconds[key] = self.db_seconds.get(key, 0) + db_seconds
+            self.response_bytes[key] = self.response_bytes.get(key, 0) + size
+        if time.monotonic() - self.last_flush >= FLUSH_INTERVAL:
+            self.flush()
+
+    def snapshot(self):
+        from grading.cache import DataCache
+        with self.lock:
+            return copy.deepcopy({
+                'requests': self.requests,
+                'latency': self.latency,
+                'queries': self.queries,
+                'db_seconds': self.db_seconds,
+                'response_bytes': self.response_bytes,
+                'cache': DataCache.stats(),
+            })
+
+    def flush(self):
+        directory = metrics_dir()
+        self.last_flush = time.monotonic()
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{process_key()}.json')
+        # Write then rename so readers never see a partial snapshot
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(f'{path}.tmp', path)
+
+    @staticmethod
+    def stale(path):
+        """Whether a snapshot was written by a process that has exited"""
+        key = os.path.basename(path)[:-len('.json')]
+        try:
+            pid = int(key.split('-', 1)[0])
+        except ValueError:
+            return False
+        if pid == os.getpid():
+            return key != process_key()
+        return not _alive(pid)
+
+    def collect(self):
+        """Sum the snapshots of every process, including a fresh one of this process"""
+        self.flush()
+        directory = metrics_dir()
+        snapshots = []
+        if directory:
+            for path in glob.glob(os.path.join(directory, '*-*.json')):
+                if self.stale(path):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                    continue
+                try:
+                    with open(path) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        else:
+            snapshots.append(self.snapshot())
+
+        totals = {'requests': {}, 'latency': {}, 'queries': {}, 'db_seconds': {}, 'response_bytes': {}, 'cache': {}}
+        for snapshot in snapshots:
+            for name in ('requests', 'db_seconds', 'response_bytes'):
+                for key, value in snapshot[name].items():
+                    totals[name][key] = totals[name].get(key, 0) + value
+            for name in ('latency', 'queries'):
+                for key, histogram in snapshot[name].items():
+                    total = totals[name].setdefault(key, {'buckets': [0] * len(histogram['buckets']), 'sum': 0, 'count': 0})
+                    total['buckets'] = [a + b for a, b in zip(total['buckets'], histogram['buckets'])]
+                    total['sum'] += histogram['sum']
+                    total['count'] += histogram['count']
+            for payload, counts in snapshot.get('cache', {}).items():
+                total = totals['cache'].setdefault(payload, {'hits': 0, 'misses': 0})
+                total['hits'] += counts['hits']
+                total['misses'] += counts['misses']
+        return totals
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _histogram_lines(name, histograms, buckets):
+    for key, histogram in sorted(histograms.items()):
+        view, method = key.split('\t')
+        cumulative = 0
+        for bound, count in zip(buckets, histogram['buckets']):
+            cumulative += count
+            yield f'{name}_bucket{_labels(view=view, method=method, le=bound)} {cumulative}'
+        yield f'{name}_bucket{_labels(view=view, method=method, le="+Inf")} {histogram["count"]}'
+        yield f'{name}_sum{_labels(view=view, method=method)} {histogram["sum"]}'
+        yield f'{name}_count{_labels(view=view, method=method)} {histogram["count"]}'
+
+
+def render(totals):
+    """Prometheus text exposition format (version 0.0.4)"""
+    lines = [
+        '# HELP mgpas_http_requests_total Requests by view, method and status.',
+        '# TYPE mgpas_http_requests_total counter',
+    ]
+    for key, count in sorted(totals['requests'].items()):
+        view, method, status = key.split('\t')
+        lines.append(f'mgpas_http_requests_total{_labels(view=view, method=method, status=status)} {count}')
+
+    lines += [
+        '# HELP mgpas_http_request_duration_seconds Request latency by view.',
+        '# TYPE mgpas_http_request_duration_seconds histogram',
+    ]
+    lines += _histogram_lines('mgpas_http_request_duration_seconds', totals['latency'], LATENCY_BUCKETS)
+    lines += [
+        '# HELP mgpas_http_request_queries SQL queries per request by view.',
+        '# TYPE mgpas_http_request_queries histogram',
+    ]
+    lines += _histogram_lines('mgpas_http_request_queries', totals['queries'], QUERY_BUCKETS)
+
+    for name, source, help_text in (
+        ('mgpas_http_request_db_seconds_total', 'db_seconds', 'Time spent in SQL queries by view.'),
+        ('mgpas_http_response_bytes_total', 'response_bytes', 'Response body bytes by view.'),
+    ):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for key, value in sorted(totals[source].items()):
+            view, method = key.split('\t')
+            lines.append(f'{name}{_labels(view=view, method=method)} {value}')
+
+    for outcome in ('hits', 'misses'):
+        name = f'mgpas_data_cache_{outcome}_total'
+        lines += [f'# HELP {name} Dashboard/statistics cache {outcome} by payload.', f'# TYPE {name} counter']
+        for payload, counts in sorted(totals['cache'].items()):
+            lines.append(f'{name}{_labels(payload=payload)} {counts[outcome]}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+atexit.register(registry.flush)
+
+
+class MetricsMiddleware:
+    """Records latency, SQL query count/time and response size per URL name.
+
+    Queries run while a streaming response is being iterated happen after
+    this middleware returns and are not counted.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        started = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        if response.streaming:
+            size = int(response.get('Content-Length') or 0)
+        else:
+            size = len(response.content)
+        registry.observe(view, request.method, response.status_code, elapsed, counter.count, counter.seconds, size)
+        return response
+
+
+def metrics_view(request):
+    if not getattr(settings, 'METRICS_ENABLED', False):
+        raise Http404
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    authorized = token and hmac.compare_digest(
+        request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()
+    )
+    if not (authorized or request.user.is_staff):
+        return HttpResponseForbidden()
+    return HttpResponse(render(registry.collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -29,6 +30,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'mgpas_core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -62,6 +64,22 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Concurrent writers (gunicorn workers, recompute_analytics and report
+        # worker processes) take the write lock when a transaction starts and
+        # wait up to `timeout` seconds for it rather than failing with
+        # "database is locked"
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+        },
+        # A file rather than memory, so tests can run commands that use
+        # worker processes; named per run so concurrent runs on one host
+        # don't share it. Set TEST_DATABASE_NAME to choose the file.
+        'TEST': {
+            'NAME': os.getenv(
+                'TEST_DATABASE_NAME', os.path.join(tempfile.gettempdir(), f'mgpas-test-{os.getpid()}.sqlite3')
+            ),
+        },
     }
 }
 
@@ -94,6 +112,44 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Caches. LocMemCache is per process; DataCache still invalidates every
+# process because its generation counter is kept in the database. Point
+# CACHE_BACKEND/CACHE_LOCATION at a shared backend (Redis, Memcached) to also
+# share the cached payloads between workers.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'mgpas'),
+    }
+}
+
+# Dashboard and statistics payloads (grading.cache.DataCache)
+DATA_CACHE_ALIAS = 'default'
+DATA_CACHE_TIMEOUT = int(os.getenv('DATA_CACHE_TIMEOUT', '300'))
+
+# Engine for AnalyticsCalculator's whole-term rebuilds: 'orm' (grouped SQL
+# aggregates) or 'numpy' (analytics.columnar column arrays)
+ANALYTICS_ENGINE = os.getenv('ANALYTICS_ENGINE', 'orm')
+
+# Request metrics served at /metrics (mgpas_core.metrics), off unless
+# METRICS_ENABLED=True. Each worker process writes its counters to
+# METRICS_DIR so any worker can report the totals; snapshots of exited
+# workers are pruned on scrape. Scrapes need "Authorization: Bearer
+# <METRICS_TOKEN>" or a staff login.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'False') == 'True'
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'mgpas-metrics'))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Worker processes rendering class report cards to PDF (default: CPU count)
+REPORT_WORKERS = int(os.getenv('REPORT_WORKERS', '0')) or None
+
+# Queued reports (reporting.jobs) are built by `manage.py run_report_worker`,
+# which must run on the same host as the database and this directory.
+REPORTS_DIR = os.getenv('REPORTS_DIR', os.path.join(MEDIA_ROOT, 'reports'))
+# Built reports are cached by content under REPORTS_DIR/cache; least recently
+# used files are removed once it grows past this many bytes
+REPORT_CACHE_MAX_BYTES = int(os.getenv('REPORT_CACHE_MAX_BYTES', str(1024 ** 3)))
+
 # Custom user model
 AUTH_USER_MODEL = 'authentication.User'
 
@@ -0,0 +1,144 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from authentication.models import User
+from grading.cache import DataCache
+from . import benchmarks
+from .metrics import process_key, registry
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('teacher', password='secret', is_staff=True)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        settings_override = override_settings(METRICS_ENABLED=True, METRICS_DIR=self.directory, METRICS_TOKEN='')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        registry.reset()
+        DataCache.backend().clear()
+        DataCache.reset_stats()
+        self.client.force_login(self.user)
+
+    def scrape(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        return response.content.decode()
+
+    def test_records_latency_queries_and_size_per_view(self):
+        response = self.client.get(reverse('grading:api_statistics'))
+        metrics = self.scrape()
+        labels = 'view="grading:api_statistics",method="GET"'
+        self.assertIn(f'mgpas_http_requests_total{{{labels},status="200"}} 1', metrics)
+        self.assertIn(f'mgpas_http_request_duration_seconds_count{{{labels}}} 1', metrics)
+        self.assertIn(f'mgpas_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 1', metrics)
+        self.assertIn(f'mgpas_http_request_queries_bucket{{{labels},le="0"}} 0', metrics)
+        self.assertIn(f'mgpas_http_response_bytes_total{{{labels}}} {len(response.content)}', metrics)
+        self.assertIn('mgpas_http_request_db_seconds_total{' + labels, metrics)
+
+    def test_sums_snapshots_from_other_workers(self):
+        self.client.get(reverse('grading:api_statistics'))
+        # pid 1 outlives the test run, so its snapshot is not pruned
+        with open(os.path.join(self.directory, '1-0.json'), 'w') as f:
+            json.dump({
+                'requests': {'grading:api_statistics\tGET\t200': 4},
+                'latency': {}, 'queries': {}, 'db_seconds': {}, 'response_bytes': {},
+                'cache': {'statistics': {'hits': 3, 'misses': 1}},
+            }, f)
+        metrics = self.scrape()
+        self.assertIn('mgpas_http_requests_total{view="grading:api_statistics",method="GET",status="200"} 5', metrics)
+        self.assertIn('mgpas_data_cache_hits_total{payload="statistics"} 3', metrics)
+        self.assertIn('mgpas_data_cache_misses_total{payload="statistics"} 2', metrics)
+
+    def test_prunes_snapshots_of_exited_processes(self):
+        process = subprocess.Popen([sys.executable, '-c', ''])
+        process.wait()
+        exited = os.path.join(self.directory, f'{process.pid}-0.json')
+        restarted = os.path.join(self.directory, f'{os.getpid()}-0.json')
+        for path in (exited, restarted):
+            with open(path, 'w') as f:
+                json.dump({
+                    'requests': {'grading:api_statistics\tGET\t200': 4},
+                    'latency': {}, 'queries': {}, 'db_seconds': {}, 'response_bytes': {}, 'cache': {},
+                }, f)
+        self.assertNotIn('grading:api_statistics', self.scrape())
+        self.assertFalse(os.path.exists(exited))
+        self.assertFalse(os.path.exists(restarted))
+        self.assertEqual(os.listdir(self.directory), [f'{process_key()}.json'])
+
+    def test_requires_token_or_staff_login(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        teacher = User.objects.create_user('other', password='secret')
+        self.client.force_login(teacher)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        with self.settings(METRICS_TOKEN='secret-token'):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret-token')
+            self.assertEqual(response.status_code, 200)
+
+    def test_not_served_when_disabled(self):
+        with self.settings(METRICS_ENABLED=False):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+
+
+class BenchmarkTests(TestCase):
+    def test_every_scenario_runs_within_its_query_budget(self):
+        call_command(
+            'populate_sample_data', students=8, classes=2, subjects=2, grades_per_term=2, stdout=StringIO()
+        )
+        results = benchmarks.run(iterations=1, warmup=0)
+        self.assertEqual(set(results), {scenario.name for scenario in benchmarks.SCENARIOS})
+        self.assertTrue(all(result['calibration_ms'] > 0 for result in results.values()))
+        self.assertEqual(benchmarks.compare(results, {}), [])
+
+    def test_compare_fails_only_on_query_regressions(self):
+        baseline = {'scenarios': {
+            'api.subject_list': {'p50_ms': 10.0, 'p95_ms': 12.0, 'queries': 2},
+            'api.class_list': {'p50_ms': 10.0, 'p95_ms': 12.0, 'queries': 3},
+        }}
+        failures = benchmarks.compare({
+            'api.subject_list': {'p50_ms': 11.0, 'p95_ms': 30.0, 'queries': 3},
+            'api.class_list': {'p50_ms': 20.0, 'p95_ms': 22.0, 'queries': 3},
+            'api.student_list': {'p50_ms': 1.0, 'p95_ms': 1.0, 'queries': 50},
+        }, baseline)
+        self.assertEqual(failures, [
+            'api.subject_list: 3 queries, baseline 2',
+            'api.student_list: 50 queries, over its budget of 4',
+        ])
+
+    def test_slowdowns_are_scaled_by_the_calibration_run(self):
+        baseline = {'scenarios': {
+            'api.subject_list': {'p50_ms': 10.0, 'p95_ms': 12.0, 'queries': 2, 'calibration_ms': 5.0},
+            'api.class_list': {'p50_ms': 10.0, 'p95_ms': 12.0, 'queries': 3, 'calibration_ms': 5.0},
+            'api.student_list': {'p50_ms': 10.0, 'p95_ms': 12.0, 'queries': 4, 'calibration_ms': 5.0},
+        }}
+        slowdowns = benchmarks.slowdowns({
+            # Twice as slow on a machine that runs the calibration twice as slowly
+            'api.subject_list': {'p50_ms': 20.0, 'p95_ms': 24.0, 'queries': 2, 'calibration_ms': 10.0},
+            'api.class_list': {'p50_ms': 20.0, 'p95_ms': 22.0, 'queries': 3, 'calibration_ms': 5.0},
+            # A faster calibration never tightens the limit
+            'api.student_list': {'p50_ms': 10.0, 'p95_ms': 12.0, 'queries': 4, 'calibration_ms': 1.0},
+        }, baseline, threshold=0.5)
+        self.assertEqual(slowdowns, [
+            'api.class_list: p50 20.0ms, expected 10.0ms (baseline 10.0ms, +50% allowed)',
+        ])
+
+    def test_bulk_upload_spans_students_and_subjects(self):
+        call_command(
+            'populate_sample_data', students=12, classes=2, subjects=6, grades_per_term=1, stdout=StringIO()
+        )
+        upload = benchmarks.BenchmarkData().upload
+        self.assertEqual(len({row['student_id'] for row in upload}), 10)
+        self.assertEqual(len({row['subject_id'] for row in upload}), 5)
+        self.assertEqual(len(upload), 10 * 5 * 2)
@@ -0,0 +1,158 @@
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils.text import slugify
+from grading.models import AcademicYear, Grade, Student
+from grading.services import StudentGradeProfile
+from analytics.models import StudentPerformance
+from analytics.rankings import PerformanceRankings
+from .pdf import html_to_pdf
+from .services import ReportGenerator
+
+# Bytes per chunk when streaming a finished file
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class _StreamSink:
+    """Unseekable file object that hands out whatever was written since the last drain"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class ClassReportCards:
+    """Report cards for every active student of a class, rendered to PDF in parallel.
+
+    All the data comes from a fixed number of queries (students, their
+    grades, performances and subject names) whatever the class size. Each
+    card's HTML is rendered here and converted to PDF in a process pool,
+    with at most ``2 * workers`` cards in flight, so memory stays bounded
+    while the finished PDFs are streamed out.
+    """
+
+    def __init__(self, class_obj, academic_year, term, workers=None, progress=None):
+        self.class_obj = class_obj
+        self.academic_year = academic_year
+        self.term = term
+        self.workers = workers or getattr(settings, 'REPORT_WORKERS', None) or os.cpu_count() or 1
+        # Called with (cards done, total cards) as each card finishes
+        self.progress = progress
+        self.total = None
+
+    def students(self):
+        return list(Student.objects.filter(
+            current_class=self.class_obj, is_active=True
+        ).select_related('current_class').order_by('last_name', 'first_name', 'pk'))
+
+    def contexts(self):
+        """Yield (student, report card context) in class-list order"""
+        students = self.students()
+        self.total = len(students)
+        date_range = AcademicYear.date_range(self.academic_year)
+        grades_by_student = {student.pk: [] for student in students}
+        if date_range and students:
+            grades = StudentGradeProfile.rows(Grade.objects.filter(
+                student__in=students, term=self.term, date__range=date_range
+            ))
+            for grade in grades:
+                grades_by_student[grade['student_id']].append(grade)
+        performances = {
+            performance.student_id: performance
+            for performance in StudentPerformance.objects.filter(
+                student__in=students, academic_year=self.academic_year, term=self.term
+            )
+        }
+        percentiles = dict(zip(performances, PerformanceRankings.named_percentiles(list(performances.values()))))
+        for student in students:
+            profile = StudentGradeProfile(student, grades_by_student[student.pk])
+            yield student, ReportGenerator.report_card_context(
+                profile, self.academic_year, self.term, performances.get(student.pk), percentiles.get(student.pk),
+            )
+
+    @staticmethod
+    def filename(student):
+        return f"{student.student_id}-{slugify(f'{student.first_name} {student.last_name}')}.pdf"
+
+    def pdfs(self, ordered=False):
+        """Yield (filename, PDF bytes) per student, as they finish unless ``ordered``"""
+        for done, card in enumerate(self._render(ordered), 1):
+            if self.progress:
+                self.progress(done, self.total)
+            yield card
+
+    def _render(self, ordered):
+        cards = (
+            (self.filename(student), render_to_string('reporting/student_report_card.html', {**context, 'pdf': True}))
+            for student, context in self.contexts()
+        )
+        if self.workers == 1:
+            for filename, html in cards:
+                yield filename, html_to_pdf(html)
+            return
+        pool = ProcessPoolExecutor(max_workers=self.workers)
+        try:
+            pending = deque()
+            for filename, html in cards:
+                pending.append((filename, pool.submit(html_to_pdf, html)))
+                if len(pending) >= 2 * self.workers:
+                    yield from self._finished(pending, ordered)
+            while pending:
+                yield from self._finished(pending, ordered)
+        finally:
+            # Also reached when the client disconnects mid-stream
+            pool.shutdown(cancel_futures=True)
+
+    @staticmethod
+    def _finished(pending, ordered):
+        """Pop and yield the next finished PDFs from ``pending``"""
+        if ordered:
+            filename, future = pending.popleft()
+            yield filename, future.result()
+            return
+        done, _ = wait([future for filename, future in pending], return_when=FIRST_COMPLETED)
+        for item in [item for item in pending if item[1] in done]:
+            pending.remove(item)
+            yield item[0], item[1].result()
+
+    def zip_stream(self):
+        """Yield a ZIP archive of the PDFs chunk by chunk, each card as soon as it is ready"""
+        sink = _StreamSink()
+        with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED) as archive:
+            for filename, pdf in self.pdfs():
+                archive.writestr(filename, pdf)
+                yield sink.drain()
+        yield sink.drain()
+
+    def merged_pdf_stream(self):
+        """Yield one PDF with every card in class-list order.
+
+        pypdf can only write the merged document once every card has been
+        added, so it is spooled to a temporary file and streamed from there.
+        """
+        from pypdf import PdfReader, PdfWriter
+        writer = PdfWriter()
+        for filename, pdf in self.pdfs(ordered=True):
+            writer.append(PdfReader(BytesIO(pdf)))
+        with SpooledTemporaryFile(max_size=STREAM_CHUNK_SIZE) as output:
+            writer.write(output)
+            writer.close()
+            output.seek(0)
+            while chunk := output.read(STREAM_CHUNK_SIZE):
+                yield chunk
@@ -0,0 +1,176 @@
+import glob
+import hashlib
+import json
+import os
+from functools import lru_cache
+from django.conf import settings
+from django.db.models import Count, Max, Q
+from django.template.loader import get_template
+from grading.models import AcademicYear, Class, Grade, Student, Subject
+from analytics.models import StudentPerformance
+from .models import GeneratedReport, ReportTemplate
+
+# Bump when a report builder's output changes in a way the templates don't show
+ARTIFACT_VERSION = 1
+
+# Templates whose source is part of every key
+TEMPLATES = (
+    'reporting/student_report_card.html',
+    'reporting/school_summary/start.html',
+    'reporting/school_summary/table.html',
+    'reporting/school_summary/end.html',
+)
+
+CACHE_SUBDIR = 'cache'
+
+
+@lru_cache(maxsize=1)
+def template_version():
+    digest = hashlib.sha256(str(ARTIFACT_VERSION).encode())
+    for name in TEMPLATES:
+        digest.update(get_template(name).template.source.encode())
+    return digest.hexdigest()[:16]
+
+
+def reports_dir():
+    return getattr(settings, 'REPORTS_DIR', os.path.join(settings.MEDIA_ROOT, 'reports'))
+
+
+class ReportCache:
+    """Content-addressed store of built report files under ``REPORTS_DIR/cache``.
+
+    A file's key hashes the report type, format and parameters, the template
+    version and a fingerprint of the data the report reads: the count and
+    latest ``updated_at`` of its grades and students, the stored rankings it
+    prints, and the (small) subject and class tables. Any edit changes the
+    fingerprint, so a cached file is never stale; it is just no longer
+    looked up. Files are evicted least recently used first once the store
+    outgrows ``REPORT_CACHE_MAX_BYTES``.
+    """
+
+    PERFORMANCE_FIELDS = (
+        'student_id', 'average_grade', 'rank_in_class', 'class_size', 'subject_percentiles',
+        'total_subjects', 'total_attendance', 'performance_trend',
+    )
+
+    @staticmethod
+    def max_bytes():
+        return getattr(settings, 'REPORT_CACHE_MAX_BYTES', 1024 ** 3)
+
+    @staticmethod
+    def directory():
+        return os.path.join(reports_dir(), CACHE_SUBDIR)
+
+    @classmethod
+    def key(cls, report_type, format, parameters):
+        state = {
+            'type': report_type,
+            'format': format,
+            'parameters': parameters,
+            'templates': template_version(),
+            'data': cls.fingerprint(report_type, parameters),
+        }
+        return hashlib.sha256(json.dumps(state, sort_keys=True, default=str).encode()).hexdigest()
+
+    @classmethod
+    def fingerprint(cls, report_type, parameters):
+        """Cheap summary of every row the report reads; changes whenever any of them does"""
+        date_range = AcademicYear.date_range(parameters['academic_year'])
+        grades = Grade.objects.filter(term=parameters['term'])
+        grades = grades.filter(date__range=date_range) if date_range else grades.none()
+        performances = StudentPerformance.objects.filter(
+            academic_year=parameters['academic_year'], term=parameters['term']
+        )
+        if report_type == ReportTemplate.ReportType.STUDENT_REPORT:
+            students = Student.objects.filter(pk=parameters['student_id'])
+            grades = grades.filter(student_id=parameters['student_id'])
+            performances = performances.filter(student_id=parameters['student_id'])
+        elif report_type == ReportTemplate.ReportType.CLASS_SUMMARY:
+            students = Student.objects.filter(current_class_id=parameters['class_id'])
+            grades = grades.filter(student__current_class_id=parameters['class_id'])
+            performances = performances.filter(student__current_class_id=parameters['class_id'])
+        else:
+            # School reports summarise every term of the year; their top performers
+            # come from rollup averages, which follow the grades
+            students = Student.objects.all()
+            grades = Grade.objects.filter(date__range=date_range) if date_range else Grade.objects.none()
+            performances = performances.none()
+        return {
+            'grades': grades.aggregate(count=Count('pk'), updated=Max('updated_at')),
+            'students': students.aggregate(
+                count=Count('pk'), active=Count('pk', filter=Q(is_active=True)), updated=Max('updated_at')
+            ),
+            'performances': hashlib.sha256(json.dumps(
+                list(performances.order_by('student_id').values_list(*cls.PERFORMANCE_FIELDS)), default=str
+            ).encode()).hexdigest(),
+            'subjects': list(Subject.objects.order_by('pk').values_list('pk', 'name')),
+            'classes': list(Class.objects.order_by('pk').values_list('pk', 'name')),
+        }
+
+    @classmethod
+    def path(cls, key, extension):
+        """Artifact path, relative to REPORTS_DIR, for a new file under ``key``"""
+        return os.path.join(CACHE_SUBDIR, key[:2], f'{key}.{extension}')
+
+    @classmethod
+    def lookup(cls, key):
+        """Relative path of the file cached under ``key``, marked as just used; None on a miss"""
+        for path in glob.glob(os.path.join(cls.directory(), key[:2], f'{key}.*')):
+            if path.endswith('.part'):
+                continue
+            try:
+                cls.touch(path)
+            except FileNotFoundError:
+                # Evicted since the glob
+                continue
+            return os.path.relpath(path, reports_dir())
+        return None
+
+    @staticmethod
+    def touch(path):
+        """Record a use of ``path``; eviction goes by modification time"""
+        os.utime(path)
+
+    @classmethod
+    def evict(cls, keep=None):
+        """Remove the least recently used files until the store fits; returns how many were removed"""
+        entries = []
+        total = 0
+        for path in glob.glob(os.path.join(cls.directory(), '*', '*')):
+            if path.endswith('.part'):
+                continue
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        limit = cls.max_bytes()
+        removed = 0
+        keep = os.path.join(reports_dir(), keep) if keep else None
+        for mtime, size, path in sorted(entries):
+            if total <= limit:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+    @classmethod
+    def stats(cls):
+        """Hit rate over finished reports, plus the current size of the store"""
+        counts = GeneratedReport.objects.filter(status=GeneratedReport.Status.DONE).exclude(cache_key='').aggregate(
+            lookups=Count('pk'), hits=Count('pk', filter=Q(cache_hit=True))
+        )
+        files = [path for path in glob.glob(os.path.join(cls.directory(), '*', '*')) if not path.endswith('.part')]
+        return {
+            **counts,
+            'hit_rate': round(counts['hits'] * 100 / counts['lookups'], 1) if counts['lookups'] else None,
+            'files': len(files),
+            'bytes': sum(os.path.getsize(path) for path in files if os.path.exists(path)),
+        }
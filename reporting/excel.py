@@ -0,0 +1,173 @@
+import re
+import tempfile
+from datetime import datetime
+from django.http import FileResponse
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+from grading.models import PASS_MARK, AcademicYear, Grade, Subject
+
+# Rows fetched per round trip while streaming grades into the workbook
+ITERATOR_CHUNK_SIZE = 2000
+
+_INVALID_SHEET_CHARACTERS = re.compile(r'[\[\]:*?/\\]')
+
+
+class ExcelReport:
+    """Grade report as an .xlsx workbook, built with openpyxl's write-only mode.
+
+    The workbook has a Summary sheet followed by one sheet per subject. Grades
+    are read with a server-side ``.iterator()`` and appended as they arrive
+    (write-only sheets each spool to their own temporary file), so memory
+    stays flat however many rows the report covers. The Summary rows are
+    formulas over the subject sheets, so they stay correct if the sheets are
+    edited.
+    """
+
+    COLUMNS = [
+        ('Student ID', 'student__student_id'),
+        ('First Name', 'student__first_name'),
+        ('Last Name', 'student__last_name'),
+        ('Class', 'student__current_class__name'),
+        ('Assessment', 'assessment_name'),
+        ('Type', 'assessment_type'),
+        ('Term', 'term'),
+        ('Date', 'date'),
+        ('Score', 'score'),
+        ('Max Score', 'max_score'),
+        ('Percentage', 'percentage'),
+        ('Grade', None),
+    ]
+    PERCENTAGE_COLUMN = get_column_letter(11)
+
+    def __init__(self, title, grades):
+        self.title = title
+        self.grades = grades
+
+    @classmethod
+    def for_term(cls, title, academic_year, term, **filters):
+        """Report over the grades of ``term`` dated within the named AcademicYear"""
+        date_range = AcademicYear.date_range(academic_year)
+        grades = Grade.objects.filter(term=term, **filters)
+        grades = grades.filter(date__range=date_range) if date_range else grades.none()
+        return cls(f'{title} - {academic_year} {term}', grades)
+
+    @classmethod
+    def student(cls, student, academic_year, term):
+        return cls.for_term(f'{student.first_name} {student.last_name}', academic_year, term, student=student)
+
+    @classmethod
+    def class_report(cls, class_obj, academic_year, term):
+        return cls.for_term(class_obj.name, academic_year, term, student__current_class=class_obj)
+
+    @classmethod
+    def school(cls, academic_year, term):
+        return cls.for_term('School', academic_year, term)
+
+    @staticmethod
+    def sheet_title(name, used):
+        """A unique worksheet title for ``name`` within Excel's 31 character limit"""
+        base = _INVALID_SHEET_CHARACTERS.sub('-', name)[:31] or 'Sheet'
+        title, number = base, 1
+        while title.lower() in used:
+            number += 1
+            suffix = f' ({number})'
+            title = base[:31 - len(suffix)] + suffix
+        used.add(title.lower())
+        return title
+
+    @staticmethod
+    def quoted(title):
+        return "'{}'".format(title.replace("'", "''"))
+
+    def header(self, sheet, labels):
+        cells = []
+        for label in labels:
+            cell = WriteOnlyCell(sheet, value=label)
+            cell.font = Font(bold=True)
+            cells.append(cell)
+        return cells
+
+    def write(self, output):
+        """Write the workbook to ``output`` (a path or binary file object)"""
+        workbook = Workbook(write_only=True)
+        summary = workbook.create_sheet('Summary')
+        used = {'summary'}
+
+        subjects = Subject.objects.filter(
+            pk__in=self.grades.values('subject_id')
+        ).order_by('name').values_list('pk', 'name')
+        sheets = {}
+        for subject_id, name in subjects:
+            sheet = workbook.create_sheet(self.sheet_title(name, used))
+            sheet.append(self.header(sheet, [label for label, field in self.COLUMNS]))
+            # [subject name, sheet, rows written]
+            sheets[subject_id] = [name, sheet, 0]
+
+        # Resolve the lazy labels once rather than per row
+        type_labels = {value: str(label) for value, label in Grade.AssessmentType.choices}
+        term_labels = {value: str(label) for value, label in Grade.Term.choices}
+        fields = [field for label, field in self.COLUMNS if field] + ['subject_id']
+        rows = self.grades.order_by(
+            'student__last_name', 'student__first_name', 'student_id', 'date', 'pk'
+        ).values_list(*fields).iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+        for row in rows:
+            entry = sheets[row[-1]]
+            values = list(row[:-1])
+            values[5] = type_labels.get(values[5], values[5])
+            values[6] = term_labels.get(values[6], values[6])
+            values.append(Grade.letter_for(values[10]))
+            entry[1].append(values)
+            entry[2] += 1
+
+        self.write_summary(summary, sheets.values())
+        workbook.save(output)
+
+    def write_summary(self, summary, sheets):
+        summary.append(self.header(summary, [self.title]))
+        summary.append([f"Generated {datetime.now().strftime('%Y-%m-%d %H:%M')}"])
+        summary.append([])
+        summary.append(self.header(summary, [
+            'Subject', 'Grades', 'Average %', 'Lowest %', 'Highest %', f'Pass Rate (>= {PASS_MARK}%)',
+        ]))
+        passed = f'">={PASS_MARK}"'
+        ranges = []
+        first_row = 5
+        for name, sheet, count in sheets:
+            if not count:
+                continue
+            cells = f'{self.quoted(sheet.title)}!{self.PERCENTAGE_COLUMN}2:{self.PERCENTAGE_COLUMN}{count + 1}'
+            ranges.append(cells)
+            summary.append([
+                name,
+                f'=COUNT({cells})',
+                f'=ROUND(AVERAGE({cells}),2)',
+                f'=MIN({cells})',
+                f'=MAX({cells})',
+                f'=ROUND(COUNTIF({cells},{passed})/COUNT({cells})*100,2)',
+            ])
+        if ranges:
+            last_row = first_row + len(ranges) - 1
+            passes = '+'.join(f'COUNTIF({cells},{passed})' for cells in ranges)
+            summary.append(self.header(summary, [
+                'All subjects',
+                f'=SUM(B{first_row}:B{last_row})',
+                f"=ROUND(AVERAGE({','.join(ranges)}),2)",
+                f'=MIN(D{first_row}:D{last_row})',
+                f'=MAX(E{first_row}:E{last_row})',
+                f'=ROUND(({passes})/B{last_row + 1}*100,2)',
+            ]))
+
+    def response(self, filename):
+        """Build the workbook in an anonymous temporary file and stream it back"""
+        output = tempfile.TemporaryFile()
+        try:
+            self.write(output)
+        except Exception:
+            output.close()
+            raise
+        output.seek(0)
+        # FileResponse streams the file in chunks and closes (and so deletes) it when done
+        return FileResponse(output, as_attachment=True, filename=f'{filename}.xlsx',
+                            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
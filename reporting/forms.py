@@ -1,11 +1,12 @@
 from django import forms
 from grading.models import Student, Class
+from grading.widgets import StudentTypeaheadWidget
 
 class StudentReportForm(forms.Form):
     student = forms.ModelChoiceField(
         queryset=Student.objects.filter(is_active=True),
         empty_label="Select Student",
-        widget=forms.Select(attrs={'class': 'form-control'})
+        widget=StudentTypeaheadWidget(attrs={'class': 'form-control'})
     )
     academic_year = forms.ChoiceField(
         choices=[('2024-2025', '2024-2025')],
@@ -55,6 +56,15 @@ class ClassReportForm(forms.Form):
         ],
         widget=forms.Select(attrs={'class': 'form-control'})
     )
+    pdf_output = forms.ChoiceField(
+        choices=[
+            ('ZIP', 'ZIP of report cards'),
+            ('MERGED', 'Single merged PDF'),
+        ],
+        initial='ZIP',
+        widget=forms.Select(attrs={'class': 'form-control'}),
+        label="PDF output"
+    )
 
 class SchoolReportForm(forms.Form):
     academic_year = forms.ChoiceField(
@@ -0,0 +1,265 @@
+import os
+import threading
+import time
+import traceback
+from datetime import timedelta
+from django.db import close_old_connections
+from django.template.loader import render_to_string
+from django.utils import timezone
+from grading.models import Class, Student
+from .batch import ClassReportCards
+from .cache import ReportCache, reports_dir
+from .excel import ExcelReport
+from .models import GeneratedReport, ReportTemplate
+from .pdf import html_to_pdf
+from .services import ReportGenerator
+from .summary import SchoolSummary
+
+# Minimum seconds between progress writes for one job
+PROGRESS_INTERVAL = 1.0
+# Seconds between the worker loop's heartbeats for its running jobs
+HEARTBEAT_INTERVAL = 30.0
+
+Status = GeneratedReport.Status
+
+
+class ReportJobs:
+    """Database-backed queue of GeneratedReport jobs.
+
+    A job is a GeneratedReport row. Workers claim the oldest PENDING row
+    with a conditional UPDATE, so any number of worker processes can share
+    the table without a broker or row locks (which SQLite doesn't have).
+    The worker loop touches ``heartbeat_at`` of the jobs it is running; a
+    RUNNING job whose heartbeat is too old belonged to a worker that died
+    and is put back in the queue. Every later write to a job is made only
+    while the job is still RUNNING for the worker that claimed it, so a
+    worker that was presumed dead can't overwrite the job's new run.
+
+    Artifacts live in the ReportCache: a request whose file is already
+    cached is recorded as DONE straight away and never reaches a worker.
+    """
+
+    TEMPLATE_NAMES = {
+        ReportTemplate.ReportType.STUDENT_REPORT: 'Student Report Card',
+        ReportTemplate.ReportType.CLASS_SUMMARY: 'Class Report',
+        ReportTemplate.ReportType.SCHOOL_SUMMARY: 'School Report',
+    }
+
+    @classmethod
+    def enqueue(cls, report_type, title, user, parameters, format):
+        template, created = ReportTemplate.objects.get_or_create(
+            report_type=report_type,
+            defaults={'name': cls.TEMPLATE_NAMES[report_type]}
+        )
+        cache_key = ReportCache.key(report_type, format, parameters)
+        cached = ReportCache.lookup(cache_key)
+        report = GeneratedReport(
+            report_template=template,
+            title=title,
+            generated_by=user,
+            parameters=parameters,
+            format=format,
+            cache_key=cache_key,
+        )
+        if cached:
+            now = timezone.now()
+            report.status = Status.DONE
+            report.progress = 100
+            report.cache_hit = True
+            report.artifact_path = cached
+            report.started_at = report.finished_at = now
+        report.save()
+        return report
+
+    @staticmethod
+    def claim(worker):
+        """Atomically move the oldest pending job to RUNNING for ``worker``; None if the queue is empty"""
+        candidates = GeneratedReport.objects.filter(status=Status.PENDING).order_by('generated_at', 'pk')
+        for pk in candidates.values_list('pk', flat=True)[:20]:
+            now = timezone.now()
+            claimed = GeneratedReport.objects.filter(pk=pk, status=Status.PENDING).update(
+                status=Status.RUNNING, worker=worker, progress=0, error='',
+                started_at=now, heartbeat_at=now, finished_at=None,
+            )
+            if claimed:
+                return GeneratedReport.objects.select_related('report_template').get(pk=pk)
+            # Another worker got it first
+        return None
+
+    @staticmethod
+    def owned(report):
+        """``report``'s row, as long as it is still RUNNING for the worker that claimed it"""
+        return GeneratedReport.objects.filter(pk=report.pk, worker=report.worker, status=Status.RUNNING)
+
+    @staticmethod
+    def heartbeat(worker, reports):
+        """Mark ``worker``'s running ``reports`` as alive; returns how many it still owns"""
+        return GeneratedReport.objects.filter(
+            pk__in=[report.pk for report in reports], worker=worker, status=Status.RUNNING
+        ).update(heartbeat_at=timezone.now())
+
+    @staticmethod
+    def rebuild(report):
+        """Put a DONE job whose artifact was evicted from the ReportCache back in the queue.
+
+        It keeps its place by ``generated_at``, so it is claimed ahead of
+        newer requests. Returns False if another request requeued it first.
+        """
+        return bool(GeneratedReport.objects.filter(
+            pk=report.pk, status=Status.DONE, artifact_path=report.artifact_path
+        ).update(
+            status=Status.PENDING, worker='', progress=0, artifact_path='', cache_hit=False,
+            started_at=None, heartbeat_at=None, finished_at=None,
+        ))
+
+    @staticmethod
+    def requeue_stale(seconds):
+        """Put RUNNING jobs without a heartbeat for ``seconds`` back in the queue; returns how many"""
+        cutoff = timezone.now() - timedelta(seconds=seconds)
+        return GeneratedReport.objects.filter(status=Status.RUNNING, heartbeat_at__lt=cutoff).update(
+            status=Status.PENDING, worker='', progress=0
+        )
+
+    @classmethod
+    def run(cls, report):
+        """Build ``report``'s artifact and record the outcome; never raises.
+
+        The outcome is dropped if the job was requeued meanwhile; a built
+        artifact is still in the ReportCache for the job's next run.
+        """
+        job = ReportJob(report)
+        try:
+            job.build()
+        except Exception:
+            cls.owned(report).update(
+                status=Status.FAILED, error=traceback.format_exc(limit=5), finished_at=timezone.now()
+            )
+            job.discard()
+        else:
+            cls.owned(report).update(
+                status=Status.DONE, progress=100, artifact_path=job.artifact_path, finished_at=timezone.now(),
+                cache_key=job.cache_key, cache_hit=job.cache_hit,
+            )
+        finally:
+            # Jobs run in worker threads, each with its own connection; a job
+            # run on the caller's thread leaves the caller's connection alone
+            if threading.current_thread() is not threading.main_thread():
+                close_old_connections()
+
+
+class ReportJob:
+    """Builds one GeneratedReport's artifact into the ReportCache"""
+
+    def __init__(self, report):
+        self.report = report
+        self.parameters = report.parameters
+        self.last_progress = 0.0
+        self.artifact_path = ''
+        self.cache_key = ''
+        self.cache_hit = False
+
+    def set_progress(self, done, total):
+        now = time.monotonic()
+        if not total or now - self.last_progress < PROGRESS_INTERVAL:
+            return
+        self.last_progress = now
+        ReportJobs.owned(self.report).update(
+            progress=min(99, done * 100 // total), heartbeat_at=timezone.now()
+        )
+
+    def path(self, extension):
+        self.artifact_path = ReportCache.path(self.cache_key, extension)
+        path = os.path.join(reports_dir(), self.artifact_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def part_path(self, path):
+        # Per job, so workers building the same key don't share a partial file
+        return f'{path}.{self.report.pk}.part'
+
+    def build(self):
+        report_type = self.report.report_template.report_type
+        builder = getattr(self, f'build_{report_type.lower()}_{self.report.format.lower()}', None)
+        if builder is None:
+            raise ValueError(f'{self.report.get_format_display()} is not available for this report type')
+        # The data may have changed since the report was queued
+        self.cache_key = ReportCache.key(report_type, self.report.format, self.parameters)
+        cached = ReportCache.lookup(self.cache_key)
+        if cached:
+            self.artifact_path = cached
+            self.cache_hit = True
+            return
+        builder()
+        ReportCache.evict(keep=self.artifact_path)
+
+    def discard(self):
+        """Remove a partly written artifact"""
+        if not self.artifact_path:
+            return
+        path = self.part_path(os.path.join(reports_dir(), self.artifact_path))
+        if os.path.exists(path):
+            os.remove(path)
+
+    def write(self, extension, chunks):
+        """Write ``chunks`` to the artifact file, renaming it into place once complete"""
+        path = self.path(extension)
+        with open(self.part_path(path), 'wb') as output:
+            for chunk in chunks:
+                output.write(chunk)
+        os.replace(self.part_path(path), path)
+
+    def write_excel(self, excel_report):
+        path = self.path('xlsx')
+        with open(self.part_path(path), 'wb') as output:
+            excel_report.write(output)
+        os.replace(self.part_path(path), path)
+
+    def student(self):
+        return Student.objects.select_related('current_class').get(pk=self.parameters['student_id'])
+
+    def class_obj(self):
+        return Class.objects.get(pk=self.parameters['class_id'])
+
+    def build_student_pdf(self):
+        context = ReportGenerator.student_report_card_context(
+            self.student(), self.parameters['academic_year'], self.parameters['term']
+        )
+        html = render_to_string('reporting/student_report_card.html', {**context, 'pdf': True})
+        self.write('pdf', [html_to_pdf(html)])
+
+    def build_student_html(self):
+        context = ReportGenerator.student_report_card_context(
+            self.student(), self.parameters['academic_year'], self.parameters['term']
+        )
+        self.write('html', [render_to_string('reporting/student_report_card.html', context).encode()])
+
+    def build_student_excel(self):
+        self.write_excel(ExcelReport.student(
+            self.student(), self.parameters['academic_year'], self.parameters['term']
+        ))
+
+    def build_class_pdf(self):
+        cards = ClassReportCards(
+            self.class_obj(), self.parameters['academic_year'], self.parameters['term'], progress=self.set_progress
+        )
+        if self.parameters.get('pdf_output') == 'MERGED':
+            self.write('pdf', cards.merged_pdf_stream())
+        else:
+            self.write('zip', cards.zip_stream())
+
+    def build_class_excel(self):
+        self.write_excel(ExcelReport.class_report(
+            self.class_obj(), self.parameters['academic_year'], self.parameters['term']
+        ))
+
+    def build_school_excel(self):
+        self.write_excel(ExcelReport.school(self.parameters['academic_year'], self.parameters['term']))
+
+    def build_school_html(self):
+        self.write('html', SchoolSummary(self.parameters['academic_year'], self.parameters['term']).html_chunks())
+
+    def build_school_pdf(self):
+        # xhtml2pdf lays out the whole document at once; its size depends only
+        # on the number of classes and subjects
+        html = b''.join(SchoolSummary(self.parameters['academic_year'], self.parameters['term']).html_chunks(pdf=True))
+        self.write('pdf', [html_to_pdf(html.decode())])
@@ -0,0 +1,64 @@
+import os
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from reporting.jobs import HEARTBEAT_INTERVAL, ReportJobs
+
+
+class Command(BaseCommand):
+    help = 'Build queued reports (GeneratedReport jobs), running up to --concurrency at a time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=2, help='Reports built at once (default: 2)')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds between queue checks when idle (default: 2)')
+        parser.add_argument('--stale-after', type=int, default=600,
+                            help='Requeue running jobs without a heartbeat for this many seconds (default: 600)')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency must be positive')
+        if options['stale_after'] <= HEARTBEAT_INTERVAL + options['poll_interval']:
+            raise CommandError(f"--stale-after must be longer than {HEARTBEAT_INTERVAL:.0f}s plus --poll-interval")
+        worker = f'{socket.gethostname()}:{os.getpid()}'
+        concurrency = options['concurrency']
+        self.stdout.write(f'Report worker {worker} started with concurrency {concurrency}')
+
+        running = {}
+        last_heartbeat = time.monotonic()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            try:
+                while True:
+                    # Builds that never report progress still keep their jobs alive
+                    if running and time.monotonic() - last_heartbeat >= HEARTBEAT_INTERVAL:
+                        ReportJobs.heartbeat(worker, [report for report, started in running.values()])
+                        last_heartbeat = time.monotonic()
+                    requeued = ReportJobs.requeue_stale(options['stale_after'])
+                    if requeued:
+                        self.stderr.write(f'Requeued {requeued} stale jobs')
+                    while len(running) < concurrency:
+                        report = ReportJobs.claim(worker)
+                        if report is None:
+                            break
+                        self.stdout.write(f'Building report {report.pk}: {report.title}')
+                        running[pool.submit(ReportJobs.run, report)] = (report, time.monotonic())
+                    close_old_connections()
+
+                    if not running:
+                        if options['once']:
+                            break
+                        time.sleep(options['poll_interval'])
+                        continue
+                    done, _ = wait(running, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                    for future in done:
+                        report, started = running.pop(future)
+                        report.refresh_from_db(fields=['status'])
+                        self.stdout.write(
+                            f'Report {report.pk} {report.get_status_display().lower()} '
+                            f'in {time.monotonic() - started:.1f}s'
+                        )
+            except KeyboardInterrupt:
+                self.stdout.write(f'Stopping; waiting for {len(running)} running reports')
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.6 on 2026-10-17 17:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_existing_reports_done(apps, schema_editor):
+    # Reports recorded before the queue were generated inline; don't queue them again
+    GeneratedReport = apps.get_model('reporting', 'GeneratedReport')
+    GeneratedReport.objects.update(status='DONE', progress=100)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting', '0002_remove_generatedreport_file_path_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generatedreport',
+            name='artifact_path',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='generatedreport',
+            name='error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='generatedreport',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='generatedreport',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='generatedreport',
+            name='progress',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='generatedreport',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='generatedreport',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('RUNNING', 'Running'), ('DONE', 'Done'), ('FAILED', 'Failed')], default='PENDING', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='generatedreport',
+            name='worker',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='generatedreport',
+            index=models.Index(fields=['status', 'generated_at'], name='report_status_queued_idx'),
+        ),
+        migrations.RunPython(mark_existing_reports_done, migrations.RunPython.noop),
+    ]
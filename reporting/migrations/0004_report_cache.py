@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-17 17:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting', '0003_report_job_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generatedreport',
+            name='cache_hit',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='generatedreport',
+            name='cache_key',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
@@ -18,20 +18,53 @@ class ReportTemplate(models.Model):
         return self.name
 
 class GeneratedReport(models.Model):
+    """A requested report, doubling as its job in the background report queue"""
     class ReportFormat(models.TextChoices):
         PDF = 'PDF', _('PDF')
         EXCEL = 'EXCEL', _('Excel')
         HTML = 'HTML', _('HTML')
     
+    class Status(models.TextChoices):
+        PENDING = 'PENDING', _('Pending')
+        RUNNING = 'RUNNING', _('Running')
+        DONE = 'DONE', _('Done')
+        FAILED = 'FAILED', _('Failed')
+    
     report_template = models.ForeignKey(ReportTemplate, on_delete=models.CASCADE)
     title = models.CharField(max_length=200)
     generated_by = models.ForeignKey(User, on_delete=models.CASCADE)
     parameters = models.JSONField(default=dict)
     format = models.CharField(max_length=10, choices=ReportFormat.choices, default='PDF')
     generated_at = models.DateTimeField(auto_now_add=True)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    progress = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    # Relative to REPORTS_DIR
+    artifact_path = models.CharField(max_length=255, blank=True)
+    # ReportCache key of the artifact, and whether it was served from the cache
+    cache_key = models.CharField(max_length=64, blank=True)
+    cache_hit = models.BooleanField(default=False)
+    error = models.TextField(blank=True)
     
     class Meta:
         ordering = ['-generated_at']
+        indexes = [
+            # Serves the worker's oldest-pending-first claim
+            models.Index(fields=['status', 'generated_at'], name='report_status_queued_idx'),
+        ]
     
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.title
+    
+    @property
+    def is_active(self):
+        return self.status in (self.Status.PENDING, self.Status.RUNNING)
+    
+    @property
+    def duration(self):
+        if self.started_at and self.finished_at:
+            return self.finished_at - self.started_at
+        return None
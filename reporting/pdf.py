@@ -0,0 +1,15 @@
+from io import BytesIO
+
+
+def html_to_pdf(html):
+    """Render an HTML document to PDF bytes with xhtml2pdf.
+
+    Kept free of Django imports so worker processes can run it without
+    setting Django up.
+    """
+    from xhtml2pdf import pisa
+    output = BytesIO()
+    result = pisa.CreatePDF(html, dest=output)
+    if result.err:
+        raise ValueError(f'PDF rendering failed with {result.err} errors')
+    return output.getvalue()
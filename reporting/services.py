@@ -2,54 +2,66 @@ import os
 from datetime import datetime
 from django.http import HttpResponse
 from django.template.loader import render_to_string
-from django.db.models import Avg
-from grading.models import Student, Grade, Subject, Class
+from grading.models import Student, Subject, Class
+from grading.services import StudentGradeProfile
+from analytics.models import StudentPerformance
+from analytics.rankings import PerformanceRankings
+from .excel import ExcelReport
+from .pdf import html_to_pdf
 
 class ReportGenerator:
     @staticmethod
-    def generate_student_report_card(student, academic_year, term, format='PDF'):
-        grades = Grade.objects.filter(student=student, term=term).select_related('subject')
-        
-        avg_grade = grades.aggregate(avg=Avg('percentage'))['avg'] or 0
-        total_subjects = grades.values('subject').distinct().count()
-        
-        context = {
-            'student': student,
+    def report_card_context(profile, academic_year, term, performance=None, subject_percentiles=None):
+        """Template context for student_report_card.html from a term's StudentGradeProfile"""
+        average = profile.overall.average or 0
+        return {
+            'student': profile.student,
             'academic_year': academic_year,
             'term': term,
-            'grades': grades,
-            'average_grade': avg_grade,
-            'total_subjects': total_subjects,
+            'grades': profile.grades,
+            'average_grade': average,
+            'overall_avg': average,
+            'total_subjects': len(profile.subjects),
+            'subject_stats': profile.subjects,
+            'performance': performance,
+            'subject_percentiles': subject_percentiles or {},
             'generated_date': datetime.now().strftime('%Y-%m-%d'),
         }
+    
+    @staticmethod
+    def student_report_card_context(student, academic_year, term):
+        """Load one student's grades and ranking and build their report card context"""
+        # Read fresh rather than from the DataCache: report workers run in their
+        # own process, and built reports have their own cache (ReportCache)
+        profile = StudentGradeProfile.load(student, academic_year, term)
+        
+        performance = StudentPerformance.objects.filter(
+            student=student, academic_year=academic_year, term=term
+        ).first()
+        subject_percentiles = PerformanceRankings.named_percentiles([performance])[0] if performance else {}
+        
+        return ReportGenerator.report_card_context(
+            profile, academic_year, term, performance, subject_percentiles
+        )
+    
+    @staticmethod
+    def generate_student_report_card(student, academic_year, term, format='PDF'):
+        if format == 'EXCEL':
+            return ExcelReport.student(student, academic_year, term).response(f"report_{student.student_id}")
+        
+        context = ReportGenerator.student_report_card_context(student, academic_year, term)
         
         if format == 'PDF':
             return ReportGenerator._generate_pdf_report('reporting/student_report_card.html', context, f"report_{student.student_id}")
-        elif format == 'EXCEL':
-            return ReportGenerator._generate_excel_report(context, f"report_{student.student_id}")
         else:
             return ReportGenerator._generate_html_report('reporting/student_report_card.html', context)
     
     @staticmethod
     def _generate_pdf_report(template_name, context, filename):
         try:
-            html_string = render_to_string(template_name, context)
-            response = HttpResponse(content_type='application/pdf')
+            html_string = render_to_string(template_name, {**context, 'pdf': True})
+            response = HttpResponse(html_to_pdf(html_string), content_type='application/pdf')
             response['Content-Disposition'] = f'attachment; filename="{filename}.pdf"'
-            
-            # Simple PDF generation (you'll need xhtml2pdf installed)
-            # For now, return HTML response
-            return HttpResponse(html_string, content_type='text/html')
-        except Exception as e:
-            return HttpResponse(f'Error: {str(e)}')
-    
-    @staticmethod
-    def _generate_excel_report(context, filename):
-        try:
-            # Simple Excel generation would go here
-            # For now, return a message
-            response = HttpResponse(f"Excel report for {filename} would be generated here")
-            response['Content-Disposition'] = f'attachment; filename="{filename}.xlsx"'
             return response
         except Exception as e:
             return HttpResponse(f'Error: {str(e)}')
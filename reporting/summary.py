@@ -0,0 +1,190 @@
+from collections import defaultdict
+from decimal import Decimal
+from django.db.models import Count, F, Sum, Window
+from django.db.models.functions import RowNumber
+from django.template.loader import render_to_string
+from grading.models import FAIL_GRADE, GRADE_LETTERS, AcademicYear, Grade, Student
+from grading.services import GradeStatistics
+from analytics.models import StudentPerformance
+
+# Table rows rendered per streamed chunk
+ROWS_PER_CHUNK = 200
+
+# Best students listed per class, and for the whole school
+TOP_PERFORMERS = 5
+
+UNASSIGNED = 'Unassigned'
+
+
+class _Totals:
+    """Grade count, percentage sum and band counts that add up across groups"""
+
+    def __init__(self):
+        self.count = 0
+        self.score_sum = Decimal('0')
+        self.bands = dict.fromkeys(GRADE_LETTERS, 0)
+
+    def add(self, row):
+        self.count += row['total_grades']
+        self.score_sum += row['score_sum'] or 0
+        for letter in GRADE_LETTERS:
+            self.bands[letter] += row[f'{letter.lower()}_count']
+
+    @property
+    def average(self):
+        return self.score_sum / self.count if self.count else None
+
+    @property
+    def pass_rate(self):
+        return (self.count - self.bands[FAIL_GRADE]) * 100 / self.count if self.count else None
+
+    def cells(self):
+        return [
+            self.count,
+            None if self.average is None else f'{self.average:.1f}%',
+            None if self.pass_rate is None else f'{self.pass_rate:.1f}%',
+            *(self.bands[letter] for letter in GRADE_LETTERS),
+        ]
+
+
+class SchoolSummary:
+    """School-wide summary of an academic year, from three grouped queries.
+
+    ``cells()`` aggregates every grade of the year once, grouped by
+    (class, subject, term) with GradeStatistics' band counts; the per-term,
+    per-class and per-subject tables are sums over those few hundred rows.
+    ``enrolment()`` counts the year's active students per class.
+    ``top_performers()`` ranks the per-student rollups by class with a
+    window function, so only the top rows come back, along with how many
+    students of each class have grades this term. Nothing is read per
+    student, and the HTML is rendered and yielded in chunks of rows.
+    """
+
+    TOTAL_COLUMNS = ['Grades', 'Average', 'Pass Rate', *GRADE_LETTERS]
+
+    def __init__(self, academic_year, term):
+        self.academic_year = academic_year
+        self.term = term
+        date_range = AcademicYear.date_range(academic_year)
+        grades = Grade.objects.all()
+        self.grades = grades.filter(date__range=date_range) if date_range else grades.none()
+
+    def cells(self):
+        """Band statistics per (class, subject, term) for the whole year"""
+        return self.grades.values(
+            'term', class_id=F('student__current_class_id'), class_name=F('student__current_class__name'),
+            subject_name=F('subject__name'),
+        ).annotate(
+            total_grades=Count('id'), score_sum=Sum('percentage'), **GradeStatistics.band_aggregates()
+        ).order_by()
+
+    def enrolment(self):
+        """Active students of the academic year per class, graded or not"""
+        return Student.objects.filter(academic_year__name=self.academic_year, is_active=True).values(
+            class_id=F('current_class_id'), class_name=F('current_class__name'),
+        ).annotate(students=Count('id')).order_by()
+
+    def top_performers(self):
+        """The TOP_PERFORMERS best averages per class this term, with the class's graded student count.
+
+        Reads the StudentPerformance rollups (one row per student, kept in
+        step with every grade write) rather than grouping the grades again.
+        """
+        by_class = {'partition_by': F('student__current_class_id')}
+        return StudentPerformance.objects.filter(
+            academic_year=self.academic_year, term=self.term, grade_count__gt=0
+        ).values(
+            'student_id', 'student__student_id', 'student__first_name', 'student__last_name',
+            'average_grade', 'grade_count',
+            class_id=F('student__current_class_id'), class_name=F('student__current_class__name'),
+        ).annotate(
+            class_students=Window(Count('id'), **by_class),
+            position=Window(RowNumber(), order_by=[F('average_grade').desc(), F('student_id').asc()], **by_class),
+        ).filter(position__lte=TOP_PERFORMERS).order_by('class_name', 'class_id', 'position')
+
+    def build(self):
+        """Tables and headline figures for the report"""
+        overall = _Totals()
+        by_term = defaultdict(_Totals)
+        # Classes are keyed by id, so classes sharing a name stay separate rows
+        by_class = defaultdict(_Totals)
+        class_names = {}
+        by_subject = defaultdict(_Totals)
+        for row in self.cells():
+            by_term[row['term']].add(row)
+            if row['term'] != self.term:
+                continue
+            overall.add(row)
+            by_class[row['class_id']].add(row)
+            class_names[row['class_id']] = row['class_name'] or UNASSIGNED
+            by_subject[row['subject_name']].add(row)
+
+        enrolled = {}
+        for row in self.enrolment():
+            enrolled[row['class_id']] = row['students']
+            class_names[row['class_id']] = row['class_name'] or UNASSIGNED
+        graded = {}
+        top_by_class = []
+        for row in self.top_performers():
+            graded[row['class_id']] = row['class_students']
+            top_by_class.append(row)
+        classes = sorted(class_names, key=lambda class_id: (class_names[class_id], class_id or 0))
+        top_school = sorted(top_by_class, key=lambda row: (-row['average_grade'], row['student_id']))[:TOP_PERFORMERS]
+
+        term_labels = dict(Grade.Term.choices)
+        return {
+            'overall': overall,
+            'students': sum(enrolled.values()),
+            'graded_students': sum(graded.values()),
+            'tables': [
+                ('Terms', ['Term', *self.TOTAL_COLUMNS], [
+                    [term_labels.get(term, term), *totals.cells()] for term, totals in sorted(by_term.items())
+                ]),
+                ('Classes', ['Class', 'Students', 'Graded', *self.TOTAL_COLUMNS], [
+                    [class_names[class_id], enrolled.get(class_id, 0), graded.get(class_id, 0),
+                     *by_class[class_id].cells()]
+                    for class_id in classes
+                ]),
+                ('Subjects', ['Subject', *self.TOTAL_COLUMNS], [
+                    [name, *totals.cells()] for name, totals in sorted(by_subject.items())
+                ]),
+                ('Top Performers', ['Student', 'Student ID', 'Class', 'Average', 'Grades'], [
+                    self.performer_cells(row) for row in top_school
+                ]),
+                ('Top Performers by Class', ['Class', 'Position', 'Student', 'Student ID', 'Average', 'Grades'], [
+                    [row['class_name'] or UNASSIGNED, row['position'], *self.performer_cells(row, with_class=False)]
+                    for row in top_by_class
+                ]),
+            ],
+        }
+
+    @staticmethod
+    def performer_cells(row, with_class=True):
+        cells = [f"{row['student__first_name']} {row['student__last_name']}", row['student__student_id']]
+        if with_class:
+            cells.append(row['class_name'] or UNASSIGNED)
+        return cells + [f"{row['average_grade']:.1f}%", row['grade_count']]
+
+    def html_chunks(self, pdf=False):
+        """Yield the report's HTML (as bytes) a section and ROWS_PER_CHUNK table rows at a time"""
+        summary = self.build()
+        context = {
+            'academic_year': self.academic_year,
+            'term': dict(Grade.Term.choices).get(self.term, self.term),
+            'overall': summary['overall'],
+            'students': summary['students'],
+            'graded_students': summary['graded_students'],
+            'pdf': pdf,
+        }
+        yield render_to_string('reporting/school_summary/start.html', context).encode()
+        for title, columns, rows in summary['tables']:
+            starts = range(0, max(len(rows), 1), ROWS_PER_CHUNK)
+            for start in starts:
+                yield render_to_string('reporting/school_summary/table.html', {
+                    'title': title,
+                    'columns': columns,
+                    'rows': rows[start:start + ROWS_PER_CHUNK],
+                    'first': start == 0,
+                    'last': start == starts[-1],
+                }).encode()
+        yield render_to_string('reporting/school_summary/end.html', context).encode()
@@ -1,3 +1,446 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import date, timedelta
+from io import BytesIO, StringIO
+from unittest.mock import patch
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+from openpyxl import load_workbook
+from pypdf import PdfReader
+from analytics.rankings import PerformanceRankings
+from authentication.models import User
+from grading.models import AcademicYear, Class
+from grading.tests import GradingTestData
+from .batch import ClassReportCards
+from .cache import ReportCache, reports_dir
+from .excel import ExcelReport
+from .jobs import ReportJobs
+from .models import GeneratedReport, ReportTemplate
+from .services import ReportGenerator
+from .summary import SchoolSummary
 
-# Create your tests here.
+
+class ReportQueueTestMixin:
+    """Builds queued reports in-process, with artifacts in a temporary REPORTS_DIR"""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = override_settings(REPORTS_DIR=directory, REPORT_WORKERS=1)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def run_queued(self):
+        while (report := ReportJobs.claim('test')) is not None:
+            ReportJobs.run(report)
+
+    def download(self, report):
+        report.refresh_from_db()
+        self.assertEqual(report.status, GeneratedReport.Status.DONE, report.error)
+        response = self.client.get(reverse('reporting:report_download', args=[report.pk]))
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+
+class StudentReportCardTests(GradingTestData, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_school()
+        cls.create_grade('85')
+
+    def test_report_card_shows_rank_and_percentiles(self):
+        PerformanceRankings.update('2024-2025', 'TERM1')
+        response = ReportGenerator.generate_student_report_card(self.student, '2024-2025', 'TERM1', 'HTML')
+        self.assertContains(response, 'Class Rank:</strong> 1 of 1')
+        self.assertContains(response, '<td>Mathematics</td>')
+        self.assertContains(response, '85.0%')
+
+    def test_pdf_format_returns_a_pdf(self):
+        response = ReportGenerator.generate_student_report_card(self.student, '2024-2025', 'TERM1', 'PDF')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(response.content.startswith(b'%PDF'))
+
+
+class ClassReportCardsTests(ReportQueueTestMixin, GradingTestData, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_school()
+        cls.turing = cls.create_student('Alan', 'Turing', 'MGS002')
+        cls.create_grade('85')
+        cls.create_grade('70', subject=cls.english)
+        cls.create_grade('64', student=cls.turing)
+        cls.user = User.objects.create_user('teacher', password='secret')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def test_contexts_use_a_fixed_number_of_queries(self):
+        for index in range(5):
+            self.create_grade('50', student=self.create_student('Extra', f'Student{index}', f'MGS1{index}'))
+        PerformanceRankings.update('2024-2025', 'TERM1')
+        with self.assertNumQueries(5):
+            contexts = list(ClassReportCards(self.class_obj, '2024-2025', 'TERM1', workers=1).contexts())
+        self.assertEqual(len(contexts), 7)
+        student, context = contexts[0]
+        self.assertEqual(student, self.student)
+        self.assertEqual(context['overall_avg'], 77.5)
+        self.assertEqual(context['subject_stats']['English'].count, 1)
+        self.assertEqual(context['performance'].rank_in_class, 1)
+        self.assertIn('Mathematics', context['subject_percentiles'])
+
+    def test_class_pdf_report_is_queued_and_built_as_a_zip(self):
+        response = self.client.post(reverse('reporting:class_report'), {
+            'class_obj': self.class_obj.pk, 'academic_year': '2024-2025', 'term': 'TERM1',
+            'format': 'PDF', 'pdf_output': 'ZIP',
+        })
+        self.assertRedirects(response, reverse('reporting:report_history'))
+        report = GeneratedReport.objects.get()
+        self.assertEqual(report.status, GeneratedReport.Status.PENDING)
+        self.run_queued()
+        archive = zipfile.ZipFile(BytesIO(self.download(report)))
+        self.assertEqual(sorted(archive.namelist()), ['MGS001-ada-lovelace.pdf', 'MGS002-alan-turing.pdf'])
+        self.assertTrue(archive.read('MGS002-alan-turing.pdf').startswith(b'%PDF'))
+
+    def test_merged_pdf_from_worker_processes(self):
+        cards = ClassReportCards(self.class_obj, '2024-2025', 'TERM1', workers=2)
+        reader = PdfReader(BytesIO(b''.join(cards.merged_pdf_stream())))
+        self.assertIn('Lovelace', reader.pages[0].extract_text())
+        self.assertIn('Turing', reader.pages[-1].extract_text())
+
+
+class ExcelReportTests(ReportQueueTestMixin, GradingTestData, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_school()
+        cls.turing = cls.create_student('Alan', 'Turing', 'MGS002')
+        cls.create_grade('85')
+        cls.create_grade('55', student=cls.turing)
+        cls.create_grade('70', subject=cls.english)
+        cls.create_grade('99', term='TERM2')
+        cls.user = User.objects.create_user('teacher', password='secret')
+
+    def workbook(self, response):
+        self.assertEqual(
+            response['Content-Type'], 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+        return load_workbook(BytesIO(b''.join(response.streaming_content)))
+
+    def test_class_workbook_has_subject_sheets_and_summary_formulas(self):
+        workbook = self.workbook(ExcelReport.class_report(self.class_obj, '2024-2025', 'TERM1').response('class'))
+        self.assertEqual(workbook.sheetnames, ['Summary', 'English', 'Mathematics'])
+        maths = list(workbook['Mathematics'].values)
+        self.assertEqual(maths[0][:3], ('Student ID', 'First Name', 'Last Name'))
+        self.assertEqual([row[0] for row in maths[1:]], ['MGS001', 'MGS002'])
+        self.assertEqual(maths[1][5:7], ('Test', 'Term 1'))
+        self.assertEqual(maths[2][-1], 'F')
+        summary = list(workbook['Summary'].values)
+        self.assertEqual(summary[5][:3], ('Mathematics', "=COUNT('Mathematics'!K2:K3)", "=ROUND(AVERAGE('Mathematics'!K2:K3),2)"))
+        self.assertEqual(summary[6][:2], ('All subjects', '=SUM(B5:B6)'))
+
+    def test_sheet_titles_are_valid_and_unique(self):
+        used = {'summary'}
+        self.assertEqual(ExcelReport.sheet_title('Maths: Paper 1/2', used), 'Maths- Paper 1-2')
+        self.assertEqual(ExcelReport.sheet_title('Summary', used), 'Summary (2)')
+        self.assertEqual(len(ExcelReport.sheet_title('x' * 40, used)), 31)
+
+    def test_student_and_school_excel_downloads(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse('reporting:student_report'), {
+            'student': self.student.pk, 'academic_year': '2024-2025', 'term': 'TERM1', 'format': 'EXCEL',
+        })
+        self.client.post(reverse('reporting:school_report'), {
+            'academic_year': '2024-2025', 'term': 'TERM2', 'format': 'EXCEL',
+        })
+        self.run_queued()
+        student_report, school_report = GeneratedReport.objects.order_by('pk')
+        workbook = load_workbook(BytesIO(self.download(student_report)))
+        self.assertEqual(list(workbook['Mathematics'].values)[1][0], 'MGS001')
+        workbook = load_workbook(BytesIO(self.download(school_report)))
+        self.assertEqual(workbook.sheetnames, ['Summary', 'Mathematics'])
+
+
+class ReportJobTests(ReportQueueTestMixin, GradingTestData, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_school()
+        cls.create_grade('85')
+        cls.user = User.objects.create_user('teacher', password='secret')
+        cls.other_user = User.objects.create_user('other', password='secret')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def enqueue(self, **parameters):
+        parameters = {'student_id': self.student.pk, 'academic_year': '2024-2025', 'term': 'TERM1', **parameters}
+        return ReportJobs.enqueue(
+            ReportTemplate.ReportType.STUDENT_REPORT, 'Report - Ada Lovelace', self.user, parameters, 'HTML'
+        )
+
+    def test_claims_oldest_pending_job_once(self):
+        first, second = self.enqueue(), self.enqueue()
+        self.assertEqual(ReportJobs.claim('a'), first)
+        self.assertEqual(ReportJobs.claim('b'), second)
+        self.assertIsNone(ReportJobs.claim('c'))
+        first.refresh_from_db()
+        self.assertEqual((first.status, first.worker), (GeneratedReport.Status.RUNNING, 'a'))
+
+    def test_stale_running_jobs_are_requeued(self):
+        report = self.enqueue()
+        ReportJobs.claim('crashed')
+        GeneratedReport.objects.filter(pk=report.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(ReportJobs.requeue_stale(600), 1)
+        self.assertEqual(ReportJobs.claim('b'), report)
+
+    def test_heartbeat_touches_only_the_workers_running_jobs(self):
+        self.enqueue()
+        self.enqueue()
+        mine, theirs = ReportJobs.claim('a'), ReportJobs.claim('b')
+        old = timezone.now() - timedelta(hours=1)
+        GeneratedReport.objects.update(heartbeat_at=old)
+        self.assertEqual(ReportJobs.heartbeat('a', [mine, theirs]), 1)
+        self.assertEqual(ReportJobs.requeue_stale(600), 1)
+        self.assertEqual(GeneratedReport.objects.get(pk=mine.pk).status, GeneratedReport.Status.RUNNING)
+
+    def test_requeued_job_ignores_the_outcome_of_its_earlier_run(self):
+        self.enqueue()
+        stale = ReportJobs.claim('crashed')
+        GeneratedReport.objects.filter(pk=stale.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        ReportJobs.requeue_stale(600)
+        ReportJobs.claim('b')
+        ReportJobs.run(stale)
+        report = GeneratedReport.objects.get(pk=stale.pk)
+        self.assertEqual((report.status, report.worker), (GeneratedReport.Status.RUNNING, 'b'))
+
+    def test_finished_job_records_timing_and_is_downloadable_by_its_owner_only(self):
+        report = self.enqueue()
+        self.run_queued()
+        self.assertIn(b'Ada', self.download(report))
+        report.refresh_from_db()
+        self.assertEqual(report.progress, 100)
+        self.assertIsNotNone(report.duration)
+        history = self.client.get(reverse('reporting:report_history'))
+        self.assertContains(history, reverse('reporting:report_download', args=[report.pk]))
+        self.assertNotContains(history, 'http-equiv="refresh"')
+        self.client.force_login(self.other_user)
+        self.assertEqual(self.client.get(reverse('reporting:report_download', args=[report.pk])).status_code, 404)
+
+    def test_failed_job_records_the_error(self):
+        report = self.enqueue(student_id=0)
+        self.run_queued()
+        report.refresh_from_db()
+        self.assertEqual(report.status, GeneratedReport.Status.FAILED)
+        self.assertIn('DoesNotExist', report.error)
+
+    def test_history_refreshes_while_jobs_are_active(self):
+        self.enqueue()
+        ReportJobs.claim('a')
+        history = self.client.get(reverse('reporting:report_history'))
+        self.assertContains(history, 'http-equiv="refresh"')
+        self.assertContains(history, 'progress-bar')
+
+
+class ReportCacheTests(ReportQueueTestMixin, GradingTestData, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_school()
+        cls.grade = cls.create_grade('85')
+        cls.user = User.objects.create_user('teacher', password='secret', is_staff=True)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def request(self, format='HTML'):
+        return ReportJobs.enqueue(
+            ReportTemplate.ReportType.STUDENT_REPORT, 'Report - Ada Lovelace', self.user,
+            {'student_id': self.student.pk, 'academic_year': '2024-2025', 'term': 'TERM1'}, format,
+        )
+
+    def test_identical_request_is_served_from_the_cache(self):
+        first = self.request()
+        self.run_queued()
+        with self.assertNumQueries(8):
+            second = self.request()
+        self.assertEqual(second.status, GeneratedReport.Status.DONE)
+        self.assertTrue(second.cache_hit)
+        first.refresh_from_db()
+        self.assertFalse(first.cache_hit)
+        self.assertEqual(second.artifact_path, first.artifact_path)
+        self.assertIn(b'Ada', self.download(second))
+        self.assertIsNone(ReportJobs.claim('test'))
+
+    def test_data_changes_miss_the_cache(self):
+        self.request()
+        self.run_queued()
+        self.grade.score = 40
+        self.grade.save()
+        report = self.request()
+        self.assertEqual(report.status, GeneratedReport.Status.PENDING)
+        self.run_queued()
+        self.assertIn(b'40', self.download(report))
+        other_format = self.request(format='EXCEL')
+        self.assertFalse(other_format.cache_hit)
+
+    def test_key_changes_with_any_input(self):
+        parameters = {'student_id': self.student.pk, 'academic_year': '2024-2025', 'term': 'TERM1'}
+        key = ReportCache.key(ReportTemplate.ReportType.STUDENT_REPORT, 'PDF', parameters)
+        self.assertEqual(key, ReportCache.key(ReportTemplate.ReportType.STUDENT_REPORT, 'PDF', dict(parameters)))
+        self.assertNotEqual(key, ReportCache.key(
+            ReportTemplate.ReportType.STUDENT_REPORT, 'PDF', {**parameters, 'term': 'TERM2'}
+        ))
+        self.student.last_name = 'Byron'
+        self.student.save()
+        self.assertNotEqual(key, ReportCache.key(ReportTemplate.ReportType.STUDENT_REPORT, 'PDF', parameters))
+
+    def test_evicts_least_recently_used_files(self):
+        paths = []
+        for index, key in enumerate(['aa' * 32, 'bb' * 32, 'cc' * 32]):
+            path = os.path.join(reports_dir(), ReportCache.path(key, 'pdf'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as output:
+                output.write(b'x' * 100)
+            os.utime(path, (1000 + index, 1000 + index))
+            paths.append(path)
+        # The oldest file was just used, so the next oldest goes
+        self.assertEqual(ReportCache.lookup('aa' * 32), ReportCache.path('aa' * 32, 'pdf'))
+        with override_settings(REPORT_CACHE_MAX_BYTES=250):
+            self.assertEqual(ReportCache.evict(), 1)
+        self.assertEqual([os.path.exists(path) for path in paths], [True, False, True])
+
+    def test_downloading_an_evicted_report_rebuilds_it(self):
+        report = self.request()
+        self.run_queued()
+        report.refresh_from_db()
+        os.remove(os.path.join(reports_dir(), report.artifact_path))
+        response = self.client.get(reverse('reporting:report_download', args=[report.pk]))
+        self.assertRedirects(response, reverse('reporting:report_history'))
+        report.refresh_from_db()
+        self.assertEqual(report.status, GeneratedReport.Status.PENDING)
+        self.run_queued()
+        self.assertIn(b'Ada', self.download(report))
+
+    def test_eviction_racing_a_download_rebuilds_or_still_serves(self):
+        report = self.request()
+        self.run_queued()
+        report.refresh_from_db()
+        url = reverse('reporting:report_download', args=[report.pk])
+        # Evicted between the lookup and the open
+        with patch('reporting.views.open', side_effect=FileNotFoundError, create=True):
+            self.assertRedirects(self.client.get(url), reverse('reporting:report_history'))
+        self.run_queued()
+        # Evicted after the open: the open file is still served
+        with patch.object(ReportCache, 'touch', side_effect=FileNotFoundError):
+            self.assertIn(b'Ada', self.download(report))
+
+    def test_dashboard_reports_hit_rate(self):
+        self.request()
+        self.run_queued()
+        self.request()
+        self.assertEqual(ReportCache.stats()['hit_rate'], 50.0)
+        self.assertContains(self.client.get(reverse('reporting:dashboard')), '50.0% hit rate')
+
+
+class SchoolSummaryTests(ReportQueueTestMixin, GradingTestData, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_school()
+        cls.turing = cls.create_student('Alan', 'Turing', 'MGS002')
+        cls.other_class = Class.objects.create(name='Grade 7B', academic_year=cls.academic_year)
+        cls.hopper = cls.create_student('Grace', 'Hopper', 'MGS003')
+        cls.hopper.current_class = cls.other_class
+        cls.hopper.save()
+        # Enrolled, but not graded yet
+        cls.create_student('Katherine', 'Johnson', 'MGS004')
+        cls.create_grade('90')
+        cls.create_grade('50', subject=cls.english)
+        cls.create_grade('70', student=cls.turing)
+        cls.create_grade('80', student=cls.hopper)
+        cls.create_grade('40', term='TERM2', day=date(2025, 2, 1))
+        cls.user = User.objects.create_user('teacher', password='secret')
+
+    def table(self, summary, title):
+        return next(rows for name, columns, rows in summary['tables'] if name == title)
+
+    def test_summary_comes_from_three_grouped_queries(self):
+        with self.assertNumQueries(4):
+            summary = SchoolSummary('2024-2025', 'TERM1').build()
+        self.assertEqual(summary['students'], 4)
+        self.assertEqual(summary['graded_students'], 3)
+        self.assertEqual(summary['overall'].count, 4)
+        self.assertEqual(summary['overall'].pass_rate, 75)
+        self.assertEqual(self.table(summary, 'Terms'), [
+            ['Term 1', 4, '72.5%', '75.0%', 1, 1, 1, 0, 1],
+            ['Term 2', 1, '40.0%', '0.0%', 0, 0, 0, 0, 1],
+        ])
+        self.assertEqual(self.table(summary, 'Classes'), [
+            ['Grade 7A', 3, 2, 3, '70.0%', '66.7%', 1, 0, 1, 0, 1],
+            ['Grade 7B', 1, 1, 1, '80.0%', '100.0%', 0, 1, 0, 0, 0],
+        ])
+        self.assertEqual(self.table(summary, 'Subjects'), [
+            ['English', 1, '50.0%', '0.0%', 0, 0, 0, 0, 1],
+            ['Mathematics', 3, '80.0%', '100.0%', 1, 1, 1, 0, 0],
+        ])
+        self.assertEqual([row[0] for row in self.table(summary, 'Top Performers')], [
+            'Grace Hopper', 'Ada Lovelace', 'Alan Turing',
+        ])
+        self.assertEqual([row[:3] for row in self.table(summary, 'Top Performers by Class')], [
+            ['Grade 7A', 1, 'Ada Lovelace'], ['Grade 7A', 2, 'Alan Turing'], ['Grade 7B', 1, 'Grace Hopper'],
+        ])
+
+    def test_classes_sharing_a_name_stay_separate(self):
+        other_year = AcademicYear.objects.create(
+            name='2023-2024', start_date=date(2023, 9, 1), end_date=date(2024, 7, 31)
+        )
+        namesake = Class.objects.create(name='Grade 7A', academic_year=other_year)
+        repeater = self.create_student('Mary', 'Somerville', 'MGS005')
+        repeater.current_class = namesake
+        repeater.save()
+        self.create_grade('60', student=repeater)
+        classes = self.table(SchoolSummary('2024-2025', 'TERM1').build(), 'Classes')
+        self.assertEqual([row[:4] for row in classes], [
+            ['Grade 7A', 3, 2, 3], ['Grade 7A', 1, 1, 1], ['Grade 7B', 1, 1, 1],
+        ])
+
+    @patch('reporting.summary.ROWS_PER_CHUNK', 1)
+    def test_html_is_rendered_in_chunks(self):
+        chunks = list(SchoolSummary('2024-2025', 'TERM1').html_chunks())
+        html = b''.join(chunks).decode()
+        self.assertGreater(len(chunks), 10)
+        self.assertEqual(html.count('<table'), html.count('</table>'))
+        self.assertIn('<td>Grace Hopper</td>', html)
+        self.assertTrue(html.rstrip().endswith('</html>'))
+
+    def test_queued_school_html_and_pdf_reports(self):
+        self.client.force_login(self.user)
+        for format in ('HTML', 'PDF'):
+            self.client.post(reverse('reporting:school_report'), {
+                'academic_year': '2024-2025', 'term': 'TERM1', 'format': format,
+            })
+        self.run_queued()
+        html_report, pdf_report = GeneratedReport.objects.order_by('pk')
+        self.assertIn(b'<h3>Top Performers</h3>', self.download(html_report))
+        self.assertTrue(self.download(pdf_report).startswith(b'%PDF'))
+
+
+class ReportWorkerCommandTests(ReportQueueTestMixin, GradingTestData, TransactionTestCase):
+    def test_worker_drains_the_queue(self):
+        self.create_school()
+        user = User.objects.create_user('teacher', password='secret')
+        for term in ('TERM1', 'TERM2'):
+            ReportJobs.enqueue(
+                ReportTemplate.ReportType.SCHOOL_SUMMARY, f'School {term}', user,
+                {'academic_year': '2024-2025', 'term': term}, 'EXCEL',
+            )
+        out = StringIO()
+        call_command('run_report_worker', '--once', '--concurrency', '2', stdout=out)
+        self.assertEqual(
+            list(GeneratedReport.objects.values_list('status', flat=True)), [GeneratedReport.Status.DONE] * 2
+        )
+        self.assertIn('done in', out.getvalue())
@@ -9,4 +9,5 @@ urlpatterns = [
     path('class/', views.ClassReportView.as_view(), name='class_report'),
     path('school/', views.SchoolReportView.as_view(), name='school_report'),
     path('history/', views.ReportHistoryView.as_view(), name='report_history'),
+    path('history/<int:pk>/download/', views.ReportDownloadView.as_view(), name='report_download'),
 ]
\ No newline at end of file
@@ -1,10 +1,16 @@
+import os
+from django.views import View
 from django.views.generic import TemplateView, FormView, ListView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.urls import reverse_lazy
 from django.contrib import messages
+from django.http import FileResponse
+from django.shortcuts import get_object_or_404, redirect
+from django.utils.text import slugify
 from .models import GeneratedReport, ReportTemplate
 from .forms import StudentReportForm, ClassReportForm, SchoolReportForm
-from .services import ReportGenerator
+from .cache import ReportCache, reports_dir
+from .jobs import ReportJobs
 
 class ReportsDashboardView(LoginRequiredMixin, TemplateView):
     template_name = 'reporting/dashboard.html'
@@ -13,65 +19,103 @@ class ReportsDashboardView(LoginRequiredMixin, TemplateView):
         context = super().get_context_data(**kwargs)
         context['total_reports'] = GeneratedReport.objects.filter(generated_by=self.request.user).count()
         context['recent_reports'] = GeneratedReport.objects.filter(generated_by=self.request.user)[:5]
+        if self.request.user.is_staff:
+            context['cache_stats'] = ReportCache.stats()
         return context
 
-class StudentReportView(LoginRequiredMixin, FormView):
-    template_name = 'reporting/student_report.html'
-    form_class = StudentReportForm
-    success_url = reverse_lazy('reporting:dashboard')
+class QueuedReportView(LoginRequiredMixin, FormView):
+    """Form view that queues the requested report for run_report_worker"""
+    success_url = reverse_lazy('reporting:report_history')
+    report_type = None
+    formats = ('PDF', 'EXCEL', 'HTML')
+    
+    def get_report(self, data):
+        """(title, parameters) of the report described by the form's cleaned data"""
+        raise NotImplementedError
     
     def form_valid(self, form):
-        try:
-            student = form.cleaned_data['student']
-            academic_year = form.cleaned_data['academic_year']
-            term = form.cleaned_data['term']
-            format = form.cleaned_data['format']
-            
-            response = ReportGenerator.generate_student_report_card(student, academic_year, term, format)
-            
-            # Save report record
-            template, created = ReportTemplate.objects.get_or_create(
-                report_type='STUDENT',
-                defaults={'name': 'Student Report Card'}
-            )
-            
-            GeneratedReport.objects.create(
-                report_template=template,
-                title=f"Report - {student.get_full_name()}",
-                generated_by=self.request.user,
-                parameters={'student_id': student.id},
-                format=format
-            )
-            
-            messages.success(self.request, 'Report generated successfully!')
-            return response
-            
-        except Exception as e:
-            messages.error(self.request, f'Error: {str(e)}')
+        format = form.cleaned_data['format']
+        if format not in self.formats:
+            labels = ' or '.join(GeneratedReport.ReportFormat(value).label for value in self.formats)
+            messages.info(self.request, f'This report is available as {labels}.')
             return self.form_invalid(form)
+        title, parameters = self.get_report(form.cleaned_data)
+        ReportJobs.enqueue(self.report_type, title, self.request.user, parameters, format)
+        messages.success(self.request, f'"{title}" has been queued. It will be ready to download below shortly.')
+        return super().form_valid(form)
 
-class ClassReportView(LoginRequiredMixin, FormView):
-    template_name = 'reporting/class_report.html'
+class StudentReportView(QueuedReportView):
+    template_name = 'reporting/student_report.html'
+    form_class = StudentReportForm
+    report_type = ReportTemplate.ReportType.STUDENT_REPORT
+    
+    def get_report(self, data):
+        student = data['student']
+        return f"Report - {student.first_name} {student.last_name}", {
+            'student_id': student.id, 'academic_year': data['academic_year'], 'term': data['term'],
+        }
+
+class ClassReportView(QueuedReportView):
+    template_name = 'reporting/class_report_form.html'
     form_class = ClassReportForm
-    success_url = reverse_lazy('reporting:dashboard')
+    report_type = ReportTemplate.ReportType.CLASS_SUMMARY
+    formats = ('PDF', 'EXCEL')
     
-    def form_valid(self, form):
-        messages.info(self.request, 'Class report functionality coming soon!')
-        return super().form_valid(form)
+    def get_report(self, data):
+        class_obj = data['class_obj']
+        return f"Class Report - {class_obj.name} {data['term']}", {
+            'class_id': class_obj.id, 'academic_year': data['academic_year'], 'term': data['term'],
+            'pdf_output': data['pdf_output'],
+        }
 
-class SchoolReportView(LoginRequiredMixin, FormView):
+class SchoolReportView(QueuedReportView):
     template_name = 'reporting/school_report.html'
     form_class = SchoolReportForm
-    success_url = reverse_lazy('reporting:dashboard')
+    report_type = ReportTemplate.ReportType.SCHOOL_SUMMARY
     
-    def form_valid(self, form):
-        messages.info(self.request, 'School report functionality coming soon!')
-        return super().form_valid(form)
+    def get_report(self, data):
+        return f"School Report - {data['academic_year']} {data['term']}", {
+            'academic_year': data['academic_year'], 'term': data['term'],
+        }
 
 class ReportHistoryView(LoginRequiredMixin, ListView):
     model = GeneratedReport
     template_name = 'reporting/report_history.html'
     context_object_name = 'reports'
+    paginate_by = 25
     
     def get_queryset(self):
-        return GeneratedReport.objects.filter(generated_by=self.request.user)
\ No newline at end of file
+        return GeneratedReport.objects.filter(generated_by=self.request.user).select_related('report_template')
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # The page refreshes itself while any of its reports is still being built
+        context['has_active_reports'] = any(report.is_active for report in context['reports'])
+        return context
+
+class ReportDownloadView(LoginRequiredMixin, View):
+    def get(self, request, pk):
+        report = get_object_or_404(
+            GeneratedReport, pk=pk, generated_by=request.user, status=GeneratedReport.Status.DONE
+        )
+        if not report.artifact_path:
+            return self.rebuild(request, report)
+        path = os.path.join(reports_dir(), report.artifact_path)
+        try:
+            artifact = open(path, 'rb')
+        except FileNotFoundError:
+            return self.rebuild(request, report)
+        try:
+            ReportCache.touch(path)
+        except FileNotFoundError:
+            # Evicted since it was opened; the open file can still be read
+            pass
+        extension = os.path.splitext(path)[1]
+        return FileResponse(artifact, as_attachment=True, filename=f'{slugify(report.title)}{extension}')
+    
+    @staticmethod
+    def rebuild(request, report):
+        """Evicted from the ReportCache: build it again rather than lose the report"""
+        ReportJobs.rebuild(report)
+        messages.info(request, f'"{report.title}" is being rebuilt. It will be ready to download below shortly.')
+        return redirect('reporting:report_history')
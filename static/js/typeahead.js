@@ -0,0 +1,105 @@
+// static/js/typeahead.js - student picker backed by /grading/api/students/lookup/
+(function () {
+    const DEBOUNCE_MS = 250;
+
+    function setup(container) {
+        const search = container.querySelector('input[type="text"]');
+        const hidden = container.querySelector('input[type="hidden"]');
+        const results = container.querySelector('.student-typeahead-results');
+        const lookupUrl = container.dataset.lookupUrl;
+        let timer = null;
+        let controller = null;
+
+        function close() {
+            results.innerHTML = '';
+            search.setAttribute('aria-expanded', 'false');
+        }
+
+        function choose(item) {
+            hidden.value = item.id;
+            search.value = item.text;
+            close();
+        }
+
+        function render(items, next, append) {
+            if (!append) {
+                results.innerHTML = '';
+            }
+            const more = results.querySelector('.typeahead-more');
+            if (more) {
+                more.remove();
+            }
+            items.forEach(item => {
+                const option = document.createElement('button');
+                option.type = 'button';
+                option.className = 'list-group-item list-group-item-action';
+                option.setAttribute('role', 'option');
+                option.textContent = item.text;
+                option.addEventListener('click', () => choose(item));
+                results.appendChild(option);
+            });
+            if (next) {
+                const loadMore = document.createElement('button');
+                loadMore.type = 'button';
+                loadMore.className = 'list-group-item list-group-item-light text-center typeahead-more';
+                loadMore.textContent = 'More results…';
+                loadMore.addEventListener('click', () => fetchPage(search.value, next, true));
+                results.appendChild(loadMore);
+            }
+            if (!append && !items.length) {
+                const empty = document.createElement('div');
+                empty.className = 'list-group-item text-muted';
+                empty.textContent = 'No matching students';
+                results.appendChild(empty);
+            }
+            search.setAttribute('aria-expanded', 'true');
+        }
+
+        function fetchPage(query, cursor, append) {
+            if (controller) {
+                controller.abort();
+            }
+            controller = new AbortController();
+            const params = new URLSearchParams({q: query});
+            if (cursor) {
+                params.set('cursor', cursor);
+            }
+            fetch(`${lookupUrl}?${params}`, {signal: controller.signal, credentials: 'same-origin'})
+                .then(response => response.json())
+                .then(data => render(data.results || [], data.next, append))
+                .catch(error => {
+                    if (error.name !== 'AbortError') {
+                        close();
+                    }
+                });
+        }
+
+        search.addEventListener('input', () => {
+            // Typing invalidates the previous selection until a result is chosen
+            hidden.value = '';
+            clearTimeout(timer);
+            const query = search.value.trim();
+            if (!query) {
+                close();
+                return;
+            }
+            timer = setTimeout(() => fetchPage(query, null, false), DEBOUNCE_MS);
+        });
+
+        search.addEventListener('keydown', event => {
+            if (event.key === 'Escape') {
+                close();
+            }
+        });
+
+        document.addEventListener('click', event => {
+            if (!container.contains(event.target)) {
+                close();
+            }
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', () => {
+        document.querySelectorAll('.student-typeahead').forEach(setup);
+    });
+})();